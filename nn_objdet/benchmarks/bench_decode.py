@@ -0,0 +1,62 @@
+# @file bench_decode.py
+#
+# Decode throughput of a video file in the model layout (RGB, optionally
+# resized): in the calling thread vs several decoder processes on disjoint
+# chunks of the file.
+#
+# > python3 ./nn_objdet/benchmarks/bench_decode.py -i video.mp4 -d 1 2 4
+#
+import argparse
+import os, sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.decoder import FrameDecoder, ParallelDecoder, parse_size
+from classes.frame_buffer import SharedFrameBuffer
+
+
+def run(reader, fbuf=None):
+    """
+    Read all the frames and return the FPS
+    """
+    count = 0
+    t0 = time.monotonic()
+    while (True):
+        (ret, frame) = reader.read()
+        if (not ret):
+            break
+        if (fbuf is not None):
+            fbuf.release(frame)
+        count += 1
+    elapsed = time.monotonic() - t0
+    reader.release()
+    return count / elapsed
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--input", type=str, required=True)
+    ap.add_argument("-d", "--decoders", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("-c", "--chunk", type=int, default=32)
+    ap.add_argument("-s", "--size", type=str, default="")
+    args = vars(ap.parse_args())
+
+    size = parse_size(args["size"])
+    vs = cv2.VideoCapture(args["input"])
+    num_frames = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
+    shape = (int(vs.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            int(vs.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    if (size is not None):
+        shape = (size[1], size[0], 3)
+
+    fps = run(FrameDecoder(vs, size))
+    print(f"in thread    | {num_frames} frames | {fps:8.2f} FPS")
+
+    for num_decoders in args["decoders"]:
+        fbuf = SharedFrameBuffer(num_decoders * (args["chunk"] + 1) + 1, shape)
+        fps = run(ParallelDecoder(args["input"], num_frames, num_decoders,
+            args["chunk"], size, fbuf), fbuf)
+        fbuf.close()
+        print(f"{num_decoders} decoders   | {num_frames} frames | {fps:8.2f} FPS")
@@ -0,0 +1,95 @@
+# @file bench_pipeline.py
+#
+# End-to-end benchmark of the whole pipeline (main.py) on synthetic frames,
+# with the fake backend in place of the detector: sweeps the number of
+# workers, the queue size and the frame transport, and reports throughput,
+# latency percentiles, queue occupancy and stage utilization as JSON.
+#
+# > python3 ./nn_objdet/benchmarks/bench_pipeline.py -W 640 -H 480 -f 30 -ft 0.02 -w 1 2 4 -q 2 5 10 -t queue shm -out results.json
+#
+import argparse
+import itertools
+import json
+import os, sys
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+LABELS = os.path.join(os.path.dirname(ROOT), "models", "coco",
+        "mscoco_label_map.pbtxt")
+
+
+def run(args, num_workers, queue_size, transport):
+    """
+    Run main.py on a synthetic source and return its run report
+    """
+    source = f"synthetic:{args['width']}x{args['height']}@{args['fps']}:{args['num_frames']}"
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, "report.json")
+        command = [sys.executable, MAIN, "-i", source,
+                "-be", "fake", "-ft", str(args["fake_time"]),
+                "-w", str(num_workers), "-q-size", str(queue_size),
+                "-t", transport, "-r", args["render"],
+                "-b", str(args["batch_size"]), "-wu", "0",
+                "-pl", args["path2labels"], "-so", report_path]
+        command += args["extra"]
+        proc = subprocess.run(command, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, universal_newlines=True)
+        if (proc.returncode != 0 or not os.path.exists(report_path)):
+            print(proc.stdout[-2000:], file=sys.stderr)
+            raise RuntimeError(f"Run failed: {' '.join(command)}")
+        with open(report_path) as f:
+            return json.load(f)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-W', '--width', type=int, default=640)
+    ap.add_argument('-H', '--height', type=int, default=480)
+    ap.add_argument('-f', '--fps', type=float, default=0,
+            help='Frame rate of the source (0 = as fast as possible)')
+    ap.add_argument('-n', '--num-frames', dest='num_frames', type=int, default=300)
+    ap.add_argument('-ft', '--fake-time', dest='fake_time', type=float,
+            default=0.02, help='Compute time of the stub detector per frame [s]')
+    ap.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4])
+    ap.add_argument('-q', '--queue-sizes', dest='queue_sizes', type=int,
+            nargs='+', default=[2, 5, 10])
+    ap.add_argument('-t', '--transports', type=str, nargs='+',
+            default=["queue", "shm"], choices=["queue", "shm"])
+    ap.add_argument('-r', '--render', type=str, default="worker",
+            choices=["worker", "output", "pool"])
+    ap.add_argument('-b', '--batch-size', dest='batch_size', type=int, default=1)
+    ap.add_argument('-pl', '--label_path', dest='path2labels', type=str,
+            default=LABELS)
+    ap.add_argument('-out', '--output', type=str, default='',
+            help='JSON file of the results (default: stdout)')
+    ap.add_argument('extra', nargs=argparse.REMAINDER,
+            help='Other arguments of main.py, after --')
+    args = vars(ap.parse_args())
+    args["extra"] = [a for a in args["extra"] if a != "--"]
+
+    results = []
+    for (transport, num_workers, queue_size) in itertools.product(
+            args["transports"], args["workers"], args["queue_sizes"]):
+        report = run(args, num_workers, queue_size, transport)
+        results.append(report)
+        utilization = report["utilization"]
+        workers = utilization["workers"]
+        print(f"{transport:>5} | workers {num_workers} | queue {queue_size:3} | " +
+                f"{report['throughput_fps']:7.1f} FPS | " +
+                f"p50 {report['latency_ms'].get('p50', 0.0):7.1f} ms " +
+                f"p99 {report['latency_ms'].get('p99', 0.0):7.1f} ms | " +
+                f"input queue {report['queues']['input'].get('occupancy', 0.0):4.0%} | " +
+                f"workers {sum(workers) / max(1, len(workers)):4.0%}",
+                file=sys.stderr)
+
+    output = json.dumps({"source": {"width": args["width"],
+        "height": args["height"], "fps": args["fps"],
+        "num_frames": args["num_frames"], "fake_time": args["fake_time"]},
+        "runs": results}, indent=2)
+    if (args["output"]):
+        with open(args["output"], "w") as f:
+            f.write(output)
+    else:
+        print(output)
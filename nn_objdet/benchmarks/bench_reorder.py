@@ -0,0 +1,76 @@
+# @file bench_reorder.py
+#
+# Cost of putting the worker results back in order: the heap of the old
+# outflow loop vs the ReorderBuffer window.
+#
+# > python3 ./nn_objdet/benchmarks/bench_reorder.py -n 200000 -j 16
+#
+import argparse
+import heapq
+import os, sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.reorder import ReorderBuffer
+
+
+def arrival_order(num_frames, jitter, seed=0):
+    """
+    Frame indices (from 1) in the order they leave the workers: each frame
+    is late by up to `jitter` positions
+    """
+    rng = np.random.default_rng(seed)
+    delay = np.arange(1, num_frames + 1) + rng.uniform(0, jitter, num_frames)
+    return (np.argsort(delay, kind="stable") + 1).tolist()
+
+
+def run_heap(order):
+    """
+    The reorder loop of the old outflow thread
+    """
+    output_pq = []
+    countWriteFrame = 1
+    written = 0
+    for index in order:
+        heapq.heappush(output_pq, (index, None))
+        while (len(output_pq) > 0 and output_pq[0][0] == countWriteFrame):
+            heapq.heappop(output_pq)
+            countWriteFrame += 1
+            written += 1
+    return written
+
+
+def run_reorder(order, capacity):
+    reorder = ReorderBuffer(capacity)
+    written = 0
+    for index in order:
+        reorder.insert(index, None)
+        written += len(reorder.pop_ready())
+    return written
+
+
+def timeit(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        written = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return (best, written)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--num-frames", type=int, default=200000)
+    ap.add_argument("-j", "--jitter", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = vars(ap.parse_args())
+
+    n = args["num_frames"]
+    for jitter in args["jitter"]:
+        order = arrival_order(n, jitter)
+        (t_heap, w_heap) = timeit(run_heap, order)
+        (t_buf, w_buf) = timeit(run_reorder, order, 2 * jitter + 2)
+        assert (w_heap == n and w_buf == n)
+        print(f"jitter {jitter:4} | heap {1e9 * t_heap / n:7.1f} ns/frame | " +
+                f"ReorderBuffer {1e9 * t_buf / n:7.1f} ns/frame")
@@ -0,0 +1,71 @@
+# @file bench_results.py
+#
+# Cost of sending the detections of a frame from a worker to the output
+# stage: Detections pickled through the queue vs fixed size records in
+# shared memory (only the record index is queued).
+#
+# > python3 ./nn_objdet/benchmarks/bench_results.py -n 20000 -d 10 100
+#
+import argparse
+from multiprocessing import Queue, Process
+import os, sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.detections import (make_detections, to_record, from_record,
+        DETECTION_RECORD)
+from classes.frame_buffer import SharedFrameBuffer
+
+
+def producer(out_q, num_frames, detections, rbuf):
+    for i in range(num_frames):
+        if (rbuf is not None):
+            slot = rbuf.acquire()
+            to_record(rbuf.view(slot), i, detections)
+            out_q.put(slot)
+        else:
+            out_q.put((i, detections))
+
+
+def run(transport, num_frames, num_detections, queue_size=5):
+    """
+    Return the results per second received by the consumer
+    """
+    n = num_detections
+    detections = make_detections(np.random.rand(n, 4), np.random.rand(n),
+            np.arange(n), n)
+
+    rbuf = None
+    if (transport == "shm"):
+        rbuf = SharedFrameBuffer(2 * queue_size, (), DETECTION_RECORD)
+    out_q = Queue(maxsize=queue_size)
+
+    t0 = time.monotonic()
+    p = Process(target=producer, args=(out_q, num_frames, detections, rbuf))
+    p.start()
+    for _ in range(num_frames):
+        result = out_q.get()
+        if (rbuf is not None):
+            slot = result
+            (_, result) = from_record(rbuf.view(slot))
+            rbuf.release(slot)
+    elapsed = time.monotonic() - t0
+    p.join()
+
+    if (rbuf is not None):
+        rbuf.close()
+    return num_frames / elapsed
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--num-frames", type=int, default=20000)
+    ap.add_argument("-d", "--num-detections", type=int, nargs="+", default=[10, 100])
+    args = vars(ap.parse_args())
+
+    for n in args["num_detections"]:
+        for transport in ("queue", "shm"):
+            rate = run(transport, args["num_frames"], n)
+            print(f"{transport:6} | {n:3} detections | {rate:9.1f} results/s")
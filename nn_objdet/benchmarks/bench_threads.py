@@ -0,0 +1,86 @@
+# @file bench_threads.py
+#
+# Aggregate detection throughput for a grid of worker processes x session
+# threads, with the workers pinned to their own cores or free to migrate.
+# Needs TensorFlow and a frozen graph (-be cv2dnn -bc graph.pbtxt compares
+# the OpenCV DNN runtime).
+#
+# > python3 ./nn_objdet/benchmarks/bench_threads.py -pg model.pb -pl labels.pbtxt -w 1 2 4 -t 1 2 4
+#
+import argparse
+from multiprocessing import Barrier, Process, Queue
+import os, sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.affinity import partition_cores, pin_to_cores
+from classes.nn_objdetector import NN_ObjDetector
+
+
+def bench_worker(args, cores, threads, barrier, result_q):
+    """
+    Load the detector, wait for the others and process the frames
+    """
+    if (cores is not None):
+        pin_to_cores(cores)
+    nn_od = NN_ObjDetector(args["path2graph"], args["path2labels"],
+            intra_op_threads=threads, inter_op_threads=min(2, threads),
+            backend=(args["backend"], {"config": args["backend_config"]}))
+
+    frame = np.random.randint(0, 255, size=(args["height"], args["width"], 3),
+            dtype=np.uint8)
+    nn_od.warmup(frame.shape)
+
+    barrier.wait()
+    t0 = time.monotonic()
+    for _ in range(args["num_frames"]):
+        nn_od.run_inference(frame)
+    result_q.put((args["num_frames"], time.monotonic() - t0))
+    nn_od.close_session()
+
+
+def run(args, num_workers, threads, pin):
+    """
+    Return the aggregate FPS of num_workers workers
+    """
+    cpu_sets = partition_cores(num_workers, reserve=0) if pin else [None] * num_workers
+    barrier = Barrier(num_workers)
+    result_q = Queue()
+    workers = [Process(target=bench_worker,
+        args=(args, cpu_sets[w], threads, barrier, result_q))
+        for w in range(num_workers)]
+    for w in workers:
+        w.start()
+
+    results = [result_q.get() for _ in workers]
+    for w in workers:
+        w.join()
+
+    # The workers run at the same time: frames over the slowest one
+    return sum(n for (n, _) in results) / max(t for (_, t) in results)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-pg", "--graph-path", dest="path2graph", type=str, required=True)
+    ap.add_argument("-pl", "--label-path", dest="path2labels", type=str, required=True)
+    ap.add_argument("-n", "--num-frames", type=int, default=50)
+    ap.add_argument("-W", "--width", type=int, default=640)
+    ap.add_argument("-H", "--height", type=int, default=480)
+    ap.add_argument("-w", "--num-workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("-t", "--threads", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("-pin", "--pin", type=int, nargs="+", default=[0, 1])
+    ap.add_argument("-be", "--backend", type=str, default="tf")
+    ap.add_argument("-bc", "--backend-config", dest="backend_config", type=str, default="")
+    args = vars(ap.parse_args())
+
+    print(f"{len(os.sched_getaffinity(0))} cores | {args['width']}x{args['height']}" +
+            f" | backend {args['backend']}")
+    for num_workers in args["num_workers"]:
+        for threads in args["threads"]:
+            for pin in args["pin"]:
+                fps = run(args, num_workers, threads, pin)
+                print(f"workers {num_workers:2} | threads {threads:2} | " +
+                        f"pinned {pin} | {fps:8.2f} FPS")
@@ -0,0 +1,108 @@
+# @file bench_transport.py
+#
+# Transport-only microbenchmark: FPS of the frame transport between the data
+# flow and the worker pool, frames pickled through the queues vs shared
+# memory slots. The workers are stubs, not main.work(): for the whole
+# pipeline (real workers on the fake backend) see bench_pipeline.py.
+#
+# > python3 ./nn_objdet/benchmarks/bench_transport.py -W 1920 -H 1080
+#
+import argparse
+from multiprocessing import Queue, Process
+import os, sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classes.decoder import to_model_layout
+from classes.frame_buffer import SharedFrameBuffer
+
+
+def stub_work(input_q, processed_q, fbuf):
+    """
+    Stub worker: it only moves the frames, without the detector nor the
+    worker loop of main.py
+    """
+    while True:
+        frame = input_q.get()
+        if (frame is None):
+            break
+
+        # The frames arrive RGB (converted by the decoder): the annotated
+        # frame goes back in the same slot / through the queue
+        processed_q.put(frame)
+
+
+def run(transport, num_frames, shape, num_workers, queue_size):
+    """
+    Push num_frames through the pipeline and return the end-to-end FPS
+    """
+    input_q = Queue(maxsize=queue_size)
+    processed_q = Queue(maxsize=queue_size)
+
+    fbuf = None
+    if (transport == "shm"):
+        fbuf = SharedFrameBuffer(2 * queue_size + 2 * num_workers, shape)
+
+    workers = [Process(target=stub_work, args=(input_q, processed_q, fbuf))
+            for _ in range(num_workers)]
+    for w in workers:
+        w.start()
+
+    frame = np.random.randint(0, 255, size=shape, dtype=np.uint8)
+
+    def inflow():
+        for i in range(num_frames):
+            # Decoded in the model layout, like the data flow
+            frame_rgb = to_model_layout(frame)
+            if (fbuf is not None):
+                slot = fbuf.acquire()
+                fbuf.write(slot, frame_rgb)
+                input_q.put((i, slot))
+            else:
+                input_q.put((i, frame_rgb))
+
+    # The output stage converts each frame back to BGR, like outflow_thread:
+    # part of the measured cost, the same for both transports
+    output_bgr = np.empty(shape, dtype=np.uint8)
+    t0 = time.monotonic()
+    p_in = Process(target=inflow)
+    p_in.start()
+
+    for _ in range(num_frames):
+        (index, outframe) = processed_q.get()
+        if (fbuf is not None):
+            cv2.cvtColor(fbuf.view(outframe), cv2.COLOR_RGB2BGR, dst=output_bgr)
+            fbuf.release(outframe)
+        else:
+            cv2.cvtColor(outframe, cv2.COLOR_RGB2BGR, dst=output_bgr)
+    elapsed = time.monotonic() - t0
+
+    p_in.join()
+    for _ in workers:
+        input_q.put(None)
+    for w in workers:
+        w.join()
+    if (fbuf is not None):
+        fbuf.close()
+
+    return num_frames / elapsed
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--num-frames", type=int, default=300)
+    ap.add_argument("-W", "--width", type=int, default=1920)
+    ap.add_argument("-H", "--height", type=int, default=1080)
+    ap.add_argument("-w", "--num-workers", type=int, default=2)
+    ap.add_argument("-q", "--queue-size", type=int, default=5)
+    args = vars(ap.parse_args())
+
+    shape = (args["height"], args["width"], 3)
+    for transport in ("queue", "shm"):
+        fps = run(transport, args["num_frames"], shape,
+                args["num_workers"], args["queue_size"])
+        print(f"{transport:6} | {args['width']}x{args['height']} | " +
+                f"{args['num_workers']} workers | {fps:8.2f} FPS")
@@ -0,0 +1,64 @@
+# @file: affinity.py
+#
+#
+import os
+
+
+def available_cores():
+    """
+    Returns:
+        (list) The cores this process can run on
+    """
+    if (hasattr(os, "sched_getaffinity")):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(num_workers, cores=None, reserve=1):
+    """
+    Split the cores in contiguous sets, one per worker
+
+    The first `reserve` cores are left to the data flow processes when there
+    are more cores than workers. With fewer cores than workers, the workers
+    share them in turn (one core each).
+
+    Args:
+        num_workers (int): Number of workers
+        cores (list): Cores to split (default: the available ones)
+        reserve (int): Cores kept out of the partition
+
+    Returns:
+        (list) One list of cores per worker
+
+    """
+    if (cores is None):
+        cores = available_cores()
+    num_workers = max(1, num_workers)
+
+    if (len(cores) - reserve >= num_workers):
+        cores = cores[reserve:]
+    if (len(cores) < num_workers):
+        return [[cores[w % len(cores)]] for w in range(num_workers)]
+
+    # The first workers get one more core when the division is not exact
+    (per_worker, extra) = divmod(len(cores), num_workers)
+    partition = []
+    start = 0
+    for w in range(num_workers):
+        size = per_worker + (1 if w < extra else 0)
+        partition.append(cores[start:start + size])
+        start += size
+    return partition
+
+
+def pin_to_cores(cores):
+    """
+    Restrict the calling process to a set of cores (where supported)
+
+    Returns:
+        (Bool) True if the affinity has been set
+    """
+    if (not hasattr(os, "sched_setaffinity")):
+        return False
+    os.sched_setaffinity(0, cores)
+    return True
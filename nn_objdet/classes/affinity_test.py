@@ -0,0 +1,37 @@
+"""Tests for classes.affinity."""
+import os
+import unittest
+
+from classes.affinity import available_cores, partition_cores
+
+
+class PartitionCoresTest(unittest.TestCase):
+
+    def test_even_split_with_reserved_core(self):
+        self.assertEqual(partition_cores(3, list(range(7))),
+                [[1, 2], [3, 4], [5, 6]])
+
+    def test_uneven_split(self):
+        self.assertEqual(partition_cores(2, list(range(6))),
+                [[1, 2, 3], [4, 5]])
+
+    def test_no_room_for_the_reserved_core(self):
+        self.assertEqual(partition_cores(4, list(range(4))),
+                [[0], [1], [2], [3]])
+
+    def test_more_workers_than_cores(self):
+        self.assertEqual(partition_cores(3, [0, 1]), [[0], [1], [0]])
+
+    def test_disjoint_sets(self):
+        cores = available_cores()
+        partition = partition_cores(len(cores), cores, reserve=0)
+        flat = [core for cpu_set in partition for core in cpu_set]
+        self.assertEqual(sorted(flat), cores)
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "no affinity")
+    def test_available_cores(self):
+        self.assertEqual(available_cores(), sorted(os.sched_getaffinity(0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
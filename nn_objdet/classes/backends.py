@@ -0,0 +1,253 @@
+# @file: backends.py
+#
+#
+from abc import ABCMeta, abstractmethod
+import time
+
+import cv2
+import numpy as np
+
+from classes.decoder import parse_size
+from classes.detections import MAX_DETECTIONS
+
+
+# name -> backend class, filled by @register_backend
+BACKENDS = {}
+
+
+def register_backend(name):
+    """
+    Class decorator adding a backend to the registry
+    """
+    def register(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return register
+
+
+def create_backend(name, path2fg, serialized_graph=None, intra_op_threads=0,
+        inter_op_threads=0, **options):
+    """
+    Create the backend registered as `name`
+
+    Args:
+        name (Str): Name of the backend
+        path2fg (Str): Path to the model file
+        serialized_graph (bytes): Content of the model file, when already
+            read by the parent process (optional)
+        intra_op_threads (int): Threads of each operation, 0 = default
+        inter_op_threads (int): Operations run in parallel, 0 = default
+        options: Options of the backend (see each backend)
+
+    Returns:
+        (DetectorBackend)
+
+    """
+    if (name not in BACKENDS):
+        raise ValueError(f"Unknown backend '{name}', available: " +
+                ", ".join(sorted(BACKENDS)))
+    return BACKENDS[name](path2fg, serialized_graph, intra_op_threads,
+            inter_op_threads, **options)
+
+
+class DetectorBackend(metaclass=ABCMeta):
+    """
+    This class is the interface of the inference runtimes.
+
+    detect() runs the model on a batch of RGB frames with the same size and
+    returns the raw outputs of the detection graphs of the Object Detection
+    API: boxes [N, M, 4] (ymin, xmin, ymax, xmax normalized), scores [N, M],
+    classes [N, M] (ids of the label map) and num_detections [N].
+    """
+    name = None
+    # Whether the model file is read (and shared by the parent process)
+    needs_model = True
+
+    @abstractmethod
+    def detect(self, batch):
+        """
+        Args:
+            batch (ndarray): Frames [N, H, W, 3] uint8, RGB
+
+        Returns:
+            (boxes, scores, classes, num_detections)
+
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+@register_backend("tf")
+class TFSessionBackend(DetectorBackend):
+    """ TensorFlow 1 frozen graph, run by a tf.Session """
+
+    def __init__(self, path2fg, serialized_graph=None, intra_op_threads=0,
+            inter_op_threads=0, **options):
+        import tensorflow as tf
+
+        # Start the TF environment
+        self.detection_graph = tf.Graph()  # TF graph
+        with self.detection_graph.as_default(): # Configure the graph as default
+            od_graph_def = tf.GraphDef()
+
+            # Initialization of the graph
+            # (the serialized graph can be provided by the parent process)
+            if (serialized_graph is None):
+                with tf.gfile.GFile(path2fg, 'rb') as fid:
+                    serialized_graph = fid.read()
+            # Import the graph def into the default graph
+            od_graph_def.ParseFromString(serialized_graph)
+            tf.import_graph_def(od_graph_def, name='')
+
+
+            ## Get the tensor from the graph
+            self.image_tensor = \
+                    self.detection_graph.get_tensor_by_name('image_tensor:0')
+
+            # Each box represents a part of the image where a particular object was
+            # detected.
+            self.boxes_tens = \
+                    self.detection_graph.get_tensor_by_name('detection_boxes:0')
+
+            # Each score represent how level of confidence for each of the objects.
+            # Score is shown on the result image, together with the class label.
+            self.scores_tens = \
+                    self.detection_graph.get_tensor_by_name('detection_scores:0')
+            self.classes_tens = \
+                    self.detection_graph.get_tensor_by_name('detection_classes:0')
+            self.num_detections_tens = \
+                    self.detection_graph.get_tensor_by_name('num_detections:0')
+
+            # Define the Session
+            # (0 threads = one pool as large as the machine: with several
+            # workers the pools should be limited to the cores of the worker)
+            config = tf.ConfigProto(
+                    intra_op_parallelism_threads=intra_op_threads,
+                    inter_op_parallelism_threads=inter_op_threads)
+            self.sess = tf.Session(graph=self.detection_graph, config=config)
+
+    def detect(self, batch):
+        return self.sess.run(
+                [self.boxes_tens, self.scores_tens, \
+                        self.classes_tens, self.num_detections_tens],
+                feed_dict={self.image_tensor: batch})
+
+    def close(self):
+        self.sess.close()
+
+
+@register_backend("cv2dnn")
+class OpenCVDNNBackend(DetectorBackend):
+    """
+    Frozen graph run by the OpenCV DNN module on the CPU
+
+    The SSD graphs of the Object Detection API need the text description
+    generated by OpenCV's tf_text_graph_ssd.py (config option). The frames
+    are resized to the input size of the network (input_size option,
+    "WIDTHxHEIGHT").
+    """
+
+    def __init__(self, path2fg, serialized_graph=None, intra_op_threads=0,
+            inter_op_threads=0, config="", input_size="300x300", **options):
+        if (serialized_graph is None):
+            with open(path2fg, 'rb') as fid:
+                serialized_graph = fid.read()
+        config_data = b""
+        if (config):
+            with open(config, 'rb') as fid:
+                config_data = fid.read()
+
+        self.net = cv2.dnn.readNetFromTensorflow(
+                np.frombuffer(serialized_graph, dtype=np.uint8),
+                np.frombuffer(config_data, dtype=np.uint8))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        if (intra_op_threads > 0):
+            cv2.setNumThreads(intra_op_threads)
+
+        self.input_size = parse_size(input_size)
+        self.max_detections = MAX_DETECTIONS
+
+    def detect(self, batch):
+        # (the frames are already RGB)
+        blob = cv2.dnn.blobFromImages(list(batch), size=self.input_size,
+                swapRB=False, crop=False)
+        self.net.setInput(blob)
+        return split_detection_output(self.net.forward(), len(batch),
+                self.max_detections)
+
+
+def split_detection_output(output, batch_size, max_detections=MAX_DETECTIONS):
+    """
+    Convert the output of a DetectionOutput layer to the layout of the
+    detection graphs
+
+    Args:
+        output (ndarray): [1, 1, K, 7] rows (image, class, score, xmin, ymin,
+            xmax, ymax) of all the images of the batch
+        batch_size (int): Number of images
+        max_detections (int): Detections kept per image
+
+    Returns:
+        (boxes, scores, classes, num_detections)
+
+    """
+    rows = output.reshape(-1, 7)
+
+    boxes = np.zeros((batch_size, max_detections, 4), dtype=np.float32)
+    scores = np.zeros((batch_size, max_detections), dtype=np.float32)
+    classes = np.zeros((batch_size, max_detections), dtype=np.float32)
+    num_detections = np.zeros(batch_size, dtype=np.float32)
+    for i in range(batch_size):
+        image_rows = rows[rows[:, 0] == i]
+        image_rows = image_rows[np.argsort(-image_rows[:, 2], kind="stable")]
+        image_rows = image_rows[:max_detections]
+        k = len(image_rows)
+        boxes[i, :k] = np.clip(image_rows[:, [4, 3, 6, 5]], 0.0, 1.0)
+        scores[i, :k] = image_rows[:, 2]
+        classes[i, :k] = image_rows[:, 1]
+        num_detections[i] = k
+    return (boxes, scores, classes, num_detections)
+
+
+@register_backend("fake")
+class FakeBackend(DetectorBackend):
+    """
+    Deterministic backend without a model, to measure the pipeline alone
+
+    Each frame gets the same num_boxes detections and costs compute_time
+    seconds: sleeping (like a runtime releasing the GIL) or, with busy=True,
+    spinning on the CPU.
+    """
+    needs_model = False
+
+    def __init__(self, path2fg=None, serialized_graph=None, intra_op_threads=0,
+            inter_op_threads=0, compute_time=0.01, num_boxes=5, busy=False,
+            seed=0, **options):
+        self.compute_time = compute_time
+        self.busy = busy
+
+        rng = np.random.RandomState(seed)
+        corners = rng.uniform(0.0, 0.8, size=(num_boxes, 2))
+        sizes = rng.uniform(0.05, 0.2, size=(num_boxes, 2))
+        self.boxes = np.hstack([corners, corners + sizes]).astype(np.float32)
+        self.scores = np.sort(rng.uniform(0.3, 1.0, size=num_boxes))[::-1] \
+                .astype(np.float32)
+        self.classes = rng.randint(1, 91, size=num_boxes).astype(np.float32)
+
+    def detect(self, batch):
+        n = len(batch)
+        delay = self.compute_time * n
+        if (self.busy):
+            end = time.perf_counter() + delay
+            while (time.perf_counter() < end):
+                pass
+        elif (delay > 0):
+            time.sleep(delay)
+
+        return (np.tile(self.boxes, (n, 1, 1)), np.tile(self.scores, (n, 1)),
+                np.tile(self.classes, (n, 1)),
+                np.full(n, len(self.scores), dtype=np.float32))
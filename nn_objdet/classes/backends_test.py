@@ -0,0 +1,109 @@
+"""Tests for classes.backends."""
+import time
+import unittest
+
+import numpy as np
+
+from classes.backends import (BACKENDS, DetectorBackend, FakeBackend,
+        create_backend, register_backend, split_detection_output)
+from classes.nn_objdetector import NN_ObjDetector
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_builtin_backends(self):
+        self.assertLessEqual({"tf", "cv2dnn", "fake"}, set(BACKENDS))
+        self.assertFalse(BACKENDS["fake"].needs_model)
+        self.assertTrue(BACKENDS["tf"].needs_model)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_backend("nope", None)
+
+    def test_register(self):
+        @register_backend("test_constant")
+        class ConstantBackend(DetectorBackend):
+            def __init__(self, *args, value=0.5, **options):
+                self.value = value
+
+            def detect(self, batch):
+                n = len(batch)
+                return (np.zeros((n, 1, 4)), np.full((n, 1), self.value),
+                        np.ones((n, 1)), np.ones(n))
+
+        try:
+            backend = create_backend("test_constant", None, value=0.25)
+            self.assertEqual(backend.name, "test_constant")
+            self.assertEqual(backend.detect(np.zeros((2, 4, 4, 3)))[1][1, 0], 0.25)
+        finally:
+            del BACKENDS["test_constant"]
+
+    def test_interface(self):
+        class NoDetect(DetectorBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoDetect()
+
+
+class FakeBackendTest(unittest.TestCase):
+
+    def test_layout(self):
+        backend = create_backend("fake", None, compute_time=0, num_boxes=3)
+        (boxes, scores, classes, num_detections) = backend.detect(
+                np.zeros((2, 30, 40, 3), dtype=np.uint8))
+        self.assertEqual(boxes.shape, (2, 3, 4))
+        self.assertEqual(scores.shape, (2, 3))
+        self.assertEqual(classes.shape, (2, 3))
+        np.testing.assert_array_equal(num_detections, [3, 3])
+        # Valid boxes, sorted scores, label map ids
+        self.assertTrue(np.all(boxes[..., 2] > boxes[..., 0]))
+        self.assertTrue(np.all(boxes[..., 3] > boxes[..., 1]))
+        self.assertTrue(np.all(np.diff(scores[0]) <= 0))
+        self.assertTrue(np.all(classes >= 1))
+
+    def test_deterministic(self):
+        a = FakeBackend(compute_time=0, seed=3).detect(np.zeros((1, 8, 8, 3)))
+        b = FakeBackend(compute_time=0, seed=3).detect(np.ones((1, 8, 8, 3)))
+        for (x, y) in zip(a, b):
+            np.testing.assert_array_equal(x, y)
+
+    def test_compute_time(self):
+        for busy in (False, True):
+            backend = FakeBackend(compute_time=0.02, busy=busy)
+            t0 = time.monotonic()
+            backend.detect(np.zeros((2, 8, 8, 3)))
+            self.assertGreaterEqual(time.monotonic() - t0, 0.04)
+
+    def test_no_model_no_label_map(self):
+        # Without drawing, the fake backend needs neither the model nor the
+        # label map (nor TensorFlow)
+        detector = NN_ObjDetector(None, "missing_label_map.pbtxt",
+                backend=("fake", {"compute_time": 0, "num_boxes": 2}))
+        detections = detector.run_inference(np.zeros((8, 8, 3), dtype=np.uint8))
+        self.assertEqual(detections.num_detections, 2)
+        self.assertIsNone(detector.renderer)
+        detector.close_session()
+
+
+class DetectionOutputTest(unittest.TestCase):
+
+    def test_split_per_image(self):
+        output = np.array([[[
+                [0, 1, 0.5, 0.1, 0.2, 0.3, 0.4],
+                [1, 3, 0.7, 0.0, 0.0, 1.2, 0.5],
+                [0, 2, 0.9, 0.5, 0.5, 0.6, 0.7]]]], dtype=np.float32)
+        (boxes, scores, classes, num_detections) = split_detection_output(
+                output, 3, max_detections=4)
+
+        np.testing.assert_array_equal(num_detections, [2, 1, 0])
+        np.testing.assert_allclose(scores[0, :2], [0.9, 0.5])
+        np.testing.assert_array_equal(classes[0, :2], [2, 1])
+        # (ymin, xmin, ymax, xmax), clipped to the image
+        np.testing.assert_allclose(boxes[0, 1], [0.2, 0.1, 0.4, 0.3])
+        np.testing.assert_allclose(boxes[1, 0], [0.0, 0.0, 0.5, 1.0])
+        self.assertEqual(boxes.shape, (3, 4, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
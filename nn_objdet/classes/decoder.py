@@ -0,0 +1,172 @@
+# @file: decoder.py
+#
+#
+from multiprocessing import Process, Queue
+
+import cv2
+
+
+def parse_size(size):
+    """
+    Parse a "WIDTHxHEIGHT" string
+
+    Returns:
+        (width, height), or None for an empty string
+    """
+    if (not size):
+        return None
+    (width, height) = size.lower().split("x")
+    return (int(width), int(height))
+
+
+def to_model_layout(frame_bgr, size=None, dst=None):
+    """
+    Convert a decoded frame to the input layout of the model: RGB and,
+    optionally, resized
+
+    Args:
+        frame_bgr (ndarray): Frame from cv2.VideoCapture
+        size (tuple): (width, height) expected by the model (optional)
+        dst (ndarray): Output array, e.g. a shared memory slot (optional)
+
+    Returns:
+        (ndarray) RGB frame
+
+    """
+    if (size is not None and
+            (frame_bgr.shape[1], frame_bgr.shape[0]) != tuple(size)):
+        # Resize first: the conversion runs on the smaller frame when
+        # downscaling
+        frame_bgr = cv2.resize(frame_bgr, tuple(size),
+                interpolation=cv2.INTER_AREA)
+    if (dst is not None):
+        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB, dst=dst)
+    return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+
+class FrameDecoder:
+    """
+    This class decodes the frames in the calling thread and returns them in
+    the model layout. It replaces the cv2.VideoCapture in the inflow.
+    """
+    in_slots = False
+
+    def __init__(self, vs, size=None):
+        """
+        Args:
+            vs (VideoCapture): Opened source
+            size (tuple): (width, height) of the model input (optional)
+        """
+        self.vs = vs
+        self.size = size
+
+    def read(self):
+        (ret, frame) = self.vs.read()
+        if (ret):
+            frame = to_model_layout(frame, self.size)
+        return (ret, frame)
+
+    def release(self):
+        self.vs.release()
+
+
+def decode_chunks(source, decoder, num_decoders, num_frames, chunk, size,
+        out_q, fbuf=None):
+    """
+    Decoder process: decode the chunks decoder, decoder + num_decoders, ...
+    of the file, seeking to the first frame of each chunk
+
+    The frames (or their slots) are sent to out_q, each chunk is terminated
+    by None.
+    """
+    vs = cv2.VideoCapture(source)
+    for start in range(decoder * chunk, num_frames, num_decoders * chunk):
+        if (vs.get(cv2.CAP_PROP_POS_FRAMES) != start):
+            vs.set(cv2.CAP_PROP_POS_FRAMES, start)
+            # Decode up to the frame if the seek stopped before it
+            while (vs.get(cv2.CAP_PROP_POS_FRAMES) < start and vs.grab()):
+                pass
+
+        for _ in range(min(chunk, num_frames - start)):
+            (ret, frame) = vs.read()
+            if (not ret):
+                break
+            if (fbuf is not None):
+                slot = fbuf.acquire()
+                to_model_layout(frame, size, dst=fbuf.view(slot))
+                out_q.put(slot)
+            else:
+                out_q.put(to_model_layout(frame, size))
+        out_q.put(None)
+    vs.release()
+
+
+class ParallelDecoder:
+    """
+    This class decodes a seekable file with several processes.
+
+    The file is split in chunks of `chunk` frames, assigned in turn to the
+    decoder processes, so that while the reader consumes a chunk the other
+    decoders are decoding the next ones. The frames are returned in order,
+    in the model layout, directly in the shared memory slots if a frame
+    buffer is given.
+    """
+
+    def __init__(self, source, num_frames, num_decoders=2, chunk=32,
+            size=None, fbuf=None):
+        """
+        Args:
+            source (Str): Path to the input file
+            num_frames (int): Number of frames of the file
+            num_decoders (int): Number of decoder processes
+            chunk (int): Frames decoded after each seek
+            size (tuple): (width, height) of the model input (optional)
+            fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        """
+        self.num_decoders = max(1, num_decoders)
+        self.in_slots = fbuf is not None
+
+        # Each decoder can run a whole chunk ahead
+        self._queues = [Queue(maxsize=chunk + 1) for _ in range(self.num_decoders)]
+        self._decoders = [Process(target=decode_chunks,
+            args=(source, d, self.num_decoders, num_frames, chunk, size,
+                self._queues[d], fbuf), daemon=True)
+            for d in range(self.num_decoders)]
+        for p in self._decoders:
+            p.start()
+
+        self._current = 0
+        self._chunks_left = [len(range(d * chunk, num_frames, self.num_decoders * chunk))
+                for d in range(self.num_decoders)]
+
+    def read(self):
+        """
+        Returns:
+            (ret, frame data or slot) like cv2.VideoCapture.read()
+        """
+        while (any(self._chunks_left)):
+            d = self._current
+            if (self._chunks_left[d] == 0):
+                self._current = (d + 1) % self.num_decoders
+                continue
+
+            frame = self._queues[d].get()
+            if (frame is not None):
+                return (True, frame)
+
+            # End of the chunk, the next one is on the next decoder
+            self._chunks_left[d] -= 1
+            self._current = (d + 1) % self.num_decoders
+
+        return (False, None)
+
+    def release(self):
+        """
+        Stop the decoders (also when the stream is interrupted)
+        """
+        for p in self._decoders:
+            if (p.is_alive()):
+                p.terminate()
+            p.join()
+        for q in self._queues:
+            q.cancel_join_thread()
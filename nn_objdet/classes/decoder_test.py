@@ -0,0 +1,95 @@
+"""Tests for classes.decoder."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from classes.decoder import (FrameDecoder, ParallelDecoder, parse_size,
+        to_model_layout)
+from classes.frame_buffer import SharedFrameBuffer
+
+
+NUM_FRAMES = 23
+
+
+def _read_all(reader, fbuf=None):
+    frames = []
+    while (True):
+        (ret, frame) = reader.read()
+        if (not ret):
+            break
+        if (fbuf is not None):
+            frames.append(fbuf.view(frame).copy())
+            fbuf.release(frame)
+        else:
+            frames.append(frame)
+    reader.release()
+    return frames
+
+
+class ToModelLayoutTest(unittest.TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("300x200"), (300, 200))
+        self.assertIsNone(parse_size(""))
+
+    def test_rgb(self):
+        frame = np.zeros((4, 6, 3), dtype=np.uint8)
+        frame[..., 0] = 255
+        rgb = to_model_layout(frame)
+        self.assertEqual(rgb[0, 0].tolist(), [0, 0, 255])
+
+    def test_resize_into_dst(self):
+        frame = np.zeros((40, 60, 3), dtype=np.uint8)
+        dst = np.empty((20, 30, 3), dtype=np.uint8)
+        rgb = to_model_layout(frame, (30, 20), dst=dst)
+        self.assertIs(rgb, dst)
+
+
+class ParallelDecoderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, "in.avi")
+        vw = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*'MJPG'), 25,
+                (64, 48))
+        for i in range(NUM_FRAMES):
+            # Every frame is different
+            vw.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+        vw.release()
+
+        cls.expected = _read_all(FrameDecoder(cv2.VideoCapture(cls.path)))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_sequential_decode(self):
+        self.assertEqual(len(self.expected), NUM_FRAMES)
+
+    def test_same_frames_in_order(self):
+        frames = _read_all(ParallelDecoder(self.path, NUM_FRAMES,
+            num_decoders=3, chunk=4))
+        self.assertEqual(len(frames), NUM_FRAMES)
+        for frame, expected in zip(frames, self.expected):
+            np.testing.assert_array_equal(frame, expected)
+
+    def test_decode_in_slots(self):
+        fbuf = SharedFrameBuffer(2 * 6, (24, 32, 3))
+        try:
+            frames = _read_all(ParallelDecoder(self.path, NUM_FRAMES,
+                num_decoders=2, chunk=5, size=(32, 24), fbuf=fbuf), fbuf)
+        finally:
+            fbuf.close()
+        self.assertEqual(len(frames), NUM_FRAMES)
+        for frame, expected in zip(frames, self.expected):
+            self.assertEqual(frame.shape, (24, 32, 3))
+            self.assertEqual(frame[0, 0, 0], expected[0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+# @file: detection_cache.py
+#
+#
+import hashlib
+import os
+
+import numpy as np
+
+from classes.detections import Detections
+
+
+def content_digest(*parts):
+    """
+    Hash of some bytes-like objects (e.g. the serialized graph and the
+    options changing the detections)
+
+    Returns:
+        (Str) Hex digest
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()
+
+
+class DetectionCache:
+    """
+    This class stores the detections of the frames on disk, so that the same
+    footage processed again with the same graph skips the inference.
+
+    The entries are keyed by the hash of the decoded frame and grouped in a
+    directory per graph (namespace). Each entry is a small .npz file with the
+    raw detection arrays (before any rendering threshold). The files are
+    written atomically, so the cache can be shared by the worker processes.
+    The modification time of a file is its last use: when the cache grows
+    beyond max_bytes the least recently used entries are removed.
+
+    The other processes add entries too: the size is read again from the
+    directory before evicting, and after each SCAN_FRACTION * max_bytes
+    written by this instance, so that N workers cannot grow the cache to
+    N * max_bytes.
+    """
+    # Bytes written between two scans of the directory, relative to max_bytes
+    SCAN_FRACTION = 1 / 16
+
+    def __init__(self, directory, namespace, max_bytes=512 << 20):
+        """
+        Args:
+            directory (Str): Root directory of the cache
+            namespace (Str): Identifier of the graph (and of the options)
+                producing the detections, e.g. from content_digest()
+            max_bytes (int): Size limit of the namespace
+        """
+        self.path = os.path.join(directory, namespace)
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+        # Size at the last scan of the directory plus the entries written
+        # since then by this instance
+        self._size = self.disk_size()
+        self._unscanned = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _entries(self):
+        return [e for e in os.scandir(self.path)
+                if e.is_file() and e.name.endswith(".npz")]
+
+    def disk_size(self):
+        """
+        Returns:
+            (int) Size of the entries in the directory, of all the processes
+        """
+        size = 0
+        for e in self._entries():
+            try:
+                size += e.stat().st_size
+            except OSError:
+                # Removed by another process
+                pass
+        return size
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+    def key(self, image_np):
+        """
+        Returns:
+            (Str) Hash of the frame content (and shape)
+        """
+        image_np = np.ascontiguousarray(image_np)
+        return content_digest(str(image_np.shape).encode(), image_np.data)
+
+    def get(self, key):
+        """
+        Returns:
+            (Detections) The cached detections, None on a miss
+        """
+        path = self._file(key)
+        try:
+            with np.load(path) as entry:
+                detections = Detections(boxes=entry["boxes"],
+                        scores=entry["scores"], classes=entry["classes"],
+                        num_detections=len(entry["scores"]))
+        except (OSError, KeyError, ValueError):
+            # Missing (or evicted while reading)
+            self.misses += 1
+            return None
+
+        try:
+            # Most recently used
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return detections
+
+    def put(self, key, detections):
+        """
+        Store the detections of a frame
+        """
+        path = self._file(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, boxes=detections.boxes, scores=detections.scores,
+                    classes=detections.classes)
+        os.replace(tmp, path)
+
+        entry_size = os.path.getsize(path)
+        self._size += entry_size
+        self._unscanned += entry_size
+        if (self._size > self.max_bytes or
+                self._unscanned >= self.SCAN_FRACTION * self.max_bytes):
+            self._size = self.disk_size()
+            self._unscanned = 0
+            if (self._size > self.max_bytes):
+                self.evict()
+
+    def evict(self, target=0.9):
+        """
+        Remove the least recently used entries until the cache is below
+        target * max_bytes
+        """
+        entries = []
+        for e in self._entries():
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+
+        size = sum(entry[1] for entry in entries)
+        for (_, entry_size, path) in entries:
+            if (size <= target * self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already removed by another process
+                pass
+            size -= entry_size
+        self._size = size
+        self._unscanned = 0
+
+    def lookup(self, image_np, run):
+        """
+        Detections of a frame, from the cache or from run(image_np)
+        """
+        key = self.key(image_np)
+        detections = self.get(key)
+        if (detections is None):
+            detections = run(image_np)
+            self.put(key, detections)
+        return detections
+
+    def lookup_batch(self, images_np, run_batch):
+        """
+        Detections of a list of frames: only the frames missing from the
+        cache go through run_batch(images)
+        """
+        keys = [self.key(image_np) for image_np in images_np]
+        detections = [self.get(key) for key in keys]
+        missing = [i for (i, d) in enumerate(detections) if d is None]
+        if (len(missing) > 0):
+            results = run_batch([images_np[i] for i in missing])
+            for (i, result) in zip(missing, results):
+                self.put(keys[i], result)
+                detections[i] = result
+        return detections
+
+    def report(self):
+        total = self.hits + self.misses
+        return (f"Detection cache: {self.hits}/{total} hits" +
+                (f" ({100 * self.hits / total:0.1f}%)" if total > 0 else ""))
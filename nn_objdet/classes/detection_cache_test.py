@@ -0,0 +1,115 @@
+"""Tests for classes.detection_cache."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from classes.detection_cache import DetectionCache, content_digest
+from classes.detections import Detections
+
+
+def _frame(level):
+    return np.full((48, 64, 3), level, dtype=np.uint8)
+
+
+def _detections(score):
+    return Detections(boxes=np.array([[0.1, 0.2, 0.3, 0.4]], dtype=np.float32),
+            scores=np.array([score], dtype=np.float32),
+            classes=np.array([7], dtype=np.uint16), num_detections=1)
+
+
+class DetectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.runs = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _run(self, image_np):
+        self.runs.append(int(image_np[0, 0, 0]))
+        return _detections(image_np[0, 0, 0] / 255.0)
+
+    def _run_batch(self, images_np):
+        return [self._run(image_np) for image_np in images_np]
+
+    def test_miss_then_hit(self):
+        cache = DetectionCache(self.tmp, "graph")
+        first = cache.lookup(_frame(10), self._run)
+        second = cache.lookup(_frame(10), self._run)
+
+        self.assertEqual(self.runs, [10])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        np.testing.assert_array_equal(second.boxes, first.boxes)
+        np.testing.assert_array_equal(second.scores, first.scores)
+        np.testing.assert_array_equal(second.classes, first.classes)
+        self.assertEqual(second.classes.dtype, np.uint16)
+        self.assertEqual(second.num_detections, 1)
+
+    def test_persistent_across_instances(self):
+        DetectionCache(self.tmp, "graph").lookup(_frame(10), self._run)
+        cache = DetectionCache(self.tmp, "graph")
+        cache.lookup(_frame(10), self._run)
+        self.assertEqual(self.runs, [10])
+
+    def test_namespace_per_graph(self):
+        DetectionCache(self.tmp, content_digest(b"graph a")).lookup(_frame(10), self._run)
+        DetectionCache(self.tmp, content_digest(b"graph b")).lookup(_frame(10), self._run)
+        self.assertEqual(self.runs, [10, 10])
+
+    def test_key_depends_on_content_and_shape(self):
+        cache = DetectionCache(self.tmp, "graph")
+        self.assertEqual(cache.key(_frame(1)), cache.key(_frame(1)))
+        self.assertNotEqual(cache.key(_frame(1)), cache.key(_frame(2)))
+        self.assertNotEqual(cache.key(np.zeros((4, 6, 3), np.uint8)),
+                cache.key(np.zeros((6, 4, 3), np.uint8)))
+
+    def test_batch_runs_only_the_misses(self):
+        cache = DetectionCache(self.tmp, "graph")
+        cache.lookup(_frame(2), self._run)
+        results = cache.lookup_batch([_frame(1), _frame(2), _frame(3)],
+                self._run_batch)
+        self.assertEqual(self.runs, [2, 1, 3])
+        self.assertAlmostEqual(float(results[1].scores[0]), 2 / 255.0, places=6)
+
+    def test_least_recently_used_evicted(self):
+        cache = DetectionCache(self.tmp, "graph")
+        cache.lookup(_frame(1), self._run)
+        entry_size = cache._size
+        cache.max_bytes = int(2.5 * entry_size)
+
+        now = time.time()
+        os.utime(cache._file(cache.key(_frame(1))), (now - 20, now - 20))
+        cache.lookup(_frame(2), self._run)
+        os.utime(cache._file(cache.key(_frame(2))), (now - 10, now - 10))
+        # A hit makes the first frame the most recently used
+        cache.lookup(_frame(1), self._run)
+        cache.lookup(_frame(3), self._run)
+
+        self.assertLessEqual(cache._size, cache.max_bytes)
+        self.assertIsNone(cache.get(cache.key(_frame(2))))
+        self.assertIsNotNone(cache.get(cache.key(_frame(1))))
+        self.assertIsNotNone(cache.get(cache.key(_frame(3))))
+
+    def test_size_shared_by_the_instances(self):
+        # Two workers filling the same cache
+        caches = [DetectionCache(self.tmp, "graph") for _ in range(2)]
+        caches[0].lookup(_frame(0), self._run)
+        entry_size = caches[0].disk_size()
+        for cache in caches:
+            cache.max_bytes = int(6.5 * entry_size)
+
+        # Each one alone stays below the limit, not both together
+        for level in range(1, 11):
+            caches[level % 2].lookup(_frame(level), self._run)
+            self.assertLessEqual(caches[0].disk_size(), caches[0].max_bytes)
+        # The most recent entries are kept
+        self.assertIsNotNone(caches[0].get(caches[0].key(_frame(10))))
+
+
+if __name__ == '__main__':
+    unittest.main()
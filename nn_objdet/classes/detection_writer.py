@@ -0,0 +1,148 @@
+# @file: detection_writer.py
+#
+#
+import os
+import zipfile
+
+import numpy as np
+
+from classes.detections import Detections
+
+
+# Columns of a chunk: one row per frame, then one row per detection
+# (the detections of a frame are num_detections consecutive rows)
+FRAME_COLUMNS = ("frame_index", "timestamp", "num_detections")
+DETECTION_COLUMNS = ("boxes", "scores", "classes")
+
+
+class DetectionWriter:
+    """
+    This class streams the detections of a video to a columnar file.
+
+    The file is a .npz archive that grows by chunks: the frames are buffered
+    and every chunk_frames frames the columns of the chunk are appended as
+    the arrays "<chunk>/<column>". The archive is closed after each chunk,
+    so it can be read while it is being written (and after a crash).
+    """
+
+    def __init__(self, path, fps=0, chunk_frames=1024, compress=False):
+        """
+        Args:
+            path (Str): Output file (.npz)
+            fps (float): Frame rate of the source, for the timestamps
+            chunk_frames (int): Frames written at once
+            compress (Bool): Deflate the arrays
+        """
+        self.path = path
+        self.fps = fps
+        self.chunk_frames = max(1, chunk_frames)
+        self.compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+
+        self.num_chunks = 0
+        self.num_frames = 0
+        self._clear()
+
+        # Start a new file
+        if (os.path.exists(path)):
+            os.remove(path)
+
+    def _clear(self):
+        self._frames = {column: [] for column in FRAME_COLUMNS}
+        self._detections = {column: [] for column in DETECTION_COLUMNS}
+
+    def append(self, index, detections, timestamp=None):
+        """
+        Add the detections of a frame
+
+        Args:
+            index (int): Index of the frame
+            detections (Detections): Detections of the frame
+            timestamp (float): Time of the frame in the stream [s] (default:
+                from the index and the frame rate)
+        """
+        if (timestamp is None):
+            timestamp = (index - 1) / self.fps if self.fps > 0 else np.nan
+
+        self._frames["frame_index"].append(index)
+        self._frames["timestamp"].append(timestamp)
+        self._frames["num_detections"].append(detections.num_detections)
+        self._detections["boxes"].append(detections.boxes)
+        self._detections["scores"].append(detections.scores)
+        self._detections["classes"].append(detections.classes)
+
+        if (len(self._frames["frame_index"]) >= self.chunk_frames):
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered frames to the file as a new chunk
+        """
+        if (len(self._frames["frame_index"]) == 0):
+            return
+
+        columns = {
+                "frame_index": np.array(self._frames["frame_index"], dtype=np.int64),
+                "timestamp": np.array(self._frames["timestamp"], dtype=np.float64),
+                "num_detections": np.array(self._frames["num_detections"], dtype=np.int32),
+                "boxes": np.concatenate(self._detections["boxes"]).reshape(-1, 4)
+                    .astype(np.float32, copy=False),
+                "scores": np.concatenate(self._detections["scores"])
+                    .astype(np.float32, copy=False),
+                "classes": np.concatenate(self._detections["classes"])
+                    .astype(np.uint16, copy=False),
+                }
+
+        with zipfile.ZipFile(self.path, mode="a",
+                compression=self.compression) as zf:
+            for (column, array) in columns.items():
+                with zf.open(f"{self.num_chunks:06d}/{column}.npy", mode="w",
+                        force_zip64=True) as f:
+                    np.lib.format.write_array(f, array, allow_pickle=False)
+
+        self.num_chunks += 1
+        self.num_frames += len(columns["frame_index"])
+        self._clear()
+
+    def close(self):
+        self.flush()
+
+
+def load_detections(path):
+    """
+    Read a file written by DetectionWriter
+
+    Args:
+        path (Str): Path to the .npz file
+
+    Returns:
+        (dict) The columns of all the chunks, concatenated
+
+    """
+    columns = {column: [] for column in FRAME_COLUMNS + DETECTION_COLUMNS}
+    with np.load(path) as npz:
+        chunks = sorted({key.split("/")[0] for key in npz.files})
+        for chunk in chunks:
+            for column in columns:
+                columns[column].append(npz[f"{chunk}/{column}"])
+
+    if (len(chunks) == 0):
+        return {column: np.zeros((0, 4) if column == "boxes" else 0)
+                for column in columns}
+    return {column: np.concatenate(arrays) for (column, arrays) in columns.items()}
+
+
+def iter_detections(columns):
+    """
+    Split the columns returned by load_detections() per frame
+
+    Yields:
+        (frame_index, timestamp, Detections)
+    """
+    offsets = np.concatenate(([0], np.cumsum(columns["num_detections"])))
+    for i in range(len(columns["frame_index"])):
+        (a, b) = (offsets[i], offsets[i + 1])
+        yield (int(columns["frame_index"][i]), float(columns["timestamp"][i]),
+                Detections(boxes=columns["boxes"][a:b],
+                    scores=columns["scores"][a:b],
+                    classes=columns["classes"][a:b],
+                    num_detections=int(b - a)))
@@ -0,0 +1,68 @@
+"""Tests for classes.detection_writer."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from classes.detection_writer import (DetectionWriter, load_detections,
+        iter_detections)
+from classes.detections import make_detections
+
+
+def _detections(n):
+    boxes = np.tile(np.array([0.1, 0.2, 0.3, 0.4]), (n, 1))
+    return make_detections(boxes, np.full(n, 0.5), np.arange(1, n + 1), n)
+
+
+class DetectionWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "detections.npz")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunks(self):
+        writer = DetectionWriter(self.path, fps=10, chunk_frames=4)
+        for index in range(1, 11):
+            writer.append(index, _detections(index % 3))
+        # Two full chunks written, two frames still buffered
+        self.assertEqual(writer.num_chunks, 2)
+        self.assertEqual(len(load_detections(self.path)["frame_index"]), 8)
+
+        writer.close()
+        self.assertEqual(writer.num_chunks, 3)
+        self.assertEqual(writer.num_frames, 10)
+
+        columns = load_detections(self.path)
+        np.testing.assert_array_equal(columns["frame_index"], np.arange(1, 11))
+        np.testing.assert_allclose(columns["timestamp"], np.arange(10) / 10)
+        self.assertEqual(len(columns["boxes"]), sum(i % 3 for i in range(1, 11)))
+        self.assertEqual(columns["boxes"].dtype, np.float32)
+        self.assertEqual(columns["classes"].dtype, np.uint16)
+
+    def test_iter_detections(self):
+        writer = DetectionWriter(self.path, chunk_frames=2)
+        for index in range(1, 6):
+            writer.append(index, _detections(index % 3), timestamp=index * 0.5)
+        writer.close()
+
+        frames = list(iter_detections(load_detections(self.path)))
+        self.assertEqual([f[0] for f in frames], [1, 2, 3, 4, 5])
+        self.assertEqual([f[1] for f in frames], [0.5, 1.0, 1.5, 2.0, 2.5])
+        self.assertEqual([f[2].num_detections for f in frames], [1, 2, 0, 1, 2])
+        np.testing.assert_array_equal(frames[1][2].classes, [1, 2])
+
+    def test_overwrites_previous_file(self):
+        for _ in range(2):
+            writer = DetectionWriter(self.path)
+            writer.append(1, _detections(1))
+            writer.close()
+        self.assertEqual(len(load_detections(self.path)["frame_index"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
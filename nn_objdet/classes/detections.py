@@ -0,0 +1,84 @@
+# @file: detections.py
+#
+#
+import collections
+
+import numpy as np
+
+
+# Detection results of a single frame.
+# boxes [N, 4] float32 (ymin, xmin, ymax, xmax) normalized coordinates
+# scores [N] float32
+# classes [N] uint16 (1-based, keys of the category index)
+# num_detections (int) N
+Detections = collections.namedtuple('Detections',
+        ['boxes', 'scores', 'classes', 'num_detections'])
+
+# Fixed size record of the detections of a frame, so that the results can
+# be exchanged through shared memory without serialization
+MAX_DETECTIONS = 100
+DETECTION_RECORD = np.dtype([
+        ('frame_id', np.int64),
+        ('num_detections', np.int32),
+        ('boxes', np.float32, (MAX_DETECTIONS, 4)),
+        ('scores', np.float32, (MAX_DETECTIONS,)),
+        ('classes', np.uint16, (MAX_DETECTIONS,))])
+
+
+def make_detections(boxes, scores, classes, num_detections):
+    """
+    Build the compact detection results of a frame from the raw outputs of
+    the graph, keeping only the valid detections
+
+    Args:
+        boxes (ndarray): Detection boxes [max_detections, 4]
+        scores (ndarray): Detection scores [max_detections]
+        classes (ndarray): Detection classes [max_detections]
+        num_detections (float): Number of valid detections
+
+    Returns:
+        (Detections)
+
+    """
+    n = int(num_detections)
+    return Detections(
+            boxes=np.asarray(boxes[:n], dtype=np.float32),
+            scores=np.asarray(scores[:n], dtype=np.float32),
+            classes=np.asarray(classes[:n], dtype=np.uint16),
+            num_detections=n)
+
+
+def to_record(record, frame_id, detections):
+    """
+    Write the detections of a frame in a DETECTION_RECORD (in place)
+
+    Args:
+        record: DETECTION_RECORD element, e.g. a shared memory slot
+        frame_id (int): Index of the frame
+        detections (Detections): Detections of the frame (at most
+            MAX_DETECTIONS are kept)
+    """
+    n = min(detections.num_detections, MAX_DETECTIONS)
+    record['frame_id'] = frame_id
+    record['num_detections'] = n
+    record['boxes'][:n] = detections.boxes[:n]
+    record['scores'][:n] = detections.scores[:n]
+    record['classes'][:n] = detections.classes[:n]
+
+
+def from_record(record):
+    """
+    Read the detections of a frame from a DETECTION_RECORD
+
+    The valid rows are copied, the record can be reused right after.
+
+    Returns:
+        (frame_id, Detections)
+
+    """
+    n = int(record['num_detections'])
+    return (int(record['frame_id']), Detections(
+            boxes=record['boxes'][:n].copy(),
+            scores=record['scores'][:n].copy(),
+            classes=record['classes'][:n].copy(),
+            num_detections=n))
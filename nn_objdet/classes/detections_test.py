@@ -0,0 +1,70 @@
+"""Tests for classes.detections."""
+import unittest
+
+import numpy as np
+
+from classes.detections import (make_detections, to_record, from_record,
+        DETECTION_RECORD, MAX_DETECTIONS)
+from classes.frame_buffer import SharedFrameBuffer
+
+
+class MakeDetectionsTest(unittest.TestCase):
+
+    def test_keeps_only_valid_detections(self):
+        boxes = np.zeros((100, 4), dtype=np.float32)
+        boxes[:2] = [[0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 1.0, 1.0]]
+        scores = np.zeros(100, dtype=np.float32)
+        scores[:2] = [0.9, 0.6]
+        classes = np.ones(100, dtype=np.float32)
+        classes[:2] = [1.0, 18.0]
+
+        det = make_detections(boxes, scores, classes, 2.0)
+
+        self.assertEqual(det.num_detections, 2)
+        self.assertEqual(det.boxes.shape, (2, 4))
+        self.assertEqual(det.boxes.dtype, np.float32)
+        self.assertEqual(det.classes.dtype, np.uint16)
+        np.testing.assert_array_equal(det.classes, [1, 18])
+        np.testing.assert_allclose(det.scores, [0.9, 0.6])
+
+    def test_no_detections(self):
+        det = make_detections(np.zeros((100, 4)), np.zeros(100),
+                np.zeros(100), 0)
+        self.assertEqual(det.num_detections, 0)
+        self.assertEqual(det.boxes.shape, (0, 4))
+
+
+class DetectionRecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rbuf = SharedFrameBuffer(2, (), DETECTION_RECORD)
+
+    def tearDown(self):
+        self.rbuf.close()
+
+    def test_round_trip_in_shared_memory(self):
+        det = make_detections(np.array([[0.1, 0.2, 0.3, 0.4]]),
+                np.array([0.7]), np.array([5]), 1)
+        to_record(self.rbuf.view(1), 42, det)
+
+        (frame_id, out) = from_record(self.rbuf.view(1))
+        self.assertEqual(frame_id, 42)
+        self.assertEqual(out.num_detections, 1)
+        np.testing.assert_array_equal(out.boxes, det.boxes)
+        np.testing.assert_array_equal(out.classes, [5])
+
+        # The result does not depend on the record any more
+        to_record(self.rbuf.view(1), 43, make_detections(
+            np.zeros((0, 4)), np.zeros(0), np.zeros(0), 0))
+        np.testing.assert_array_equal(out.classes, [5])
+
+    def test_truncates_to_the_record_size(self):
+        n = MAX_DETECTIONS + 5
+        det = make_detections(np.zeros((n, 4)), np.ones(n), np.ones(n), n)
+        to_record(self.rbuf.view(0), 1, det)
+        self.assertEqual(from_record(self.rbuf.view(0))[1].num_detections,
+                MAX_DETECTIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
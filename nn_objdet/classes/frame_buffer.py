@@ -0,0 +1,93 @@
+# @file: frame_buffer.py
+#
+#
+import numpy as np
+from multiprocessing import Queue
+from multiprocessing import shared_memory
+
+
+class SharedFrameBuffer:
+    """
+    This class provides a ring of preallocated frame slots in shared memory.
+
+    Only the index of a slot travels through the pipeline queues: the producer
+    acquires a free slot and writes the frame in it, the consumer releases the
+    slot once the frame has been used, so that it can be reused.
+    """
+
+    def __init__(self, num_slots, shape, dtype=np.uint8):
+        """
+        Args:
+            num_slots (int): Number of frame slots in the ring
+            shape (tuple): Shape of a single frame (height, width, channels)
+            dtype: Type of the frame elements
+        """
+        self.num_slots = num_slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self._shm = shared_memory.SharedMemory(create=True,
+                size=self.slot_size * num_slots)
+        self._owner = True
+        self._frames = None
+
+        # Queue of the slots that can be (re)used by the producer
+        self._free_q = Queue(maxsize=num_slots)
+        for slot in range(num_slots):
+            self._free_q.put(slot)
+
+    def __getstate__(self):
+        # Only the reference to the shared segment is sent to the other
+        # processes, the ndarray view is rebuilt after the attach.
+        state = self.__dict__.copy()
+        state["_frames"] = None
+        state["_owner"] = False
+        return state
+
+    @property
+    def frames(self):
+        """ ndarray view [num_slots, H, W, C] of the shared segment """
+        if (self._frames is None):
+            self._frames = np.ndarray((self.num_slots,) + self.shape,
+                    dtype=self.dtype, buffer=self._shm.buf)
+        return self._frames
+
+    def acquire(self, block=True, timeout=None):
+        """
+        Get a free slot, blocking until one is released
+
+        Returns:
+            slot (int): Index of the slot
+        """
+        return self._free_q.get(block=block, timeout=timeout)
+
+    def release(self, slot):
+        """
+        Give a slot back to the ring
+        """
+        self._free_q.put(slot)
+
+    def write(self, slot, frame):
+        """
+        Copy a frame in a slot
+        """
+        if (frame.shape != self.shape):
+            raise ValueError(f"Frame shape {frame.shape} does not match " +
+                    f"the slot shape {self.shape}")
+        np.copyto(self.frames[slot], frame)
+
+    def view(self, slot):
+        """
+        Get the frame stored in a slot (no copy)
+        """
+        return self.frames[slot]
+
+    def close(self):
+        """
+        Detach from the shared segment, the owner also destroys it
+        """
+        self._frames = None
+        self._shm.close()
+        if (self._owner):
+            self._shm.unlink()
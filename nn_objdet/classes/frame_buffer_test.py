@@ -0,0 +1,56 @@
+"""Tests for classes.frame_buffer."""
+from multiprocessing import Process, Queue
+import unittest
+
+import numpy as np
+
+from classes.frame_buffer import SharedFrameBuffer
+
+
+def _invert_slot(fbuf, slot, done_q):
+    frame = fbuf.view(slot)
+    np.copyto(frame, 255 - frame)
+    done_q.put(slot)
+
+
+class SharedFrameBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fbuf = SharedFrameBuffer(3, (4, 6, 3))
+
+    def tearDown(self):
+        self.fbuf.close()
+
+    def test_write_and_view(self):
+        frame = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+        slot = self.fbuf.acquire()
+        self.fbuf.write(slot, frame)
+        np.testing.assert_array_equal(self.fbuf.view(slot), frame)
+
+    def test_write_wrong_shape(self):
+        slot = self.fbuf.acquire()
+        with self.assertRaises(ValueError):
+            self.fbuf.write(slot, np.zeros((2, 2, 3), dtype=np.uint8))
+
+    def test_slot_reuse(self):
+        slots = [self.fbuf.acquire(timeout=1) for _ in range(3)]
+        self.assertEqual(sorted(slots), [0, 1, 2])
+        with self.assertRaises(Exception):
+            self.fbuf.acquire(timeout=0.05)
+        self.fbuf.release(slots[1])
+        self.assertEqual(self.fbuf.acquire(timeout=1), slots[1])
+
+    def test_shared_across_processes(self):
+        slot = self.fbuf.acquire()
+        self.fbuf.write(slot, np.full((4, 6, 3), 10, dtype=np.uint8))
+        done_q = Queue()
+        p = Process(target=_invert_slot, args=(self.fbuf, slot, done_q))
+        p.start()
+        self.assertEqual(done_q.get(timeout=10), slot)
+        p.join()
+        np.testing.assert_array_equal(self.fbuf.view(slot),
+                np.full((4, 6, 3), 245, dtype=np.uint8))
+
+
+if __name__ == '__main__':
+    unittest.main()
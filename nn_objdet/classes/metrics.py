@@ -0,0 +1,218 @@
+# @file: metrics.py
+#
+#
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+import time
+
+from classes.timemeas import LatencyHistogram
+
+
+# Prefix of the metric names
+PREFIX = "nn_objdet_"
+
+
+def format_labels(labels):
+    """
+    Returns:
+        (Str) {name="value",...} of a dict of labels ("" if empty)
+    """
+    if (not labels):
+        return ""
+    pairs = []
+    for (name, value) in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"') \
+                .replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class MetricsText:
+    """
+    This class builds a page in the Prometheus text exposition format
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._declared = set()
+
+    def _declare(self, name, kind, help_text):
+        if (name not in self._declared):
+            self._declared.add(name)
+            self._lines.append(f"# HELP {name} {help_text}")
+            self._lines.append(f"# TYPE {name} {kind}")
+
+    def add(self, name, kind, help_text, value, labels=None):
+        """
+        Add a sample of a counter or a gauge
+
+        Args:
+            name (Str): Name of the metric, without the prefix
+            kind (Str): "counter" or "gauge"
+            help_text (Str): Description of the metric
+            value (float): Value of the sample
+            labels (dict): Labels of the sample (optional)
+        """
+        name = PREFIX + name
+        self._declare(name, kind, help_text)
+        self._lines.append(f"{name}{format_labels(labels)} {float(value):.9g}")
+
+    def add_summary(self, name, help_text, hist, labels=None):
+        """
+        Add a LatencyHistogram as a summary: its percentiles, sum and count
+
+        Args:
+            name (Str): Name of the metric, without the prefix
+            help_text (Str): Description of the metric
+            hist (LatencyHistogram): Values [s]
+            labels (dict): Labels of the samples (optional)
+        """
+        name = PREFIX + name
+        self._declare(name, "summary", help_text)
+        labels = dict(labels or {})
+        if (hist.count > 0):
+            for q in LatencyHistogram.PERCENTILES:
+                quantile = dict(labels, quantile=f"{q / 100:g}")
+                self._lines.append(f"{name}{format_labels(quantile)} " +
+                        f"{hist.percentile(q):.9g}")
+        self._lines.append(f"{name}_sum{format_labels(labels)} " +
+                f"{float(hist.data[hist.SUM]):.9g}")
+        self._lines.append(f"{name}_count{format_labels(labels)} {hist.count}")
+
+    def render(self):
+        return "\n".join(self._lines) + "\n"
+
+
+class PipelineMetrics:
+    """
+    This class collects the metrics of the running pipeline from the shared
+    memory counters of the processes: the StreamStats of the data flows,
+    the WorkerStats of the workers and the depth of the queues.
+    """
+
+    def __init__(self, queues, streams, workers):
+        """
+        Args:
+            queues (dict): name -> (Queue, capacity)
+            streams (list): StreamStats of the streams (on the shared arrays)
+            workers (function): Returns the WorkerStats of the running
+                workers
+        """
+        self.queues = queues
+        self.streams = streams
+        self.workers = workers
+        # row -> (time, frames) of the previous collection, for the FPS
+        self._previous = {}
+        self._t_start = time.monotonic()
+        # The server answers the scrapes in parallel threads
+        self._lock = Lock()
+
+    def collect(self):
+        """
+        Returns:
+            (Str) The metrics in the Prometheus text format
+        """
+        with self._lock:
+            return self._collect()
+
+    def _collect(self):
+        text = MetricsText()
+        now = time.monotonic()
+
+        for (name, (q, capacity)) in self.queues.items():
+            try:
+                depth = q.qsize()
+            except NotImplementedError:
+                continue
+            text.add("queue_depth", "gauge", "Items waiting in the queue",
+                    depth, {"queue": name})
+            text.add("queue_capacity", "gauge", "Capacity of the queue",
+                    capacity, {"queue": name})
+
+        for stats in self.streams:
+            labels = {"stream": stats.stream}
+            (read, written, dropped) = stats.counters()
+            text.add("frames_read_total", "counter",
+                    "Frames read from the source", read, labels)
+            text.add("frames_written_total", "counter",
+                    "Frames written by the output stage", written, labels)
+            text.add("frames_dropped_total", "counter",
+                    "Frames dropped before the output", dropped, labels)
+            for (stage, busy) in stats.busy().items():
+                text.add("stage_busy_seconds_total", "counter",
+                        "Time the stage spent working", busy,
+                        dict(labels, stage=stage))
+            text.add_summary("frame_latency_seconds",
+                    "End-to-end latency of the frames, from the read to the write",
+                    stats.latency, labels)
+
+        workers = self.workers()
+        text.add("workers", "gauge", "Running workers", len(workers))
+        for stats in workers:
+            labels = {"worker": stats.row}
+            (busy, frames) = stats.read()
+            (t_prev, frames_prev) = self._previous.get(stats.row,
+                    (self._t_start, 0.0))
+            if (frames < frames_prev):
+                # Row reused by a new worker
+                frames_prev = 0.0
+            fps = (frames - frames_prev) / max(now - t_prev, 1e-9)
+            self._previous[stats.row] = (now, frames)
+
+            text.add("worker_frames_total", "counter",
+                    "Frames processed by the worker", frames, labels)
+            text.add("worker_busy_seconds_total", "counter",
+                    "Time the worker spent processing frames", busy, labels)
+            text.add("worker_fps", "gauge",
+                    "Frames per second of the worker since the previous scrape",
+                    fps, labels)
+            (elapsed, _) = stats.histograms()
+            if (elapsed is not None):
+                text.add_summary("worker_inference_seconds",
+                        "Processing time of the worker calls", elapsed, labels)
+
+        return text.render()
+
+
+class MetricsServer:
+    """
+    This class serves the metrics on http://host:port/metrics from a thread
+    of the main process
+    """
+
+    def __init__(self, collect, port=0, host="127.0.0.1"):
+        """
+        Args:
+            collect (function): Returns the page of the metrics
+            port (int): TCP port, 0 = any free port (see self.port)
+            host (Str): Address to bind, local only by default
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if (self.path.split("?")[0] not in ("/metrics", "/")):
+                    self.send_error(404)
+                    return
+                body = collect().encode()
+                self.send_response(200)
+                self.send_header("Content-Type",
+                        "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # No log line per scrape
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
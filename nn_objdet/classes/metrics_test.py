@@ -0,0 +1,169 @@
+"""Tests for classes.metrics."""
+from multiprocessing import Array, Queue
+from threading import Thread, Event
+import ctypes
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from classes.metrics import MetricsServer, MetricsText, PipelineMetrics, \
+        format_labels
+from classes.pipeline_stats import StreamStats
+from classes.supervisor import WorkerStats
+from classes.timemeas import LatencyHistogram
+
+
+def parse(page):
+    """
+    Returns:
+        (dict) sample -> value of a page in the text format
+    """
+    samples = {}
+    for line in page.splitlines():
+        if (line and not line.startswith("#")):
+            (name, value) = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+class MetricsTextTest(unittest.TestCase):
+
+    def test_labels(self):
+        self.assertEqual(format_labels(None), "")
+        self.assertEqual(format_labels({"a": 1, "b": 'x"y'}),
+                '{a="1",b="x\\"y"}')
+
+    def test_declared_once(self):
+        text = MetricsText()
+        text.add("frames_total", "counter", "Frames", 1, {"stream": 0})
+        text.add("frames_total", "counter", "Frames", 2, {"stream": 1})
+        page = text.render()
+        self.assertEqual(page.count("# TYPE nn_objdet_frames_total counter"), 1)
+        samples = parse(page)
+        self.assertEqual(samples['nn_objdet_frames_total{stream="1"}'], 2)
+
+    def test_summary(self):
+        hist = LatencyHistogram()
+        for _ in range(100):
+            hist.record(0.01)
+        text = MetricsText()
+        text.add_summary("latency_seconds", "Latency", hist)
+        samples = parse(text.render())
+        self.assertEqual(samples["nn_objdet_latency_seconds_count"], 100)
+        self.assertAlmostEqual(samples["nn_objdet_latency_seconds_sum"], 1.0)
+        self.assertAlmostEqual(
+                samples['nn_objdet_latency_seconds{quantile="0.5"}'], 0.01,
+                delta=0.01 * LatencyHistogram.PRECISION)
+
+    def test_empty_summary(self):
+        text = MetricsText()
+        text.add_summary("latency_seconds", "Latency", LatencyHistogram())
+        samples = parse(text.render())
+        self.assertEqual(samples["nn_objdet_latency_seconds_count"], 0)
+        self.assertNotIn('nn_objdet_latency_seconds{quantile="0.5"}', samples)
+
+
+class MetricsServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.q = Queue()
+        self.stream = StreamStats(0, Array(ctypes.c_double, StreamStats.SIZE,
+                lock=False))
+        (array, hists) = WorkerStats.allocate(2)
+        self.workers = [WorkerStats(array, row, hists=hists) for row in range(2)]
+        metrics = PipelineMetrics({"input": (self.q, 5)}, [self.stream],
+                lambda: self.workers)
+        self.server = MetricsServer(metrics.collect, port=0)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def scrape(self, path="/metrics"):
+        url = f"http://127.0.0.1:{self.server.port}{path}"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            self.assertIn("text/plain", response.headers["Content-Type"])
+            return parse(response.read().decode())
+
+    def test_scrape(self):
+        self.q.put("frame")
+        self.q.put("frame")
+        time.sleep(0.05)
+        for index in range(1, 4):
+            self.stream.frame_read()
+            self.stream.arrived(index, time.monotonic() - 0.02)
+        self.stream.written(1)
+        self.stream.written(3)
+        self.stream.add_busy("decode", 0.5)
+        self.workers[0].record(0.25, 10)
+
+        samples = self.scrape()
+        self.assertEqual(samples['nn_objdet_queue_depth{queue="input"}'], 2)
+        self.assertEqual(samples['nn_objdet_queue_capacity{queue="input"}'], 5)
+        self.assertEqual(samples['nn_objdet_frames_read_total{stream="0"}'], 3)
+        self.assertEqual(samples['nn_objdet_frames_written_total{stream="0"}'], 2)
+        self.assertEqual(samples['nn_objdet_frames_dropped_total{stream="0"}'], 1)
+        self.assertEqual(samples[
+            'nn_objdet_stage_busy_seconds_total{stream="0",stage="decode"}'], 0.5)
+        self.assertEqual(
+                samples['nn_objdet_frame_latency_seconds_count{stream="0"}'], 2)
+        self.assertEqual(samples["nn_objdet_workers"], 2)
+        self.assertEqual(samples['nn_objdet_worker_frames_total{worker="0"}'], 10)
+        self.assertEqual(
+                samples['nn_objdet_worker_busy_seconds_total{worker="0"}'], 0.25)
+        self.assertGreater(samples['nn_objdet_worker_fps{worker="0"}'], 0)
+        self.assertEqual(samples['nn_objdet_worker_fps{worker="1"}'], 0)
+
+        # The FPS is measured between two scrapes
+        samples = self.scrape()
+        self.assertEqual(samples['nn_objdet_worker_fps{worker="0"}'], 0)
+
+    def test_worker_histograms(self):
+        tm = self.workers[1].timemeas()
+        tm.start()
+        tm.stop()
+        samples = self.scrape("/")
+        self.assertEqual(
+                samples['nn_objdet_worker_inference_seconds_count{worker="1"}'], 1)
+
+    def test_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.scrape("/other")
+        self.assertEqual(error.exception.code, 404)
+
+
+class PipelineMetricsTest(unittest.TestCase):
+
+    def test_concurrent_collections(self):
+        (array, hists) = WorkerStats.allocate(1)
+        workers = [WorkerStats(array, 0, hists=hists)]
+        (entered, release) = (Event(), Event())
+        calls = []
+
+        def workers_fn():
+            calls.append(len(calls))
+            if (len(calls) == 1):
+                entered.set()
+                release.wait(timeout=5)
+            return workers
+
+        metrics = PipelineMetrics({}, [], workers_fn)
+        threads = [Thread(target=metrics.collect, daemon=True)
+                for _ in range(2)]
+        threads[0].start()
+        self.assertTrue(entered.wait(timeout=5))
+        threads[1].start()
+        time.sleep(0.05)
+        # The second scrape waits for the first one
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(threads[1].is_alive())
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# @file: model_cache.py
+#
+#
+from multiprocessing import shared_memory
+
+
+class SharedGraph:
+    """
+    This class holds the serialized frozen graph in shared memory.
+
+    The parent reads the file once, the workers parse the graph from the
+    shared segment instead of reading (and caching) the file each.
+    """
+
+    def __init__(self, path2fg):
+        """
+        Args:
+            path2fg (Str): Path to the Frozen Graph file
+        """
+        with open(path2fg, 'rb') as fid:
+            serialized_graph = fid.read()
+
+        self.path = path2fg
+        self.size = len(serialized_graph)
+
+        self._shm = shared_memory.SharedMemory(create=True,
+                size=max(1, self.size))
+        self._shm.buf[:self.size] = serialized_graph
+        self._owner = True
+
+    def __getstate__(self):
+        # The other processes attach to the segment, they do not own it
+        state = self.__dict__.copy()
+        state["_owner"] = False
+        return state
+
+    def data(self):
+        """
+        Returns:
+            (bytes) The serialized graph
+        """
+        return bytes(self._shm.buf[:self.size])
+
+    def close(self):
+        """
+        Detach from the shared segment, the owner also destroys it
+        """
+        self._shm.close()
+        if (self._owner):
+            self._shm.unlink()
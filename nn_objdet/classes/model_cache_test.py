@@ -0,0 +1,46 @@
+"""Tests for classes.model_cache."""
+from multiprocessing import Process, Queue
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from classes.model_cache import SharedGraph
+
+
+def _read_graph(graph, out_q):
+    out_q.put(graph.data())
+
+
+class SharedGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "graph.pb")
+        self.content = os.urandom(4096)
+        with open(self.path, "wb") as f:
+            f.write(self.content)
+        self.graph = SharedGraph(self.path)
+
+    def tearDown(self):
+        self.graph.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_data(self):
+        self.assertEqual(self.graph.size, len(self.content))
+        self.assertEqual(self.graph.data(), self.content)
+
+    def test_read_by_another_process(self):
+        # Sent by pickle: the segment is attached, not copied
+        self.assertNotIn(self.content, pickle.dumps(self.graph))
+
+        out_q = Queue()
+        p = Process(target=_read_graph, args=(self.graph, out_q))
+        p.start()
+        self.assertEqual(out_q.get(timeout=5), self.content)
+        p.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
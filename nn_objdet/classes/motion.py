@@ -0,0 +1,89 @@
+# @file: motion.py
+#
+#
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    This class skips the detector on the frames of a static scene.
+
+    Each frame is downscaled to a small grayscale thumbnail and compared
+    with the thumbnail of the last frame sent to the detector: the frame is
+    a keyframe when the fraction of changed pixels is above the threshold.
+    The other frames reuse the detections of the last keyframe. Comparing
+    with the last keyframe (not with the previous frame) catches the slow
+    changes too, and a keyframe is forced every max_skip frames so that the
+    detections are refreshed even if nothing moves.
+    """
+
+    def __init__(self, threshold=0.01, max_skip=30, pixel_delta=16, width=64):
+        """
+        Args:
+            threshold (float): Fraction of changed pixels of a keyframe
+            max_skip (int): Maximum distance between two keyframes
+            pixel_delta (int): Gray level change of a changed pixel
+            width (int): Width of the thumbnails
+        """
+        self.threshold = threshold
+        self.max_skip = max(1, max_skip)
+        self.pixel_delta = pixel_delta
+        self.width = width
+
+        self._reference = None
+        self._last_key = None
+
+        self.n_frames = 0
+        self.n_skipped = 0
+
+    def thumbnail(self, frame):
+        """
+        Returns:
+            (ndarray) Small grayscale version of the (RGB) frame
+        """
+        (height, width) = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    def motion(self, thumbnail):
+        """
+        Returns:
+            (float) Fraction of the pixels changed since the last keyframe
+        """
+        diff = cv2.absdiff(thumbnail, self._reference)
+        return np.count_nonzero(diff > self.pixel_delta) / diff.size
+
+    def is_keyframe(self, frameindex, frame):
+        """
+        Check whether the frame has to be processed by the detector
+
+        Args:
+            frameindex (int): Index of the frame in the stream
+            frame (ndarray): Frame data (RGB)
+
+        Returns:
+            (Bool)
+
+        """
+        self.n_frames += 1
+        thumbnail = self.thumbnail(frame)
+        if (self._reference is None or
+                frameindex - self._last_key >= self.max_skip or
+                self.motion(thumbnail) > self.threshold):
+            self._reference = thumbnail
+            self._last_key = frameindex
+            return True
+
+        self.n_skipped += 1
+        return False
+
+    @property
+    def skip_rate(self):
+        """ Fraction of the frames that skipped the detector """
+        return self.n_skipped / self.n_frames if self.n_frames > 0 else 0.0
+
+    def report(self):
+        return (f"Motion gate: skipped {self.n_skipped}/{self.n_frames} " +
+                f"frames ({100 * self.skip_rate:0.1f}%)")
@@ -0,0 +1,60 @@
+"""Tests for classes.motion."""
+import unittest
+
+import numpy as np
+
+from classes.motion import MotionGate
+
+
+def _frame(square_x=None, level=64):
+    frame = np.full((240, 320, 3), level, dtype=np.uint8)
+    if (square_x is not None):
+        frame[80:160, square_x:square_x + 80] = 255
+    return frame
+
+
+class MotionGateTest(unittest.TestCase):
+
+    def test_first_frame_is_a_keyframe(self):
+        gate = MotionGate()
+        self.assertTrue(gate.is_keyframe(1, _frame()))
+
+    def test_static_scene_is_skipped(self):
+        gate = MotionGate(threshold=0.01, max_skip=100)
+        keys = [gate.is_keyframe(i, _frame()) for i in range(1, 11)]
+        self.assertEqual(keys, [True] + [False] * 9)
+        self.assertEqual(gate.n_skipped, 9)
+        self.assertAlmostEqual(gate.skip_rate, 0.9)
+
+    def test_motion_triggers_a_keyframe(self):
+        gate = MotionGate(threshold=0.01, max_skip=100)
+        gate.is_keyframe(1, _frame(0))
+        self.assertFalse(gate.is_keyframe(2, _frame(0)))
+        self.assertTrue(gate.is_keyframe(3, _frame(120)))
+        self.assertFalse(gate.is_keyframe(4, _frame(120)))
+
+    def test_slow_drift_is_compared_with_the_last_keyframe(self):
+        gate = MotionGate(threshold=0.01, max_skip=100, pixel_delta=16)
+        keys = [gate.is_keyframe(i, _frame(level=64 + 4 * i))
+                for i in range(1, 11)]
+        # Each step is below the pixel delta, the drift since the keyframe
+        # is not
+        self.assertEqual(keys, [True, False, False, False, False,
+                True, False, False, False, False])
+
+    def test_keyframe_forced_after_max_skip(self):
+        gate = MotionGate(threshold=0.01, max_skip=3)
+        keys = [gate.is_keyframe(i, _frame()) for i in range(1, 8)]
+        self.assertEqual(keys, [True, False, False, True, False, False, True])
+
+    def test_noise_below_the_threshold(self):
+        gate = MotionGate(threshold=0.05, max_skip=100)
+        gate.is_keyframe(1, _frame())
+        # A small object (about 1% of the frame) does not count as motion
+        frame = _frame()
+        frame[0:24, 0:32] = 255
+        self.assertFalse(gate.is_keyframe(2, frame))
+
+
+if __name__ == '__main__':
+    unittest.main()
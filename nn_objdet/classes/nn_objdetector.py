@@ -2,16 +2,18 @@
 #
 #
 import numpy as np
-import tensorflow as tf
 
-from utils import label_map_util
-from utils import visualization_utils as vis_util
+from classes.backends import create_backend
+from classes.detections import make_detections
+from classes.renderer import DetectionRenderer, load_category_index
 
 
 class NN_ObjDetector:
     """ This class warps the NN structure to perform Object detections """
 
-    def __init__(self, path2fg, path2lab):
+    def __init__(self, path2fg, path2lab, render_backend="pil",
+            serialized_graph=None, intra_op_threads=0, inter_op_threads=0,
+            tiling=None, cache=None, backend=("tf", None)):
         # Path to frozen detection graph. This is the actual model that is used
         # for the object detection.
         self.PATH_TO_CKPT = path2fg
@@ -19,74 +21,111 @@ class NN_ObjDetector:
         # List of the strings that is used to add correct label for each box.
         self.PATH_TO_LABELS = path2lab
 
-        # Loading label map
-        label_map = label_map_util.load_labelmap(self.PATH_TO_LABELS)
-        categories = label_map_util.convert_label_map_to_categories(
-                label_map, use_display_name=True, max_num_classes=90)
-
-        # This is what is used in other methods
-        self.category_index = label_map_util.create_category_index(
-                categories)
+        # Region of interest / tiles the frames are split in (TiledInference)
+        self.tiling = tiling
+        # Detections of the frames already processed (DetectionCache)
+        self.cache = cache
 
-        # Start the TF environment
-        self.detection_graph = tf.Graph()  # TF graph
-        with self.detection_graph.as_default(): # Configure the graph as default
-            od_graph_def = tf.GraphDef()
+        # Loading label map
+        # (on the first frame drawn: the workers that only send back the
+        # detections do not need it, nor TensorFlow for the fake backend)
+        self.render_backend = render_backend
+        self.category_index = None
+        self.renderer = None
 
-            # Initialization of the graph
-            with tf.gfile.GFile(self.PATH_TO_CKPT, 'rb') as fid:
-                serialized_graph = fid.read()
-                # Import the graph def into the default graph
-                od_graph_def.ParseFromString(serialized_graph)
-                tf.import_graph_def(od_graph_def, name='')
+        # Inference runtime (the TF session by default)
+        (backend_name, backend_options) = backend
+        self.backend = create_backend(backend_name, path2fg, serialized_graph,
+                intra_op_threads, inter_op_threads, **(backend_options or {}))
 
 
-            ## Get the tensor from the graph
-            self.image_tensor = \
-                    self.detection_graph.get_tensor_by_name('image_tensor:0')
 
-            # Each box represents a part of the image where a particular object was 
-            # detected.
-            self.boxes_tens = \
-                    self.detection_graph.get_tensor_by_name('detection_boxes:0')
+    def warmup(self, shape=(300, 300, 3), runs=1):
+        # The first inferences allocate the buffers and tune the kernels:
+        # run them on a dummy frame before the real frames arrive.
+        dummy = np.zeros(shape, dtype=np.uint8)
+        # (not through the cache, that would skip the model after the first run)
+        for _ in range(runs):
+            self._run_inference(dummy)
 
-            # Each score represent how level of confidence for each of the objects.
-            # Score is shown on the result image, together with the class label.
-            self.scores_tens = \
-                    self.detection_graph.get_tensor_by_name('detection_scores:0')
-            self.classes_tens = \
-                    self.detection_graph.get_tensor_by_name('detection_classes:0')
-            self.num_detections_tens = \
-                    self.detection_graph.get_tensor_by_name('num_detections:0')
 
-            # Define the Session 
-            self.sess = tf.Session(graph=self.detection_graph)
+    def run_inference(self, image_np):
+        if (self.cache is not None):
+            return self.cache.lookup(image_np, self._run_inference)
+        return self._run_inference(image_np)
 
 
+    def _run_inference(self, image_np):
+        if (self.tiling is not None):
+            # The tiles of the frame are processed as one batch
+            return self.tiling.run(image_np, self._run_graph_batch)
 
-    def detect_objects(self, image_np):
         # Expand dimensions since the model expects images to have shape: 
         # [1, None, None, 3]
         image_np_expanded = np.expand_dims(image_np, axis=0)
 
         # Actual detection.
-        (boxes, scores, classes, num_detections) = self.sess.run(
-                [self.boxes_tens, self.scores_tens, \
-                        self.classes_tens, self.num_detections_tens],
-                feed_dict={self.image_tensor: image_np_expanded})
+        (boxes, scores, classes, num_detections) = self.backend.detect(
+                image_np_expanded)
+
+        return make_detections(boxes[0], scores[0], classes[0],
+                num_detections[0])
+
+
+    def run_inference_batch(self, images_np):
+        if (self.cache is not None):
+            return self.cache.lookup_batch(images_np, self._run_inference_batch)
+        return self._run_inference_batch(images_np)
+
+
+    def _run_inference_batch(self, images_np):
+        if (self.tiling is not None):
+            return [self._run_inference(image_np) for image_np in images_np]
+        return self._run_graph_batch(images_np)
+
+
+    def _run_graph_batch(self, images_np):
+        # Stack the frames in a single batch with shape [N, H, W, 3], so that 
+        # the whole batch is processed with one backend call.
+        # (All the frames must have the same size)
+        images_np_batch = np.stack(images_np, axis=0)
+
+        # Actual detection.
+        (boxes, scores, classes, num_detections) = self.backend.detect(
+                images_np_batch)
+
+        return [make_detections(boxes[i], scores[i], classes[i],
+                num_detections[i]) for i in range(len(images_np))]
+
+
+    def get_renderer(self):
+        if (self.renderer is None):
+            self.category_index = load_category_index(self.PATH_TO_LABELS)
+            self.renderer = DetectionRenderer(self.category_index,
+                    backend=self.render_backend)
+        return self.renderer
+
+
+    def detect_objects(self, image_np):
+        detections = self.run_inference(image_np)
 
         # Visualization of the results of a detection.
-        vis_util.visualize_boxes_and_labels_on_image_array(
-                image_np, np.squeeze(boxes), 
-                np.squeeze(classes).astype(np.int32), 
-                np.squeeze(scores), self.category_index,
-                use_normalized_coordinates=True, line_thickness=4)
+        return self.get_renderer().render(image_np, detections)
+
+
+    def detect_objects_batch(self, images_np):
+        detections = self.run_inference_batch(images_np)
+
+        # Visualization of the results of each detection.
+        renderer = self.get_renderer()
+        for image_np, frame_detections in zip(images_np, detections):
+            renderer.render(image_np, frame_detections)
 
-        return image_np
+        return images_np
 
 
 
     def close_session(self):
-        self.sess.close()
+        self.backend.close()
 
 
@@ -0,0 +1,86 @@
+"""Tests for classes.nn_objdetector."""
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from classes.detection_cache import DetectionCache
+from classes.nn_objdetector import NN_ObjDetector
+
+
+class CountingRenderer:
+    """ Renderer marking the frames it draws on """
+
+    def __init__(self):
+        self.rendered = []
+
+    def render(self, image_np, detections):
+        image_np[0, 0] = 255
+        self.rendered.append(detections.num_detections)
+        return image_np
+
+
+def make_detector(cache=None):
+    detector = NN_ObjDetector(None, None, cache=cache,
+            backend=("fake", {"compute_time": 0, "num_boxes": 3}))
+    # Batch sizes of the backend calls
+    detector.calls = []
+    detect = detector.backend.detect
+
+    def counting_detect(batch):
+        detector.calls.append(len(batch))
+        return detect(batch)
+
+    detector.backend.detect = counting_detect
+    return detector
+
+
+def frames(n, shape=(24, 32, 3)):
+    return [np.full(shape, i, dtype=np.uint8) for i in range(n)]
+
+
+class BatchInferenceTest(unittest.TestCase):
+
+    def test_run_inference_batch(self):
+        detector = make_detector()
+        detections = detector.run_inference_batch(frames(4))
+        # One backend call for the whole batch, one Detections per frame
+        self.assertEqual(detector.calls, [4])
+        self.assertEqual(len(detections), 4)
+        single = detector.run_inference(frames(1)[0])
+        for frame_detections in detections:
+            self.assertEqual(frame_detections.num_detections, 3)
+            np.testing.assert_array_equal(frame_detections.boxes, single.boxes)
+        detector.close_session()
+
+    def test_detect_objects_batch(self):
+        detector = make_detector()
+        detector.renderer = CountingRenderer()
+        images = frames(3)
+        outframes = detector.detect_objects_batch(images)
+        # Drawn in place, with one backend call
+        self.assertEqual(detector.calls, [3])
+        self.assertEqual(detector.renderer.rendered, [3, 3, 3])
+        self.assertEqual(len(outframes), 3)
+        for image_np, outframe in zip(images, outframes):
+            self.assertIs(outframe, image_np)
+            self.assertEqual(outframe[0, 0, 0], 255)
+        detector.close_session()
+
+    def test_cached_batch(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            detector = make_detector(DetectionCache(tmp, "test"))
+            detector.run_inference_batch(frames(2))
+            # Only the frame not seen yet reaches the backend
+            detections = detector.run_inference_batch(frames(3))
+            self.assertEqual(detector.calls, [2, 1])
+            self.assertEqual([d.num_detections for d in detections], [3, 3, 3])
+            detector.close_session()
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+# @file: pipeline_stats.py
+#
+#
+from threading import Thread, Event
+import time
+
+import numpy as np
+
+from classes.timemeas import LatencyHistogram
+
+
+class StreamStats:
+    """
+    This class measures a stream in the data flow process: the end-to-end
+    latency of the frames (from the read to the write), the throughput and
+    the busy time of the stages.
+
+    The output stage writes the frames in order, so a frame that arrived
+    and was never written before a later one has been dropped. The counters
+    and the latency histogram are in one float64 array, which can be shared
+    with the parent process (a multiprocessing.Array of SIZE doubles) to be
+    read while the stream runs.
+    """
+    # Layout of the array: counters, then the latency histogram
+    (READ, WRITTEN, DROPPED, BUSY_DECODE, BUSY_OUTPUT) = range(5)
+    HEADER = 5
+    SIZE = HEADER + LatencyHistogram.SIZE
+    STAGES = {"decode": BUSY_DECODE, "output": BUSY_OUTPUT}
+
+    def __init__(self, stream=0, buffer=None):
+        """
+        Args:
+            stream (int): Index of the stream
+            buffer: SIZE float64 to use as storage (optional)
+        """
+        self.stream = stream
+        if (buffer is None):
+            self.data = np.zeros(self.SIZE, dtype=np.float64)
+        else:
+            self.data = np.frombuffer(buffer, dtype=np.float64, count=self.SIZE)
+        self.latency = LatencyHistogram(self.data[self.HEADER:])
+
+        # Read time of the frames arrived at the output stage
+        self._read_times = {}
+        self._last_written = 0
+
+        self.t_first = None
+        self.t_last = None
+
+    def frame_read(self):
+        """
+        A frame has been read from the source
+        """
+        self.data[self.READ] += 1
+
+    def arrived(self, index, t_read):
+        """
+        A frame read at t_read (monotonic) reached the output stage
+        """
+        self._read_times[index] = t_read
+        if (self.t_first is None or t_read < self.t_first):
+            self.t_first = t_read
+
+    def written(self, index, now=None):
+        """
+        A frame has been written (or displayed)
+        """
+        if (now is None):
+            now = time.monotonic()
+        # The frames between the previous write and this one were dropped
+        for skipped in range(self._last_written + 1, index):
+            if (self._read_times.pop(skipped, None) is not None):
+                self.data[self.DROPPED] += 1
+        self._last_written = index
+
+        t_read = self._read_times.pop(index, None)
+        if (t_read is not None):
+            self.latency.record(now - t_read)
+        self.data[self.WRITTEN] += 1
+        self.t_last = now
+
+    def add_busy(self, stage, elapsed):
+        """
+        Add the time a stage ("decode" or "output") spent working (not
+        waiting)
+        """
+        self.data[self.STAGES[stage]] += elapsed
+
+    def busy(self):
+        """
+        Returns:
+            (dict) stage -> busy time [s]
+        """
+        return {stage: float(self.data[field])
+                for (stage, field) in self.STAGES.items()}
+
+    def counters(self):
+        """
+        Returns:
+            (read, written, dropped) frames
+        """
+        return (int(self.data[self.READ]), int(self.data[self.WRITTEN]),
+                int(self.data[self.DROPPED]))
+
+    def duration(self):
+        """
+        Returns:
+            (float) Time from the first read to the last write [s]
+        """
+        if (self.t_first is None or self.t_last is None):
+            return 0.0
+        return max(self.t_last - self.t_first, 0.0)
+
+    def summary(self):
+        """
+        Returns:
+            (dict) Machine readable report of the stream
+        """
+        duration = self.duration()
+        (_, frames, dropped) = self.counters()
+        return {
+            "stream": self.stream,
+            "frames": frames,
+            "dropped": dropped + len(self._read_times),
+            "duration_s": duration,
+            "throughput_fps": frames / duration if duration > 0 else 0.0,
+            "latency_ms": self.latency.summary(1e3),
+            "utilization": {stage: busy / duration if duration > 0 else 0.0
+                for (stage, busy) in sorted(self.busy().items())},
+            # For the aggregation over the streams
+            "t_first": self.t_first,
+            "t_last": self.t_last,
+            "latency_hist": self.latency.data.copy(),
+        }
+
+
+class QueueSampler:
+    """
+    This class samples the depth of some queues in a background thread
+    """
+
+    def __init__(self, queues, interval=0.01):
+        """
+        Args:
+            queues (dict): name -> (Queue, capacity)
+            interval (float): Sampling period [s]
+        """
+        self.queues = queues
+        self.interval = interval
+        self.samples = {name: [] for name in queues}
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self):
+        for (name, (q, _)) in self.queues.items():
+            try:
+                self.samples[name].append(q.qsize())
+            except NotImplementedError:
+                # No qsize() on some platforms (macOS)
+                pass
+
+    def _run(self):
+        while (not self._stop.wait(self.interval)):
+            self.sample()
+
+    def summary(self):
+        """
+        Returns:
+            (dict) name -> mean and max depth, and mean occupancy (fraction
+            of the capacity)
+        """
+        report = {}
+        for (name, (_, capacity)) in self.queues.items():
+            samples = self.samples[name]
+            if (len(samples) == 0):
+                report[name] = {"samples": 0}
+                continue
+            mean = float(np.mean(samples))
+            report[name] = {"samples": len(samples), "mean": mean,
+                    "max": int(max(samples)),
+                    "occupancy": mean / capacity if capacity > 0 else 0.0}
+        return report
+
+
+def imbalance(values):
+    """
+    Returns:
+        (float) Max over mean of the values: 1 when the load is even, N when
+        one of N workers does everything
+    """
+    if (len(values) == 0):
+        return 1.0
+    mean = float(np.mean(values))
+    return float(max(values)) / mean if mean > 0 else 1.0
+
+
+def summarize_workers(workers, duration=None):
+    """
+    Aggregate the statistics that the workers published in shared memory
+
+    Args:
+        workers (list): WorkerStats of the workers (with the histograms)
+        duration (float): Time base of the throughput (of the pool and of
+            each worker) and of the utilization [s], by default from the
+            first to the last frame of the workers
+
+    Returns:
+        (dict) Throughput and load imbalance of the pool, combined
+        distribution of the processing time and of the period of the
+        workers [ms], and the state of each worker
+    """
+    # Every row claimed by a worker, the idle ones too (they are the load
+    # imbalance)
+    workers = [w for w in workers if w.field(w.PID) != 0]
+    if (duration is None):
+        active = [w for w in workers if w.field(w.FRAMES) > 0]
+        if (len(active) > 0):
+            duration = (max(w.field(w.T_LAST) for w in active) -
+                    min(w.field(w.T_FIRST) for w in active))
+        else:
+            duration = 0.0
+
+    elapsed = LatencyHistogram()
+    period = LatencyHistogram()
+    per_worker = []
+    for w in workers:
+        (busy, frames) = w.read()
+        (w_elapsed, w_period) = w.histograms()
+        report = {"row": w.row, "pid": int(w.field(w.PID)),
+                "frames": int(frames), "dropped": int(w.field(w.DROPPED)),
+                "busy_s": busy,
+                "utilization": busy / duration if duration > 0 else 0.0,
+                "fps": frames / duration if duration > 0 else 0.0}
+        if (w_elapsed is not None):
+            elapsed.merge(w_elapsed)
+            period.merge(w_period)
+            report["comp_time_ms"] = w_elapsed.summary(1e3)
+            report["period_ms"] = w_period.summary(1e3)
+        per_worker.append(report)
+
+    frames = sum(w["frames"] for w in per_worker)
+    return {
+        "workers": len(per_worker),
+        "frames": frames,
+        "dropped": sum(w["dropped"] for w in per_worker),
+        "duration_s": duration,
+        "throughput_fps": frames / duration if duration > 0 else 0.0,
+        "imbalance": {
+            "frames": imbalance([w["frames"] for w in per_worker]),
+            "busy": imbalance([w["busy_s"] for w in per_worker]),
+        },
+        "comp_time_ms": elapsed.summary(1e3),
+        "period_ms": period.summary(1e3),
+        "per_worker": per_worker,
+    }
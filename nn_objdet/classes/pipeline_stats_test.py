@@ -0,0 +1,125 @@
+"""Tests for classes.pipeline_stats."""
+from multiprocessing import Queue
+import time
+import unittest
+
+from classes.pipeline_stats import QueueSampler, StreamStats, imbalance, \
+        summarize_workers
+from classes.supervisor import WorkerStats
+
+
+class StreamStatsTest(unittest.TestCase):
+
+    def test_latency_and_throughput(self):
+        stats = StreamStats()
+        for index in range(1, 5):
+            stats.arrived(index, 10.0 + index)
+        for index in range(1, 5):
+            stats.written(index, now=10.5 + index)
+
+        summary = stats.summary()
+        self.assertEqual(summary["frames"], 4)
+        self.assertEqual(summary["dropped"], 0)
+        self.assertAlmostEqual(summary["duration_s"], 3.5)
+        self.assertAlmostEqual(summary["latency_ms"]["p50"], 500.0, delta=5.0)
+
+    def test_dropped_frames(self):
+        stats = StreamStats()
+        for index in range(1, 6):
+            stats.arrived(index, 0.0)
+        stats.written(1, now=1.0)
+        # 2 and 3 never written
+        stats.written(4, now=1.0)
+        summary = stats.summary()
+        self.assertEqual(summary["frames"], 2)
+        # 5 is still waiting at the end
+        self.assertEqual(summary["dropped"], 3)
+
+    def test_utilization(self):
+        stats = StreamStats()
+        stats.arrived(1, 0.0)
+        stats.written(1, now=2.0)
+        stats.add_busy("output", 0.5)
+        stats.add_busy("output", 0.5)
+        self.assertAlmostEqual(stats.summary()["utilization"]["output"], 0.5)
+
+
+class SummarizeWorkersTest(unittest.TestCase):
+
+    def test_imbalance(self):
+        self.assertEqual(imbalance([]), 1.0)
+        self.assertEqual(imbalance([5, 5]), 1.0)
+        self.assertEqual(imbalance([0, 0, 0, 6]), 4.0)
+
+    def test_pool(self):
+        (array, hists) = WorkerStats.allocate(3)
+        workers = [WorkerStats(array, row, hists=hists) for row in range(3)]
+        # (the histograms are fed by the TimeMeas of the workers)
+        for i in range(30):
+            workers[0].record(0.01, now=10.0 + i * 0.1)
+            workers[0].histograms()[0].record(0.01)
+        for i in range(10):
+            workers[1].record(0.03, now=10.0 + i * 0.3)
+            workers[1].histograms()[0].record(0.03)
+        # The third row was never claimed by a worker
+
+        pool = summarize_workers(workers)
+        self.assertEqual(pool["workers"], 2)
+        self.assertEqual(pool["frames"], 40)
+        # From the first start (9.97) to the last end (12.9)
+        self.assertAlmostEqual(pool["duration_s"], 2.93)
+        self.assertAlmostEqual(pool["throughput_fps"], 40 / 2.93)
+        self.assertAlmostEqual(pool["imbalance"]["frames"], 1.5)
+        self.assertAlmostEqual(pool["imbalance"]["busy"], 1.0)
+        # Combined distribution of the processing time
+        self.assertEqual(pool["comp_time_ms"]["count"], 40)
+        self.assertAlmostEqual(pool["comp_time_ms"]["min"], 10.0)
+        self.assertAlmostEqual(pool["comp_time_ms"]["max"], 30.0)
+        self.assertAlmostEqual(pool["per_worker"][1]["comp_time_ms"]["mean"], 30.0)
+
+    def test_idle_worker(self):
+        (array, hists) = WorkerStats.allocate(3)
+        workers = [WorkerStats(array, row, hists=hists) for row in range(3)]
+        workers[0].record(0.01, now=10.0)
+        workers[0].record(0.01, now=12.0)
+        # Started, but no frame
+        array[1 * WorkerStats.FIELDS + WorkerStats.PID] = 1234
+
+        pool = summarize_workers(workers)
+        self.assertEqual(pool["workers"], 2)
+        self.assertEqual(pool["per_worker"][1]["frames"], 0)
+        self.assertAlmostEqual(pool["imbalance"]["frames"], 2.0)
+        # The FPS of the workers add up to the one of the pool
+        self.assertAlmostEqual(pool["duration_s"], 2.01)
+        self.assertAlmostEqual(sum(w["fps"] for w in pool["per_worker"]),
+                pool["throughput_fps"])
+
+    def test_fixed_duration(self):
+        (array, hists) = WorkerStats.allocate(1)
+        stats = WorkerStats(array, 0, hists=hists)
+        stats.record(0.5)
+        pool = summarize_workers([stats], duration=2.0)
+        self.assertEqual(pool["throughput_fps"], 0.5)
+        self.assertEqual(pool["per_worker"][0]["utilization"], 0.25)
+
+
+class QueueSamplerTest(unittest.TestCase):
+
+    def test_occupancy(self):
+        q = Queue(maxsize=4)
+        for i in range(2):
+            q.put(i)
+        time.sleep(0.1)
+        sampler = QueueSampler({"input": (q, 4)}, interval=0.005)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+
+        report = sampler.summary()["input"]
+        self.assertGreater(report["samples"], 0)
+        self.assertEqual(report["max"], 2)
+        self.assertAlmostEqual(report["occupancy"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
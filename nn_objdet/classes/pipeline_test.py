@@ -0,0 +1,282 @@
+"""Tests of the pipeline stages of main."""
+from threading import Thread
+import queue
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import main
+from classes.backends import BACKENDS, FakeBackend, register_backend
+from classes.decoder import FrameDecoder
+from classes.detections import make_detections
+from classes.propagation import DetectionPropagator, StrideController
+from classes.realtime import LatestFrameMailbox, RealtimePolicy
+from classes.sentinels import (STOP_WORKER, end_of_stream, is_end_of_stream,
+        is_stop)
+from classes.synthetic import SyntheticSource
+
+
+class ProbeFrameShapeTest(unittest.TestCase):
+
+    def test_shapes(self):
+        args = {"model_size": ""}
+        self.assertEqual(main.probe_frame_shape("synthetic:64x48", args),
+                (48, 64, 3))
+        # Not opened: missing file, or a stream opened by its reader only
+        self.assertIsNone(main.probe_frame_shape("/missing/video.avi", args))
+        self.assertIsNone(main.probe_frame_shape("rtsp://127.0.0.1:1/x", args))
+        # The frames are resized to the model input
+        args = {"model_size": "300x200"}
+        self.assertEqual(main.probe_frame_shape("rtsp://127.0.0.1:1/x", args),
+                (200, 300, 3))
+
+
+class FeedThreadTest(unittest.TestCase):
+
+    def test_forwards_the_latest_frame_when_a_credit_is_free(self):
+        input_q = queue.Queue()
+        mailbox = LatestFrameMailbox()
+        in_flight = threading.Semaphore(0)
+        p_feed = Thread(target=main.feed_thread,
+                args=(input_q, mailbox, in_flight), daemon=True)
+        p_feed.start()
+
+        # No credit: the frames wait in the mailbox, the latest wins
+        mailbox.put("old")
+        time.sleep(0.05)
+        self.assertEqual(mailbox.put("latest"), "old")
+        in_flight.release()
+        self.assertEqual(input_q.get(timeout=1), "latest")
+
+        # The credit taken for the stop marker is given back
+        mailbox.close()
+        in_flight.release()
+        p_feed.join(timeout=1)
+        self.assertFalse(p_feed.is_alive())
+        self.assertTrue(in_flight.acquire(blocking=False))
+
+
+class RealtimeStrideTest(unittest.TestCase):
+
+    def test_stride_grows_when_the_workers_fall_behind(self):
+        # 100 FPS source, the worker keeps up with 20 FPS
+        (fps, num_frames, compute_time) = (100, 150, 0.05)
+        input_q = queue.Queue(5)
+        processed_q = queue.Queue()
+        in_flight = threading.Semaphore(1)
+        mailbox = LatestFrameMailbox()
+        rt = RealtimePolicy(0.5)
+        stride_ctl = StrideController(1, adaptive=True, source_fps=fps,
+                max_stride=8, window=10)
+
+        def worker():
+            while (True):
+                item = input_q.get()
+                if (is_stop(item)):
+                    return
+                if (not is_end_of_stream(item)):
+                    time.sleep(compute_time)
+                    in_flight.release()
+
+        p_work = Thread(target=worker, daemon=True)
+        p_feed = Thread(target=main.feed_thread,
+                args=(input_q, mailbox, in_flight), daemon=True)
+        p_work.start()
+        p_feed.start()
+        main.inflow_thread(input_q,
+                FrameDecoder(SyntheticSource(32, 24, fps, num_frames)),
+                processed_q=processed_q, stride_ctl=stride_ctl,
+                in_flight=in_flight, rt=rt, mailbox=mailbox, pace=1.0 / fps)
+        p_feed.join()
+        input_q.put(STOP_WORKER)
+        p_work.join()
+
+        # The drops of the mailbox raised the stride above the initial 1
+        self.assertGreaterEqual(stride_ctl.stride, 3)
+        skipped = 0
+        while (not processed_q.empty()):
+            (_, outframe) = processed_q.get()
+            skipped += outframe is None
+        self.assertGreater(skipped, 0)
+
+
+class WorkTest(unittest.TestCase):
+
+    def setUp(self):
+        # Batch sizes of the backend calls of the worker
+        calls = self.calls = []
+
+        @register_backend("test_counting")
+        class CountingBackend(FakeBackend):
+            def detect(self, batch):
+                calls.append(len(batch))
+                return FakeBackend.detect(self, batch)
+
+    def tearDown(self):
+        del BACKENDS["test_counting"]
+
+    def run_worker(self, items, **config):
+        input_q = queue.Queue()
+        processed_qs = [queue.Queue(), queue.Queue()]
+        for item in items:
+            input_q.put(item)
+        input_q.put(STOP_WORKER)
+        config = main.WorkerConfig(draw=False,
+                backend=("test_counting", {"compute_time": 0, "num_boxes": 2}),
+                **config)
+        p_work = Thread(target=main.work, args=(input_q, processed_qs, config),
+                daemon=True)
+        p_work.start()
+        p_work.join(timeout=5)
+        self.assertFalse(p_work.is_alive())
+        results = []
+        for processed_q in processed_qs:
+            results.append([])
+            while (not processed_q.empty()):
+                results[-1].append(processed_q.get())
+        return results
+
+    def frame(self, stream, index, shape=(24, 32, 3)):
+        return ((stream, index, time.monotonic()),
+                np.zeros(shape, dtype=np.uint8))
+
+    def test_batches(self):
+        items = [self.frame(0, i) for i in range(1, 6)] + [end_of_stream(0, 5)]
+        (results, _) = self.run_worker(items, batch_size=2, batch_wait=0.05)
+        # The frames queued before STOP_WORKER are processed, two at a time
+        self.assertEqual(sorted(self.calls), [1, 2, 2])
+        # (the end of stream is forwarded as soon as it is met)
+        self.assertEqual(sorted(key[1] for (key, _) in results),
+                [1, 2, 3, 4, 5, 6])
+        for item in results:
+            if (not is_end_of_stream(item)):
+                self.assertEqual(item[1].num_detections, 2)
+
+    def test_batch_of_two_sizes(self):
+        items = [self.frame(0, 1), self.frame(1, 1, (48, 64, 3)),
+                self.frame(0, 2)]
+        results = self.run_worker(items, batch_size=4, batch_wait=0.05)
+        # One call per frame size, the results go to their stream
+        self.assertEqual(sorted(self.calls), [1, 2])
+        self.assertEqual([key[:2] for (key, _) in results[0]], [(0, 1), (0, 2)])
+        self.assertEqual([key[:2] for (key, _) in results[1]], [(1, 1)])
+
+    def test_unbatched(self):
+        items = [self.frame(0, i) for i in range(1, 4)]
+        (results, _) = self.run_worker(items)
+        self.assertEqual(self.calls, [1, 1, 1])
+        self.assertEqual([key[1] for (key, _) in results], [1, 2, 3])
+
+
+class RecordingSink:
+    """ Sink of the detections of a stream, in the order they are written """
+
+    def __init__(self):
+        self.written = []
+
+    def append(self, index, detections):
+        self.written.append((index, detections.num_detections))
+
+
+class MultiStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        # The number of detections tells the frame width, i.e. the stream
+        @register_backend("test_width")
+        class WidthBackend(FakeBackend):
+            def detect(self, batch):
+                (boxes, scores, classes, num_detections) = \
+                        FakeBackend.detect(self, batch)
+                num_detections[:] = batch.shape[2] // 16
+                return (boxes, scores, classes, num_detections)
+
+    def tearDown(self):
+        del BACKENDS["test_width"]
+
+    def test_two_streams(self):
+        # (width, frames) of the streams
+        streams = [(32, 12), (48, 7)]
+        credits = 2
+        input_q = queue.Queue(4)
+        processed_qs = [queue.Queue() for _ in streams]
+        in_flights = [threading.Semaphore(credits) for _ in streams]
+        sinks = [RecordingSink() for _ in streams]
+        config = main.WorkerConfig(draw=False, batch_size=2, batch_wait=0.01,
+                backend=("test_width", {"compute_time": 0.002, "num_boxes": 5}))
+
+        workers = [Thread(target=main.work,
+                args=(input_q, processed_qs, config), daemon=True)
+                for _ in range(2)]
+        threads = []
+        in_frames = [{} for _ in streams]
+        for (stream, (width, num_frames)) in enumerate(streams):
+            threads.append(Thread(target=main.inflow_thread,
+                args=(input_q, FrameDecoder(SyntheticSource(width, 24, 0,
+                    num_frames))),
+                kwargs={"in_frames": in_frames[stream],
+                    "processed_q": processed_qs[stream], "stream": stream,
+                    "in_flight": in_flights[stream]}, daemon=True))
+            threads.append(Thread(target=main.outflow_thread,
+                args=(False, False, processed_qs[stream], None),
+                kwargs={"in_frames": in_frames[stream],
+                    "propagator": DetectionPropagator(),
+                    "in_flight": in_flights[stream], "sink": sinks[stream]},
+                daemon=True))
+        for thread in workers + threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+        for _ in workers:
+            input_q.put(STOP_WORKER)
+        for thread in workers:
+            thread.join(timeout=5)
+
+        for (stream, (width, num_frames)) in enumerate(streams):
+            # Each stream gets its own frames, in order
+            self.assertEqual(sinks[stream].written,
+                    [(index, width // 16) for index in range(1, num_frames + 1)])
+            # and all its credits back
+            for _ in range(credits):
+                self.assertTrue(in_flights[stream].acquire(blocking=False))
+            self.assertFalse(in_flights[stream].acquire(blocking=False))
+            self.assertEqual(in_frames[stream], {})
+
+
+class SinkTest(unittest.TestCase):
+
+    def test_frames_released_once_written(self):
+        processed_q = queue.Queue()
+        in_frames = {index: np.zeros((8, 8, 3), dtype=np.uint8)
+                for index in range(1, 6)}
+        sink = RecordingSink()
+        detections = make_detections(np.zeros((1, 4)), np.ones(1),
+                np.ones(1), 1)
+        p_out = Thread(target=main.outflow_thread,
+                args=(False, False, processed_q, None),
+                kwargs={"in_frames": in_frames,
+                    "propagator": DetectionPropagator(), "sink": sink},
+                daemon=True)
+        p_out.start()
+
+        for index in range(1, 4):
+            processed_q.put(((0, index, time.monotonic()), detections))
+        deadline = time.monotonic() + 5
+        while (len(sink.written) < 3 and time.monotonic() < deadline):
+            time.sleep(0.005)
+        # Only the frames still waiting for their detections are kept
+        self.assertEqual([index for (index, _) in sink.written], [1, 2, 3])
+        self.assertEqual(sorted(in_frames), [4, 5])
+
+        for index in range(4, 6):
+            processed_q.put(((0, index, time.monotonic()), detections))
+        processed_q.put(end_of_stream(0, 5))
+        p_out.join(timeout=5)
+        self.assertFalse(p_out.is_alive())
+        self.assertEqual(in_frames, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# @file: profiler.py
+#
+#
+from threading import Thread, Event
+import collections
+import os
+import sys
+import threading
+
+
+# Extension of the collapsed-stack files
+PROFILE_EXT = ".folded"
+# Merged profile of a run, in the profile directory
+MERGED_PROFILE = "profile" + PROFILE_EXT
+
+
+def profile_path(directory, role):
+    """
+    Returns:
+        (Str) Path of the profile of this process: DIRECTORY/ROLE-PID.folded
+    """
+    return os.path.join(directory, f"{role}-{os.getpid()}{PROFILE_EXT}")
+
+
+class StackSampler:
+    """
+    This class is a sampling profiler: a background thread reads the Python
+    stack of every other thread of the process every `interval` seconds and
+    counts the identical stacks.
+
+    The counts are written in the collapsed-stack format of flamegraph.pl
+    and speedscope ("role;thread;outer;...;inner count"). The sampling is on
+    the wall clock: a thread blocked in a queue or in a native call that
+    released the GIL (session run, cv2) is counted in the call where it
+    waits. The cost is one walk of the stacks per sample, outside of the
+    sampled threads.
+    """
+
+    def __init__(self, path, role="main", interval=0.005):
+        """
+        Args:
+            path (Str): Path of the collapsed-stack file
+            role (Str): Root frame of the stacks, e.g. "worker"
+            interval (float): Sampling period [s]
+        """
+        self.path = path
+        self.role = role.replace(";", "_")
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        # code -> frame label
+        self._labels = {}
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if (label is None):
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}" + \
+                    f":{code.co_firstlineno})"
+            label = label.replace(";", "_")
+            self._labels[code] = label
+        return label
+
+    def sample(self):
+        """
+        Count the current stack of each thread (but the sampler)
+        """
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for (ident, frame) in sys._current_frames().items():
+            if (ident == own):
+                continue
+            stack = []
+            while (frame is not None):
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", "_"))
+            stack.append(self.role)
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while (not self._stop.wait(self.interval)):
+            self.sample()
+
+    def dump(self):
+        """
+        Write the profile file
+
+        Returns:
+            (int) Number of samples
+        """
+        write_collapsed(self.path, self.stacks)
+        return self.samples
+
+
+def start_sampler(profile, role):
+    """
+    Start the profiler of a process, if profiling
+
+    Args:
+        profile (tuple): (directory, interval [s]) of the profiles, or None
+        role (Str): Role of the process, root of its stacks
+
+    Returns:
+        (StackSampler) The running profiler, or None
+    """
+    if (profile is None):
+        return None
+    (directory, interval) = profile
+    sampler = StackSampler(profile_path(directory, role), role, interval)
+    sampler.start()
+    return sampler
+
+
+def stop_sampler(sampler):
+    """
+    Stop the profiler of a process (if any) and write its profile
+    """
+    if (sampler is None):
+        return
+    sampler.stop()
+    samples = sampler.dump()
+    print(f"Profiler[{os.getpid():4}] | {samples} samples written to {sampler.path}")
+
+
+def read_collapsed(path):
+    """
+    Returns:
+        (Counter) stack -> count of a collapsed-stack file
+    """
+    stacks = collections.Counter()
+    with open(path) as f:
+        for line in f:
+            (stack, _, count) = line.rstrip("\n").rpartition(" ")
+            if (stack):
+                stacks[stack] += int(count)
+    return stacks
+
+
+def write_collapsed(path, stacks):
+    with open(path, "w") as f:
+        for (stack, count) in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+
+def merge_profiles(paths, output):
+    """
+    Merge the profiles of the processes of a run into one file, the stacks
+    of the processes with the same role are summed
+
+    Args:
+        paths (list): Collapsed-stack files
+        output (Str): Path of the merged file
+
+    Returns:
+        (int) Number of stacks of the merged file
+    """
+    stacks = collections.Counter()
+    for path in paths:
+        stacks.update(read_collapsed(path))
+    write_collapsed(output, stacks)
+    return len(stacks)
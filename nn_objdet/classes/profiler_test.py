@@ -0,0 +1,89 @@
+"""Tests for classes.profiler."""
+from threading import Thread, Event
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from classes.profiler import (StackSampler, merge_profiles, profile_path,
+        read_collapsed, start_sampler, stop_sampler, write_collapsed)
+
+
+def _busy_wait(stop):
+    while (not stop.is_set()):
+        time.sleep(0.001)
+
+
+class StackSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_samples_other_threads(self):
+        stop = Event()
+        thread = Thread(target=_busy_wait, args=(stop,), name="busy")
+        thread.start()
+        sampler = StackSampler(os.path.join(self.tmp, "p.folded"), "worker",
+                interval=0.001)
+        sampler.start()
+        time.sleep(0.1)
+        sampler.stop()
+        stop.set()
+        thread.join()
+
+        self.assertGreater(sampler.samples, 0)
+        busy = [stack for stack in sampler.stacks
+                if stack.startswith("worker;busy;")]
+        self.assertTrue(busy)
+        self.assertTrue(any("_busy_wait (profiler_test.py:" in stack
+                for stack in busy))
+        # The sampler does not sample itself
+        self.assertFalse(any(";profiler;" in stack for stack in sampler.stacks))
+
+        self.assertEqual(sampler.dump(), sampler.samples)
+        self.assertEqual(read_collapsed(sampler.path), sampler.stacks)
+
+    def test_disabled(self):
+        self.assertIsNone(start_sampler(None, "worker"))
+        stop_sampler(None)
+
+    def test_process_file(self):
+        sampler = start_sampler((self.tmp, 0.001), "data_flow")
+        time.sleep(0.01)
+        stop_sampler(sampler)
+        self.assertEqual(sampler.path, profile_path(self.tmp, "data_flow"))
+        self.assertTrue(os.path.basename(sampler.path).startswith(
+            f"data_flow-{os.getpid()}"))
+        self.assertTrue(os.path.exists(sampler.path))
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_merge(self):
+        first = os.path.join(self.tmp, "worker-1.folded")
+        second = os.path.join(self.tmp, "worker-2.folded")
+        write_collapsed(first, {"worker;MainThread;a;b": 3, "worker;t;c": 1})
+        write_collapsed(second, {"worker;MainThread;a;b": 2,
+            "worker;MainThread;a b (x.py:1)": 4})
+        output = os.path.join(self.tmp, "profile.folded")
+
+        self.assertEqual(merge_profiles([first, second], output), 3)
+        stacks = read_collapsed(output)
+        self.assertEqual(stacks["worker;MainThread;a;b"], 5)
+        self.assertEqual(stacks["worker;t;c"], 1)
+        # Spaces in the frames are kept, the count is the last field
+        self.assertEqual(stacks["worker;MainThread;a b (x.py:1)"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+# @file: propagation.py
+#
+#
+import time
+
+import numpy as np
+
+from classes.detections import Detections
+from utils import np_box_ops
+
+
+EMPTY_DETECTIONS = Detections(
+        boxes=np.zeros((0, 4), dtype=np.float32),
+        scores=np.zeros(0, dtype=np.float32),
+        classes=np.zeros(0, dtype=np.uint16),
+        num_detections=0)
+
+
+class StrideController:
+    """
+    This class decides which frames go through the detector (keyframes).
+
+    One frame every `stride` is a keyframe. In adaptive mode the stride is
+    updated every `window` frames, comparing the rate at which the frames
+    enter the pipeline with the FPS of the source: it grows when the pipeline
+    falls behind the source and shrinks when there is margin.
+
+    In real-time mode the reader never waits, so the read rate is the rate
+    of the source: the frames dropped before the workers (see dropped()) are
+    subtracted, and the stride shrinks after `patience` windows without drops.
+    """
+
+    def __init__(self, stride=1, adaptive=False, source_fps=0, max_stride=8,
+            window=30, patience=3):
+        """
+        Args:
+            stride (int): (Initial) distance between two keyframes
+            adaptive (Bool): Adapt the stride to keep up with the source
+            source_fps (float): Frame rate of the source
+            max_stride (int): Upper bound of the adaptive stride
+            window (int): Number of frames between two stride updates
+            patience (int): Windows without drops before the stride shrinks
+                (real-time mode)
+        """
+        self.stride = max(1, stride)
+        self.adaptive = adaptive and (source_fps > 0)
+        self.source_fps = source_fps
+        self.max_stride = max(self.stride, max_stride)
+        self.window = window
+        self.patience = patience
+
+        self._last_key = None
+        self._window_start = None
+        self._window_count = 0
+        self._window_dropped = 0
+        # Drops reported: the read rate does not show the load
+        self._drop_driven = False
+        self._clean_windows = 0
+
+    def dropped(self, count=1):
+        """
+        Some frames read were dropped before reaching the workers
+        (real-time mode)
+        """
+        self._window_dropped += count
+        self._drop_driven = True
+
+    def is_keyframe(self, frameindex):
+        """
+        Check whether the frame has to be processed by the detector
+
+        Args:
+            frameindex (int): Index of the frame in the stream
+
+        Returns:
+            (Bool)
+
+        """
+        if (self.adaptive):
+            self._update_stride(time.monotonic())
+
+        if (self._last_key is None or
+                frameindex - self._last_key >= self.stride):
+            self._last_key = frameindex
+            return True
+
+        return False
+
+    def _update_stride(self, now):
+        if (self._window_start is None):
+            self._window_start = now
+            return
+
+        self._window_count += 1
+        if (self._window_count < self.window):
+            return
+
+        # Rate of the frames that entered the pipeline
+        rate = (self._window_count - self._window_dropped) / \
+                (now - self._window_start)
+        if (self._window_dropped > 0):
+            self._clean_windows = 0
+        else:
+            self._clean_windows += 1
+
+        if (rate < 0.95 * self.source_fps and self.stride < self.max_stride):
+            self.stride += 1
+        elif (self.stride > 1 and (rate > 1.2 * self.source_fps or
+                (self._drop_driven and self._clean_windows >= self.patience))):
+            self.stride -= 1
+            self._clean_windows = 0
+
+        self._window_start = now
+        self._window_count = 0
+        self._window_dropped = 0
+
+
+def interpolate_detections(det_a, det_b, alpha, min_iou=0.3):
+    """
+    Linear interpolation of the detections between two keyframes
+
+    The boxes of det_a are matched with the boxes of det_b of the same class
+    with the highest IoU, the matched boxes (and scores) are moved by alpha
+    towards det_b, the others are kept as they are.
+
+    Args:
+        det_a (Detections): Detections of the previous keyframe
+        det_b (Detections): Detections of the next keyframe
+        alpha (float): Position of the frame between the keyframes [0, 1]
+        min_iou (float): Minimum IoU for two boxes to be the same object
+
+    Returns:
+        (Detections)
+
+    """
+    if (det_a.num_detections == 0 or det_b.num_detections == 0):
+        return det_a
+
+    iou = np_box_ops.iou(det_a.boxes, det_b.boxes)
+    iou[det_a.classes[:, np.newaxis] != det_b.classes[np.newaxis, :]] = 0.0
+    best = np.argmax(iou, axis=1)
+    matched = iou[np.arange(det_a.num_detections), best] >= min_iou
+
+    boxes = det_a.boxes.copy()
+    scores = det_a.scores.copy()
+    boxes[matched] = (1.0 - alpha) * det_a.boxes[matched] + \
+            alpha * det_b.boxes[best[matched]]
+    scores[matched] = (1.0 - alpha) * det_a.scores[matched] + \
+            alpha * det_b.scores[best[matched]]
+
+    return Detections(boxes=boxes, scores=scores, classes=det_a.classes,
+            num_detections=det_a.num_detections)
+
+
+class DetectionPropagator:
+    """
+    This class assigns the detections to the frames skipped by the detector.
+
+    The frames are pushed in output order, with their Detections if they are
+    keyframes or None otherwise. In "reuse" mode a skipped frame gets the
+    detections of the previous keyframe, in "interpolate" mode it is held
+    until the next keyframe arrives and gets the interpolated detections.
+    """
+
+    def __init__(self, mode="reuse"):
+        self.mode = mode
+
+        self._last_index = None
+        self._last_detections = EMPTY_DETECTIONS
+        self._held = []
+
+    def push(self, index, detections):
+        """
+        Add the next frame of the stream
+
+        Args:
+            index (int): Index of the frame
+            detections (Detections): Detections of the frame, None if the
+                frame has been skipped
+
+        Returns:
+            (list) Tuples (index, Detections) of the frames ready to be
+            rendered, in order
+
+        """
+        if (detections is None):
+            if (self.mode == "interpolate"):
+                self._held.append(index)
+                return []
+            return [(index, self._last_detections)]
+
+        ready = []
+        if (len(self._held) > 0 and self._last_index is None):
+            # No keyframe before them (e.g. the first keyframe was dropped):
+            # nothing to interpolate from, the frames get these detections
+            ready.extend((held_index, detections) for held_index in self._held)
+            self._held = []
+        elif (len(self._held) > 0):
+            span = index - self._last_index
+            for held_index in self._held:
+                alpha = (held_index - self._last_index) / span
+                ready.append((held_index, interpolate_detections(
+                    self._last_detections, detections, alpha)))
+            self._held = []
+
+        ready.append((index, detections))
+        self._last_index = index
+        self._last_detections = detections
+        return ready
+
+    def flush(self):
+        """
+        Release the held frames at the end of the stream, reusing the last
+        detections
+
+        Returns:
+            (list) Tuples (index, Detections)
+
+        """
+        ready = [(index, self._last_detections) for index in self._held]
+        self._held = []
+        return ready
@@ -0,0 +1,122 @@
+"""Tests for classes.propagation."""
+import unittest
+
+import numpy as np
+
+from classes.detections import Detections
+from classes.propagation import (StrideController, DetectionPropagator,
+        interpolate_detections)
+
+
+def _detections(boxes, classes, scores):
+    return Detections(boxes=np.array(boxes, dtype=np.float32),
+            scores=np.array(scores, dtype=np.float32),
+            classes=np.array(classes, dtype=np.uint16),
+            num_detections=len(boxes))
+
+
+class StrideControllerTest(unittest.TestCase):
+
+    def test_fixed_stride(self):
+        ctl = StrideController(3)
+        keyframes = [i for i in range(1, 11) if ctl.is_keyframe(i)]
+        self.assertEqual(keyframes, [1, 4, 7, 10])
+
+    def test_adaptive_stride_grows_when_behind(self):
+        ctl = StrideController(1, adaptive=True, source_fps=30, window=4)
+        now = 0.0
+        for _ in range(20):
+            # Frames read at 10 FPS, a third of the source rate
+            now += 0.1
+            ctl._update_stride(now)
+        self.assertGreater(ctl.stride, 1)
+
+    def test_adaptive_stride_shrinks_with_margin(self):
+        ctl = StrideController(4, adaptive=True, source_fps=30, window=4)
+        now = 0.0
+        for _ in range(20):
+            now += 0.01
+            ctl._update_stride(now)
+        self.assertLess(ctl.stride, 4)
+
+    def test_adaptive_stride_follows_the_drops(self):
+        # Real-time mode: the frames are read at the source rate, but half of
+        # them are dropped before the workers
+        ctl = StrideController(1, adaptive=True, source_fps=30, window=4,
+                patience=2)
+        now = 0.0
+        for i in range(20):
+            now += 1 / 30
+            ctl._update_stride(now)
+            if (i % 2 == 0):
+                ctl.dropped()
+        self.assertGreater(ctl.stride, 1)
+
+        # No more drops: the stride comes back after `patience` windows
+        stride = ctl.stride
+        for _ in range(4 * 2 * stride):
+            now += 1 / 30
+            ctl._update_stride(now)
+        self.assertLess(ctl.stride, stride)
+
+
+class InterpolateDetectionsTest(unittest.TestCase):
+
+    def test_matched_boxes_are_interpolated(self):
+        det_a = _detections([[0.0, 0.0, 0.4, 0.4], [0.6, 0.6, 0.8, 0.8]],
+                [1, 2], [0.8, 0.9])
+        det_b = _detections([[0.1, 0.1, 0.5, 0.5]], [1], [0.6])
+
+        det = interpolate_detections(det_a, det_b, 0.5)
+
+        np.testing.assert_allclose(det.boxes[0], [0.05, 0.05, 0.45, 0.45])
+        np.testing.assert_allclose(det.scores[0], 0.7)
+        # No box of the same class in det_b
+        np.testing.assert_allclose(det.boxes[1], [0.6, 0.6, 0.8, 0.8])
+
+
+class DetectionPropagatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.det_1 = _detections([[0.0, 0.0, 0.4, 0.4]], [1], [0.8])
+        self.det_4 = _detections([[0.06, 0.06, 0.46, 0.46]], [1], [0.8])
+
+    def test_reuse(self):
+        propagator = DetectionPropagator("reuse")
+        self.assertEqual(propagator.push(1, self.det_1), [(1, self.det_1)])
+        self.assertEqual(propagator.push(2, None), [(2, self.det_1)])
+
+    def test_interpolate(self):
+        propagator = DetectionPropagator("interpolate")
+        propagator.push(1, self.det_1)
+        self.assertEqual(propagator.push(2, None), [])
+        self.assertEqual(propagator.push(3, None), [])
+
+        ready = propagator.push(4, self.det_4)
+
+        self.assertEqual([index for (index, _) in ready], [2, 3, 4])
+        np.testing.assert_allclose(ready[0][1].boxes[0],
+                [0.02, 0.02, 0.42, 0.42], rtol=1e-5)
+
+    def test_interpolate_before_the_first_keyframe(self):
+        # The first keyframe was dropped before the output stage
+        propagator = DetectionPropagator("interpolate")
+        self.assertEqual(propagator.push(2, None), [])
+        self.assertEqual(propagator.push(3, None), [])
+        self.assertEqual(propagator.push(4, self.det_4),
+                [(2, self.det_4), (3, self.det_4), (4, self.det_4)])
+        # The next ones are interpolated
+        propagator.push(5, None)
+        self.assertEqual([index for (index, _) in propagator.push(7, self.det_1)],
+                [5, 7])
+
+    def test_flush(self):
+        propagator = DetectionPropagator("interpolate")
+        propagator.push(1, self.det_1)
+        propagator.push(2, None)
+        self.assertEqual(propagator.flush(), [(2, self.det_1)])
+        self.assertEqual(propagator.flush(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# @file: realtime.py
+#
+#
+import collections
+import threading
+import time
+
+
+# Markers sent instead of the result of a frame dropped by the pipeline:
+# by a worker, or before entering the workers
+FRAME_DROPPED = "dropped"
+FRAME_DROPPED_INPUT = "dropped_input"
+
+
+def is_dropped(outframe):
+    """
+    Check whether a result is the marker of a dropped frame
+    """
+    return (isinstance(outframe, str) and
+            outframe in (FRAME_DROPPED, FRAME_DROPPED_INPUT))
+
+
+def from_workers(outframe):
+    """
+    Check whether a result comes from the workers (not skipped by the stride
+    and not dropped before entering the workers)
+    """
+    return (outframe is not None and not
+            (isinstance(outframe, str) and outframe == FRAME_DROPPED_INPUT))
+
+
+class LatestFrameMailbox:
+    """
+    This class holds the most recent frame waiting to enter the pipeline.
+
+    The reader never blocks: a new frame replaces the one still waiting
+    (latest-frame-wins), which is returned to the reader to be dropped.
+    The feeder takes the frames out and pushes them to the input queue.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+
+    def put(self, item):
+        """
+        Store a new item
+
+        Returns:
+            The item it replaced, or None
+
+        """
+        with self._cond:
+            replaced = self._item
+            self._item = item
+            self._cond.notify()
+        return replaced
+
+    def get(self):
+        """
+        Wait for an item
+
+        Returns:
+            The item, or None when the mailbox is closed and empty
+
+        """
+        with self._cond:
+            while (self._item is None and not self._closed):
+                self._cond.wait()
+            item = self._item
+            self._item = None
+        return item
+
+    def close(self):
+        """
+        No more items will be stored
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class RealtimePolicy:
+    """
+    This class holds the latency budget of the real-time mode for a stream
+    and counts the dropped frames per stage.
+
+    A frame is stale when more than max_latency seconds passed since it was
+    read.
+    """
+
+    def __init__(self, max_latency):
+        self.max_latency = max_latency
+        self.drops = collections.Counter()
+
+        # Read time of the frames in the output stage, keyed by frame index
+        self._read_times = {}
+        self._lock = threading.Lock()
+
+    def is_stale(self, t_read, now=None):
+        if (now is None):
+            now = time.monotonic()
+        return (now - t_read > self.max_latency)
+
+    def count(self, stage, n=1):
+        with self._lock:
+            self.drops[stage] += n
+
+    def arrived(self, index, t_read):
+        """
+        Record the read time of a frame reaching the output stage
+        """
+        self._read_times[index] = t_read
+
+    def pop_stale(self, index):
+        """
+        Check (and forget) whether a frame leaving the output stage is stale
+        """
+        t_read = self._read_times.pop(index, None)
+        return (t_read is not None and self.is_stale(t_read))
+
+    def forget(self, index):
+        self._read_times.pop(index, None)
+
+    def report(self):
+        """
+        Returns:
+            (Str) Drop counts per stage
+        """
+        with self._lock:
+            total = sum(self.drops.values())
+            stages = ", ".join(f"{stage} = {n}" for (stage, n) in
+                    sorted(self.drops.items()))
+        return f"Dropped frames = {total}" + (f" ({stages})" if stages else "")
@@ -0,0 +1,72 @@
+"""Tests for classes.realtime."""
+import threading
+import unittest
+
+from classes.realtime import (LatestFrameMailbox, RealtimePolicy,
+        FRAME_DROPPED, FRAME_DROPPED_INPUT, is_dropped, from_workers)
+
+
+class MarkersTest(unittest.TestCase):
+
+    def test_markers(self):
+        self.assertTrue(is_dropped(FRAME_DROPPED))
+        self.assertTrue(is_dropped(FRAME_DROPPED_INPUT))
+        self.assertFalse(is_dropped(3))
+        self.assertFalse(is_dropped(None))
+
+        self.assertTrue(from_workers(FRAME_DROPPED))
+        self.assertTrue(from_workers(3))
+        self.assertFalse(from_workers(FRAME_DROPPED_INPUT))
+        self.assertFalse(from_workers(None))
+
+
+class LatestFrameMailboxTest(unittest.TestCase):
+
+    def test_latest_frame_wins(self):
+        mailbox = LatestFrameMailbox()
+        self.assertIsNone(mailbox.put(1))
+        self.assertEqual(mailbox.put(2), 1)
+        self.assertEqual(mailbox.get(), 2)
+
+    def test_close_wakes_the_reader(self):
+        mailbox = LatestFrameMailbox()
+        items = []
+        reader = threading.Thread(target=lambda: items.append(mailbox.get()))
+        reader.start()
+        mailbox.close()
+        reader.join(timeout=1)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(items, [None])
+
+    def test_pending_item_survives_close(self):
+        mailbox = LatestFrameMailbox()
+        mailbox.put(1)
+        mailbox.close()
+        self.assertEqual(mailbox.get(), 1)
+        self.assertIsNone(mailbox.get())
+
+
+class RealtimePolicyTest(unittest.TestCase):
+
+    def test_stale(self):
+        rt = RealtimePolicy(0.5)
+        self.assertFalse(rt.is_stale(10.0, now=10.4))
+        self.assertTrue(rt.is_stale(10.0, now=10.6))
+
+    def test_pop_stale_forgets_the_frame(self):
+        rt = RealtimePolicy(0.5)
+        rt.arrived(1, 0.0)
+        self.assertTrue(rt.pop_stale(1))
+        self.assertFalse(rt.pop_stale(1))
+
+    def test_report(self):
+        rt = RealtimePolicy(0.5)
+        self.assertEqual(rt.report(), "Dropped frames = 0")
+        rt.count("input", 3)
+        rt.count("gap")
+        self.assertEqual(rt.report(),
+                "Dropped frames = 4 (gap = 1, input = 3)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# @file: renderer.py
+#
+#
+# (the label map and the drawing utilities import TensorFlow: they are
+# imported on use, so that the pipeline runs without it when nothing is drawn)
+import numpy as np
+
+
+def import_drawing():
+    """
+    Import the label map and drawing utilities, e.g. in the parent process
+    before forking the processes that draw
+    """
+    from utils import label_map_util
+    from utils import visualization_utils
+
+
+def load_category_index(path2lab, max_num_classes=90):
+    """
+    Load the label map and build the category index
+
+    Args:
+        path2lab (Str): Path to the Labels file
+        max_num_classes (int): Maximum number of classes
+
+    Returns:
+        (dict) Category dictionaries keyed by category id
+
+    """
+    from utils import label_map_util
+
+    label_map = label_map_util.load_labelmap(path2lab)
+    categories = label_map_util.convert_label_map_to_categories(
+            label_map, use_display_name=True, max_num_classes=max_num_classes)
+
+    return label_map_util.create_category_index(categories)
+
+
+class DetectionRenderer:
+    """ This class draws the detection results on the frames """
+
+    def __init__(self, category_index, line_thickness=4, backend="pil"):
+        """
+        Args:
+            category_index (dict): Category dictionaries keyed by category id
+            line_thickness (int): Width of the box lines
+            backend (Str): "pil" draws each box on a PIL copy of the frame,
+                "cv2" draws all the boxes in place with OpenCV
+        """
+        from utils import visualization_utils as vis_util
+
+        self.category_index = category_index
+        self.line_thickness = line_thickness
+        self._vis_util = vis_util
+
+        self.box_renderer = None
+        if (backend == "cv2"):
+            self.box_renderer = vis_util.BoxRenderer(category_index)
+
+    def render(self, image_np, detections):
+        """
+        Draw the detections on the frame (in place)
+
+        Args:
+            image_np (ndarray): RGB frame
+            detections (Detections): Detection results of the frame
+
+        Returns:
+            (ndarray) The annotated frame
+
+        """
+        self._vis_util.visualize_boxes_and_labels_on_image_array(
+                image_np, detections.boxes,
+                detections.classes.astype(np.int32),
+                detections.scores, self.category_index,
+                use_normalized_coordinates=True,
+                line_thickness=self.line_thickness,
+                box_renderer=self.box_renderer)
+
+        return image_np
@@ -0,0 +1,188 @@
+# @file: reorder.py
+#
+#
+import threading
+import time
+
+
+# Item returned by the reorder buffer in place of a frame that never arrived
+FRAME_MISSING = "missing"
+
+
+class ReorderBuffer:
+    """
+    This class puts back in order the frames coming out of the workers.
+
+    The frames waiting for their predecessors are kept in a window of
+    `capacity` slots following the next index to write: frame i goes in
+    slot i % capacity, so both the insertion and the in-order drain are O(1)
+    per frame.
+
+    The producer calls wait_slot() before sending a frame to the workers, so
+    that it never runs more than `capacity` frames ahead of the output
+    (backpressure). With a gap timeout, the output stops waiting for a
+    missing frame when a later frame has been waiting for longer than that.
+
+    insert() and pop_ready() are called by the consumer thread only.
+    """
+
+    def __init__(self, capacity, first_index=1, gap_timeout=None):
+        """
+        Args:
+            capacity (int): Size of the window
+            first_index (int): Index of the first frame
+            gap_timeout (float): Maximum wait for a missing frame [s], None
+                to wait forever
+        """
+        self.capacity = max(1, capacity)
+        self.gap_timeout = gap_timeout
+
+        self._indices = [-1] * self.capacity
+        self._items = [None] * self.capacity
+        self._stamps = [0.0] * self.capacity
+        self._count = 0
+        self._next = first_index
+        # Lower bound of the stamps of the frames waiting behind a gap
+        self._oldest = float("inf")
+
+        self._cond = threading.Condition()
+        self._waiters = 0
+
+        self.n_missing = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def next_index(self):
+        """ Index of the next frame to write """
+        return self._next
+
+    def insert(self, index, item, stamp=None):
+        """
+        Add a frame
+
+        Args:
+            index (int): Index of the frame
+            item: Frame data
+            stamp (float): Time the gap timeout is measured from (default:
+                now)
+
+        Returns:
+            (Bool) False if the frame is late (already skipped)
+
+        """
+        if (index < self._next):
+            return False
+        if (index >= self._next + self.capacity):
+            raise IndexError(f"Frame {index} outside of the reorder window " +
+                    f"[{self._next}, {self._next + self.capacity})")
+
+        slot = index % self.capacity
+        if (self._indices[slot] == index):
+            raise ValueError(f"Frame {index} inserted twice")
+
+        if (stamp is None):
+            # (only needed by the gap timeout)
+            stamp = time.monotonic() if self.gap_timeout is not None else 0.0
+        self._indices[slot] = index
+        self._items[slot] = item
+        self._stamps[slot] = stamp
+        self._count += 1
+        if (stamp < self._oldest):
+            self._oldest = stamp
+        return True
+
+    def pop_ready(self, now=None):
+        """
+        Remove the frames that can be written
+
+        Args:
+            now (float): Current time (default: time.monotonic())
+
+        Returns:
+            (list) Tuples (index, item) in order, item is FRAME_MISSING for
+            the frames skipped by the gap timeout
+
+        """
+        indices = self._indices
+        items = self._items
+        capacity = self.capacity
+
+        nxt = self._next
+        if (indices[nxt % capacity] != nxt and self.gap_timeout is None):
+            return []
+
+        ready = []
+        while (self._count > 0):
+            slot = nxt % capacity
+            if (indices[slot] == nxt):
+                ready.append((nxt, items[slot]))
+                indices[slot] = -1
+                items[slot] = None
+                self._count -= 1
+                nxt += 1
+                continue
+
+            # The next frame is missing: skip up to the first present one if
+            # a frame has been waiting for too long
+            if (self.gap_timeout is None):
+                break
+            if (now is None):
+                now = time.monotonic()
+            if (now - self._oldest <= self.gap_timeout):
+                break
+            (head, self._oldest) = self._scan(nxt)
+            if (now - self._oldest <= self.gap_timeout):
+                break
+            for index in range(nxt, head):
+                ready.append((index, FRAME_MISSING))
+            self.n_missing += head - nxt
+            nxt = head
+
+        if (self._count == 0):
+            self._oldest = float("inf")
+
+        if (len(ready) > 0):
+            self._next = nxt
+            # (the waiters register before checking the window)
+            if (self._waiters > 0):
+                with self._cond:
+                    self._cond.notify_all()
+        return ready
+
+    def wait_slot(self, index, timeout=None):
+        """
+        Wait until the frame fits in the window
+
+        Args:
+            index (int): Index of the frame
+            timeout (float): Maximum wait [s], None to wait forever
+
+        Returns:
+            (Bool) False on timeout
+
+        """
+        with self._cond:
+            self._waiters += 1
+            try:
+                return self._cond.wait_for(
+                        lambda: index < self._next + self.capacity, timeout)
+            finally:
+                self._waiters -= 1
+
+    def _scan(self, start):
+        """
+        Returns:
+            (first index present after start, oldest stamp in the window)
+        """
+        # Only on a possibly expired gap, bounded by the capacity
+        head = None
+        oldest = float("inf")
+        for index in range(start + 1, start + self.capacity):
+            slot = index % self.capacity
+            if (self._indices[slot] == index):
+                if (head is None):
+                    head = index
+                oldest = min(oldest, self._stamps[slot])
+        return (head, oldest)
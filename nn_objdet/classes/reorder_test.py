@@ -0,0 +1,81 @@
+"""Tests for classes.reorder."""
+import threading
+import time
+import unittest
+
+from classes.reorder import ReorderBuffer, FRAME_MISSING
+
+
+class ReorderBufferTest(unittest.TestCase):
+
+    def test_in_order_drain(self):
+        reorder = ReorderBuffer(8)
+        for index in [3, 1, 4, 2]:
+            reorder.insert(index, f"frame{index}")
+        self.assertEqual(reorder.pop_ready(), [(1, "frame1"), (2, "frame2"),
+            (3, "frame3"), (4, "frame4")])
+        self.assertEqual(len(reorder), 0)
+        self.assertEqual(reorder.next_index, 5)
+
+    def test_waits_for_missing_frame(self):
+        reorder = ReorderBuffer(8)
+        reorder.insert(2, "frame2")
+        self.assertEqual(reorder.pop_ready(), [])
+        reorder.insert(1, "frame1")
+        self.assertEqual([i for (i, _) in reorder.pop_ready()], [1, 2])
+
+    def test_none_is_a_valid_item(self):
+        reorder = ReorderBuffer(4)
+        reorder.insert(1, None)
+        self.assertEqual(reorder.pop_ready(), [(1, None)])
+
+    def test_wraps_around(self):
+        reorder = ReorderBuffer(3)
+        written = []
+        for index in range(1, 20):
+            reorder.insert(index, index)
+            written += [item for (_, item) in reorder.pop_ready()]
+        self.assertEqual(written, list(range(1, 20)))
+
+    def test_window_bounds(self):
+        reorder = ReorderBuffer(4)
+        with self.assertRaises(IndexError):
+            reorder.insert(5, "frame5")
+        reorder.insert(4, "frame4")
+        with self.assertRaises(ValueError):
+            reorder.insert(4, "frame4")
+
+    def test_gap_timeout(self):
+        reorder = ReorderBuffer(8, gap_timeout=0.5)
+        reorder.insert(3, "frame3", stamp=10.0)
+        self.assertEqual(reorder.pop_ready(now=10.4), [])
+        self.assertEqual(reorder.pop_ready(now=10.6), [(1, FRAME_MISSING),
+            (2, FRAME_MISSING), (3, "frame3")])
+        self.assertEqual(reorder.n_missing, 2)
+
+        # A skipped frame arriving late is rejected
+        self.assertFalse(reorder.insert(2, "frame2"))
+
+    def test_no_gap_timeout_waits_forever(self):
+        reorder = ReorderBuffer(8)
+        reorder.insert(2, "frame2", stamp=0.0)
+        self.assertEqual(reorder.pop_ready(now=1e9), [])
+
+    def test_backpressure(self):
+        reorder = ReorderBuffer(2)
+        self.assertTrue(reorder.wait_slot(2, timeout=0))
+        self.assertFalse(reorder.wait_slot(3, timeout=0.01))
+
+        def drain():
+            time.sleep(0.05)
+            reorder.insert(1, "frame1")
+            reorder.pop_ready()
+
+        consumer = threading.Thread(target=drain)
+        consumer.start()
+        self.assertTrue(reorder.wait_slot(3, timeout=1))
+        consumer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
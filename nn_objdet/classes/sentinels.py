@@ -0,0 +1,85 @@
+# @file: sentinels.py
+#
+#
+import queue
+import time
+
+
+# Payload of the last message of a stream, with key (stream, index after the
+# last frame, time). It goes through the input queue like the frames, a
+# worker forwards it to the output stage of the stream, which then knows
+# how many frames to wait for.
+END_OF_STREAM = "end_of_stream"
+
+# Message of the input queue asking the worker receiving it to exit
+STOP_WORKER = "stop_worker"
+
+
+def end_of_stream(stream, num_frames):
+    """
+    Returns:
+        The end of stream message of a stream of num_frames frames
+    """
+    return ((stream, num_frames + 1, time.monotonic()), END_OF_STREAM)
+
+
+def is_end_of_stream(item):
+    """
+    Check whether a (key, payload) message is an end of stream
+    """
+    return (isinstance(item[1], str) and item[1] == END_OF_STREAM)
+
+
+def is_stop(item):
+    """
+    Check whether a message of the input queue is a STOP_WORKER
+    """
+    return (isinstance(item, str) and item == STOP_WORKER)
+
+
+def get_frames(input_q, processed_qs, batch_size=1, batch_wait=0.0):
+    """
+    Wait for the next frames of a worker
+
+    Blocks until the first frame arrives, then collects up to batch_size
+    frames for at most batch_wait seconds. The end of stream messages met on
+    the way are forwarded to the output queue of their stream.
+
+    Args:
+        input_q (Queue): Input queue of the workers
+        processed_qs (list): Output queues, one per stream
+        batch_size (int): Maximum number of frames
+        batch_wait (float): Maximum wait for the frames after the first [s]
+
+    Returns:
+        (frames, stop) The frames to process, and True if the worker has
+        to exit after them
+
+    """
+    frames = []
+    deadline = None
+    while (len(frames) < batch_size):
+        if (deadline is None):
+            # No timeout: the parent sends STOP_WORKER when it is over
+            item = input_q.get(block=True)
+        else:
+            remaining = deadline - time.monotonic()
+            try:
+                if (remaining > 0):
+                    item = input_q.get(block=True, timeout=remaining)
+                else:
+                    item = input_q.get(block=False)
+            except queue.Empty:
+                break
+
+        if (is_stop(item)):
+            return (frames, True)
+        if (is_end_of_stream(item)):
+            processed_qs[item[0][0]].put(item)
+            continue
+
+        frames.append(item)
+        if (deadline is None):
+            deadline = time.monotonic() + batch_wait
+
+    return (frames, False)
@@ -0,0 +1,132 @@
+"""Tests for classes.sentinels."""
+from multiprocessing import Process, Queue
+from threading import Thread
+import time
+import unittest
+
+import numpy as np
+
+import main
+from classes.propagation import DetectionPropagator
+from classes.sentinels import (END_OF_STREAM, STOP_WORKER, end_of_stream,
+        get_frames, is_end_of_stream, is_stop)
+
+
+class GetFramesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.input_q = Queue()
+        self.processed_qs = [Queue(), Queue()]
+
+    def test_markers(self):
+        message = end_of_stream(1, 10)
+        self.assertTrue(is_end_of_stream(message))
+        self.assertEqual(message[0][:2], (1, 11))
+        self.assertFalse(is_end_of_stream(((0, 1, 0.0), None)))
+        self.assertFalse(is_end_of_stream(((0, 1, 0.0), "dropped")))
+        self.assertTrue(is_stop(STOP_WORKER))
+        self.assertFalse(is_stop(((0, 1, 0.0), 3)))
+
+    def test_end_of_stream_forwarded(self):
+        self.input_q.put(end_of_stream(1, 0))
+        self.input_q.put(((0, 1, 0.0), "frame"))
+        (frames, stop) = get_frames(self.input_q, self.processed_qs)
+        self.assertEqual(frames, [((0, 1, 0.0), "frame")])
+        self.assertFalse(stop)
+        self.assertEqual(self.processed_qs[1].get(timeout=1)[1], END_OF_STREAM)
+
+    def test_batch_until_stop(self):
+        for i in range(3):
+            self.input_q.put(((0, i + 1, 0.0), i))
+        self.input_q.put(STOP_WORKER)
+        self.input_q.put(((0, 4, 0.0), 3))
+        (frames, stop) = get_frames(self.input_q, self.processed_qs, 8, 1.0)
+        self.assertEqual([frame[1] for frame in frames], [0, 1, 2])
+        self.assertTrue(stop)
+
+    def test_batch_deadline(self):
+        self.input_q.put(((0, 1, 0.0), 0))
+        t0 = time.monotonic()
+        (frames, stop) = get_frames(self.input_q, self.processed_qs, 8, 0.05)
+        self.assertEqual(len(frames), 1)
+        self.assertFalse(stop)
+        self.assertLess(time.monotonic() - t0, 0.5)
+
+
+class _Sink:
+    """ Indices of the frames written by an output stage """
+
+    def __init__(self):
+        self.written = []
+
+    def append(self, index, detections):
+        self.written.append(index)
+
+
+class TeardownTest(unittest.TestCase):
+
+    def _run_pipeline(self, num_workers, batch_size, num_frames=50):
+        # The workers of main.py on the fake backend, sending back the
+        # detections to the output stages of main.py
+        input_q = Queue(maxsize=8)
+        processed_qs = [Queue(), Queue()]
+        config = main.WorkerConfig(draw=False, batch_size=batch_size,
+                batch_wait=0.005,
+                backend=("fake", {"compute_time": 0.002, "num_boxes": 1}))
+        workers = [Process(target=main.work,
+            args=(input_q, processed_qs, config), daemon=True)
+            for _ in range(num_workers)]
+        for p in workers:
+            p.start()
+
+        sinks = [_Sink() for _ in processed_qs]
+        outflows = [Thread(target=main.outflow_thread,
+            args=(False, False, processed_q, None),
+            kwargs={"in_frames": {}, "propagator": DetectionPropagator(),
+                "sink": sink}, daemon=True)
+            for (processed_q, sink) in zip(processed_qs, sinks)]
+        for thread in outflows:
+            thread.start()
+
+        # Two streams, each one terminated by its end of stream
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        for i in range(num_frames):
+            for stream in range(2):
+                input_q.put(((stream, i + 1, time.monotonic()), frame))
+        for stream in range(2):
+            input_q.put(end_of_stream(stream, num_frames))
+
+        # Output stages: they exit once all the frames arrived, whatever the
+        # position of the end of stream among them
+        for (thread, sink) in zip(outflows, sinks):
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(sink.written, list(range(1, num_frames + 1)))
+
+        # Teardown
+        t0 = time.monotonic()
+        for _ in workers:
+            input_q.put(STOP_WORKER)
+        for p in workers:
+            p.join(timeout=10)
+        latency = time.monotonic() - t0
+
+        self.assertFalse(any(p.is_alive() for p in workers))
+        self.assertTrue(all(p.exitcode == 0 for p in workers))
+        # Nothing left behind
+        self.assertTrue(input_q.empty())
+        self.assertTrue(all(q.empty() for q in processed_qs))
+        return latency
+
+    def test_teardown_latency(self):
+        latency = self._run_pipeline(num_workers=3, batch_size=1)
+        # Well below the 1 s period of the former polling
+        self.assertLess(latency, 0.5)
+
+    def test_teardown_latency_batch(self):
+        latency = self._run_pipeline(num_workers=2, batch_size=4)
+        self.assertLess(latency, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,402 @@
+# @file: supervisor.py
+#
+#
+from multiprocessing import Process, Array
+from threading import Thread, Event
+import ctypes
+import os
+import time
+
+import numpy as np
+
+from classes.sentinels import STOP_WORKER
+from classes.timemeas import LatencyHistogram, TimeMeas
+
+
+def pid_alive(pid):
+    """
+    Check whether a process exists
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkerStats:
+    """
+    This class publishes the load of a worker process in a shared array.
+
+    Each worker owns one row (busy time [s], processed frames, dropped
+    frames, pid, time of the first and of the last frame) of the array, so
+    that the supervisor can read the utilization of all the workers and the
+    parent can aggregate them at the end of the run. The workers of a Pool
+    get the same arguments: with row=None each one claims a free row (never
+    used, or of a worker that exited) on first use, under the lock of the
+    shared counter of the claims `rows`. The row is a stable slot index of
+    the worker, e.g. for its cpu set.
+
+    With the optional hists array, the row also holds the histograms
+    (elapsed, period) of the TimeMeas of the worker, see timemeas().
+    """
+    (BUSY, FRAMES, DROPPED, PID, T_FIRST, T_LAST) = range(6)
+    FIELDS = 6
+    HIST_FIELDS = 2 * LatencyHistogram.SIZE
+
+    def __init__(self, array, row=None, rows=None, hists=None):
+        self._array = array
+        self._rows = rows
+        self._hists = hists
+        self.row = None
+        if (row is not None):
+            self._set_row(row)
+
+    @classmethod
+    def allocate(cls, num_rows):
+        """
+        Returns:
+            (array, hists) Shared arrays of a table of num_rows workers
+        """
+        return (Array(ctypes.c_double, cls.FIELDS * num_rows, lock=False),
+                Array(ctypes.c_double, cls.HIST_FIELDS * num_rows, lock=False))
+
+    def _set_row(self, row):
+        self.row = row
+        self._base = row * self.FIELDS
+
+    def _claim(self):
+        num_rows = len(self._array) // self.FIELDS
+        with self._rows.get_lock():
+            self._rows.value += 1
+            # (a worker replaced by the Pool takes the row of the one that
+            # exited)
+            for row in range(num_rows):
+                pid = int(self._array[row * self.FIELDS + self.PID])
+                if (pid == 0 or not pid_alive(pid)):
+                    break
+            else:
+                row = (self._rows.value - 1) % num_rows
+            self._array[row * self.FIELDS + self.PID] = os.getpid()
+        self._set_row(row)
+
+    def slot(self):
+        """
+        Returns:
+            (int) Row of the worker, claimed if needed
+        """
+        if (self.row is None):
+            self._claim()
+        return self.row
+
+    def record(self, elapsed, frames=1, now=None):
+        """
+        Add the processing time of some frames, ended at now (monotonic)
+        """
+        if (self.row is None):
+            self._claim()
+        if (now is None):
+            now = time.monotonic()
+        base = self._base
+        self._array[base + self.BUSY] += elapsed
+        self._array[base + self.FRAMES] += frames
+        if (self._array[base + self.FRAMES] == frames):
+            # First frames of the worker
+            self._array[base + self.PID] = os.getpid()
+            self._array[base + self.T_FIRST] = now - elapsed
+        self._array[base + self.T_LAST] = now
+
+    def drop(self, frames=1):
+        """
+        Count the frames dropped by the worker
+        """
+        if (self.row is None):
+            self._claim()
+        self._array[self._base + self.DROPPED] += frames
+
+    def read(self):
+        """
+        Returns:
+            (busy_time, frames)
+        """
+        if (self.row is None):
+            return (0.0, 0.0)
+        return (self._array[self._base + self.BUSY],
+                self._array[self._base + self.FRAMES])
+
+    def field(self, field):
+        """
+        Returns:
+            (float) A field of the row (WorkerStats.BUSY, ...), 0 if unused
+        """
+        if (self.row is None):
+            return 0.0
+        return float(self._array[self._base + field])
+
+    def histograms(self):
+        """
+        Returns:
+            (elapsed, period) LatencyHistogram of the row in shared memory,
+            (None, None) without the hists array
+        """
+        if (self._hists is None):
+            return (None, None)
+        if (self.row is None):
+            self._claim()
+        base = self.row * self.HIST_FIELDS
+        view = np.frombuffer(self._hists, dtype=np.float64)
+        size = LatencyHistogram.SIZE
+        return (LatencyHistogram(view[base:base + size]),
+                LatencyHistogram(view[base + size:base + 2 * size]))
+
+    def timemeas(self):
+        """
+        Returns:
+            (TimeMeas) Timer of the worker, recording in the shared histograms
+        """
+        return TimeMeas(*self.histograms())
+
+    def copy(self):
+        """
+        Returns:
+            (WorkerStats) Private copy of the row, kept after the row is
+            reused by another worker
+        """
+        base = self._base
+        array = np.array(self._array[base:base + self.FIELDS], dtype=np.float64)
+        hists = None
+        if (self._hists is not None):
+            base = self.row * self.HIST_FIELDS
+            hists = np.frombuffer(self._hists, dtype=np.float64)[
+                    base:base + self.HIST_FIELDS].copy()
+        return WorkerStats(array, 0, hists=hists)
+
+    def reset(self):
+        if (self.row is None):
+            return
+        for field in range(self.FIELDS):
+            self._array[self._base + field] = 0.0
+        for hist in self.histograms():
+            if (hist is not None):
+                hist.reset()
+
+
+class WorkerSupervisor:
+    """
+    This class keeps a pool of worker processes between min_workers and
+    max_workers, watching the depth of the queues and the utilization of the
+    workers.
+
+    A worker is spawned when the input queue stays (almost) full while the
+    output queue has space, and one is retired when the input queue stays
+    (almost) empty and the workers are mostly idle. A worker is retired by
+    sending a STOP_WORKER through the input queue: the first worker taking it
+    exits, and its row of the stats table is freed once it is gone.
+    """
+
+    def __init__(self, target, make_args, input_q, processed_qs, queue_size,
+            min_workers=1, max_workers=4, interval=1.0, patience=3,
+            cooldown=5.0, high_mark=0.8, low_mark=0.2, low_util=0.5):
+        """
+        Args:
+            target (function): Function of the worker processes
+            make_args (function): make_args(stats) returns the arguments of
+                target
+            input_q (Queue): Input queue of the workers
+            processed_qs (list): Output queues of the workers
+            queue_size (int): Capacity of the queues
+            min_workers (int): Minimum number of workers
+            max_workers (int): Maximum number of workers
+            interval (float): Period of the checks [s]
+            patience (int): Consecutive checks before scaling
+            cooldown (float): Minimum time between two scaling actions [s]
+            high_mark (float): Input queue occupancy triggering a spawn
+            low_mark (float): Input queue occupancy allowing a retirement
+            low_util (float): Average utilization allowing a retirement
+        """
+        self.target = target
+        self.make_args = make_args
+        self.input_q = input_q
+        self.processed_qs = processed_qs
+        self.queue_size = max(1, queue_size)
+
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.interval = interval
+        self.patience = patience
+        self.cooldown = cooldown
+        self.high_mark = high_mark
+        self.low_mark = low_mark
+        self.low_util = low_util
+
+        (self.stats_array, self.hist_array) = WorkerStats.allocate(
+                self.max_workers)
+
+        # row -> Process
+        self._workers = {}
+        # Copies of the stats of the workers that exited
+        self._retired_stats = []
+        # STOP_WORKER sent, not yet taken by a worker
+        self._stopping = 0
+        self._busy = [0.0] * self.max_workers
+        self._high_cnt = 0
+        self._low_cnt = 0
+        self._last_action = 0.0
+
+        self._stop = Event()
+        self._thread = None
+
+        self.n_spawned = 0
+        self.n_retired = 0
+
+    def num_workers(self):
+        return len(self._workers) - self._stopping
+
+    def spawn(self):
+        """
+        Start a new worker process in a free row of the stats table
+        """
+        row = min(set(range(self.max_workers)) - set(self._workers))
+        stats = WorkerStats(self.stats_array, row, hists=self.hist_array)
+        stats.reset()
+        self._busy[row] = 0.0
+
+        p = Process(target=self.target, args=self.make_args(stats),
+                daemon=True)
+        p.start()
+
+        self._workers[row] = p
+        self.n_spawned += 1
+
+    def retire(self):
+        """
+        Ask a worker to exit after the frames already queued
+        """
+        self.input_q.put(STOP_WORKER)
+        self._stopping += 1
+        self.n_retired += 1
+
+    def reap(self):
+        """
+        Free the rows of the workers that exited
+        """
+        for (row, p) in list(self._workers.items()):
+            if (not p.is_alive()):
+                p.join()
+                self._retired_stats.append(WorkerStats(self.stats_array, row,
+                    hists=self.hist_array).copy())
+                del self._workers[row]
+                self._stopping = max(0, self._stopping - 1)
+
+    def worker_stats(self, retired=False):
+        """
+        Args:
+            retired (bool): Include the workers that already exited
+
+        Returns:
+            (list) WorkerStats of the running workers
+        """
+        stats = [WorkerStats(self.stats_array, row, hists=self.hist_array)
+                for row in sorted(self._workers)]
+        if (retired):
+            stats = self._retired_stats + stats
+        return stats
+
+    def utilization(self):
+        """
+        Average fraction of time the workers spent processing frames since the
+        last call
+        """
+        if (len(self._workers) == 0):
+            return 0.0
+
+        util = 0.0
+        for row in self._workers:
+            busy = self.stats_array[row * WorkerStats.FIELDS + WorkerStats.BUSY]
+            util += (busy - self._busy[row]) / self.interval
+            self._busy[row] = busy
+
+        return util / len(self._workers)
+
+    def step(self):
+        """
+        Check the load and scale the pool if needed
+
+        Returns:
+            (int) +1 if a worker has been spawned, -1 if one has been retired,
+            0 otherwise
+
+        """
+        # Reap the retired workers
+        self.reap()
+
+        in_occ = self.input_q.qsize() / self.queue_size
+        out_occ = max(q.qsize() for q in self.processed_qs) / self.queue_size
+        util = self.utilization()
+
+        # Adding workers does not help if the output stage is the bottleneck
+        if (in_occ >= self.high_mark and out_occ < self.high_mark):
+            self._high_cnt += 1
+        else:
+            self._high_cnt = 0
+
+        if (in_occ <= self.low_mark and util < self.low_util):
+            self._low_cnt += 1
+        else:
+            self._low_cnt = 0
+
+        now = time.monotonic()
+        if (now - self._last_action < self.cooldown):
+            return 0
+
+        # (a retiring worker keeps its row until it exits)
+        if (self._high_cnt >= self.patience and
+                len(self._workers) < self.max_workers):
+            self.spawn()
+        elif (self._low_cnt >= self.patience and
+                self.num_workers() > self.min_workers):
+            self.retire()
+        else:
+            return 0
+
+        self._last_action = now
+        action = 1 if self._high_cnt >= self.patience else -1
+        self._high_cnt = 0
+        self._low_cnt = 0
+        print(f"Supervisor | {'Spawned' if action > 0 else 'Retired'} a worker" +
+                f" -> {self.num_workers()} workers" +
+                f" (input queue {in_occ:.0%}, utilization {util:.0%})")
+        return action
+
+    def start(self, num_workers):
+        """
+        Spawn the initial workers and start the monitoring thread
+        """
+        for _ in range(max(self.min_workers, min(num_workers, self.max_workers))):
+            self.spawn()
+        self._last_action = time.monotonic()
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while (not self._stop.wait(self.interval)):
+            self.step()
+
+    def stop(self):
+        """
+        Stop the monitoring, ask all the workers to exit and wait for them
+        """
+        self._stop.set()
+        if (self._thread is not None):
+            self._thread.join()
+
+        for _ in range(self.num_workers()):
+            self.input_q.put(STOP_WORKER)
+        for p in self._workers.values():
+            p.join()
+
+        print(f"Supervisor | Spawned {self.n_spawned} workers, " +
+                f"retired {self.n_retired}")
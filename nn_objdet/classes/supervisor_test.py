@@ -0,0 +1,156 @@
+"""Tests for classes.supervisor."""
+import ctypes
+import multiprocessing
+import os
+import time
+import unittest
+
+from classes.sentinels import is_stop
+from classes.supervisor import WorkerStats, WorkerSupervisor
+
+
+def _idle_worker(input_q, stats):
+    while (not is_stop(input_q.get())):
+        pass
+
+
+class _FakeQueue:
+    """ Queue with a settable occupancy """
+
+    def __init__(self, size=0):
+        self.size = size
+        self._q = multiprocessing.Queue()
+
+    def qsize(self):
+        return self.size
+
+    def put(self, item):
+        self._q.put(item)
+
+    def get(self):
+        return self._q.get()
+
+
+class WorkerSupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.input_q = _FakeQueue()
+        self.processed_q = _FakeQueue()
+        self.supervisor = WorkerSupervisor(_idle_worker,
+                lambda stats: (self.input_q, stats),
+                self.input_q, [self.processed_q], 10, min_workers=1,
+                max_workers=3, patience=1, cooldown=0.0)
+        for _ in range(2):
+            self.supervisor.spawn()
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_spawn_when_input_queue_is_full(self):
+        self.input_q.size = 10
+        self.assertEqual(self.supervisor.step(), 1)
+        self.assertEqual(self.supervisor.num_workers(), 3)
+        # Upper bound reached
+        self.assertEqual(self.supervisor.step(), 0)
+
+    def test_no_spawn_when_output_queue_is_full(self):
+        self.input_q.size = 10
+        self.processed_q.size = 10
+        self.assertEqual(self.supervisor.step(), 0)
+        self.assertEqual(self.supervisor.num_workers(), 2)
+
+    def test_retire_when_idle(self):
+        self.assertEqual(self.supervisor.step(), -1)
+        self.assertEqual(self.supervisor.num_workers(), 1)
+        # Lower bound reached
+        self.assertEqual(self.supervisor.step(), 0)
+
+    def test_retired_worker_frees_its_row(self):
+        self.supervisor.retire()
+        deadline = time.monotonic() + 5
+        while (len(self.supervisor._workers) > 1 and time.monotonic() < deadline):
+            time.sleep(0.01)
+            self.supervisor.reap()
+        self.assertEqual(len(self.supervisor._workers), 1)
+        self.assertEqual(self.supervisor.num_workers(), 1)
+        # Its stats are kept for the end of the run
+        self.assertEqual(len(self.supervisor.worker_stats()), 1)
+        self.assertEqual(len(self.supervisor.worker_stats(retired=True)), 2)
+        # The row can be reused
+        self.supervisor.spawn()
+        self.assertEqual(self.supervisor.num_workers(), 2)
+
+    def test_stop_latency(self):
+        # The idle workers block on the queue: they exit as soon as they get
+        # their STOP_WORKER, not at the next poll
+        t0 = time.monotonic()
+        self.supervisor.stop()
+        latency = time.monotonic() - t0
+        self.assertLess(latency, 0.5)
+        self.supervisor = WorkerSupervisor(_idle_worker, None, self.input_q,
+                [self.processed_q], 10)
+
+    def test_no_retire_when_busy(self):
+        for row in range(2):
+            self.supervisor.stats_array[row * WorkerStats.FIELDS] = 10.0
+        self.assertEqual(self.supervisor.step(), 0)
+        self.assertEqual(self.supervisor.num_workers(), 2)
+
+
+class WorkerStatsTest(unittest.TestCase):
+
+    def test_rows_claimed_on_first_use(self):
+        # Same arguments for all the workers of a Pool
+        array = multiprocessing.Array(ctypes.c_double, 2 * WorkerStats.FIELDS)
+        rows = multiprocessing.Value(ctypes.c_int, 0)
+        first = WorkerStats(array, rows=rows)
+        second = WorkerStats(array, rows=rows)
+        self.assertEqual(first.read(), (0.0, 0.0))
+
+        second.record(0.5)
+        first.record(0.25, 2)
+        self.assertEqual(WorkerStats(array, 0).read(), (0.5, 1.0))
+        self.assertEqual(WorkerStats(array, 1).read(), (0.25, 2.0))
+
+    def test_slot_of_an_exited_worker_is_reused(self):
+        (array, _) = WorkerStats.allocate(3)
+        rows = multiprocessing.Value(ctypes.c_int, 0)
+        self.assertEqual(WorkerStats(array, rows=rows).slot(), 0)
+        # Row 1 belonged to a process that exited
+        p = multiprocessing.Process(target=time.sleep, args=(0,))
+        p.start()
+        p.join()
+        array[1 * WorkerStats.FIELDS + WorkerStats.PID] = p.pid
+        array[1 * WorkerStats.FIELDS + WorkerStats.FRAMES] = 5
+        self.assertEqual(WorkerStats(array, rows=rows).slot(), 1)
+        self.assertEqual(WorkerStats(array, rows=rows).slot(), 2)
+
+    def test_published_state(self):
+        (array, hists) = WorkerStats.allocate(1)
+        stats = WorkerStats(array, 0, hists=hists)
+        stats.record(0.5, now=10.0)
+        stats.record(0.25, 2, now=11.0)
+        stats.drop()
+        self.assertEqual(stats.field(WorkerStats.PID), os.getpid())
+        self.assertEqual(stats.field(WorkerStats.T_FIRST), 9.5)
+        self.assertEqual(stats.field(WorkerStats.T_LAST), 11.0)
+        self.assertEqual(stats.field(WorkerStats.DROPPED), 1)
+
+        # The timer of the worker records in the shared histograms
+        tm = stats.timemeas()
+        tm.start()
+        tm.stop()
+        (elapsed, _) = WorkerStats(array, 0, hists=hists).histograms()
+        self.assertEqual(elapsed.count, 1)
+
+        # A copy survives the reuse of the row
+        copy = stats.copy()
+        stats.reset()
+        self.assertEqual(stats.read(), (0.0, 0.0))
+        self.assertEqual(copy.read(), (0.75, 3.0))
+        self.assertEqual(copy.field(WorkerStats.DROPPED), 1)
+        self.assertEqual(copy.histograms()[0].count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
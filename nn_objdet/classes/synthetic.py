@@ -0,0 +1,122 @@
+# @file: synthetic.py
+#
+#
+import cv2
+import numpy as np
+
+
+# Prefix of the synthetic sources: "synthetic:WIDTHxHEIGHT[@FPS][:FRAMES]"
+SYNTHETIC_PREFIX = "synthetic:"
+
+
+def is_synthetic_source(source):
+    """
+    Check whether the source is a synthetic frame generator
+    """
+    return source.startswith(SYNTHETIC_PREFIX)
+
+
+def parse_synthetic(source):
+    """
+    Parse a "synthetic:WIDTHxHEIGHT[@FPS][:FRAMES]" source
+
+    FPS = 0 (default) generates the frames as fast as they are read,
+    FRAMES = 0 (default) never ends.
+
+    Returns:
+        (width, height, fps, num_frames)
+    """
+    spec = source[len(SYNTHETIC_PREFIX):]
+    (spec, _, num_frames) = spec.partition(":")
+    (size, _, fps) = spec.partition("@")
+    try:
+        (width, height) = size.lower().split("x")
+        (width, height) = (int(width), int(height))
+        fps = float(fps) if fps else 0.0
+        num_frames = int(num_frames) if num_frames else 0
+    except ValueError:
+        raise ValueError(f"Invalid synthetic source '{source}', expected " +
+                "synthetic:WIDTHxHEIGHT[@FPS][:FRAMES]")
+    if (width <= 0 or height <= 0 or fps < 0 or num_frames < 0):
+        raise ValueError(f"Invalid synthetic source '{source}'")
+    return (width, height, fps, num_frames)
+
+
+class SyntheticSource:
+    """
+    This class generates BGR frames in place of a cv2.VideoCapture, to
+    benchmark the pipeline without decoding a file.
+
+    A few distinct frames (noise and a moving box) are generated in advance
+    and cycled, so that the cost of a read is a copy like the one of a
+    decoder. The frame rate is reported by get(CAP_PROP_FPS), the reader
+    paces the reads with it.
+    """
+    NUM_PATTERNS = 16
+
+    def __init__(self, width, height, fps=0.0, num_frames=0, seed=0):
+        """
+        Args:
+            width (int): Width of the frames
+            height (int): Height of the frames
+            fps (float): Frame rate, 0 = as fast as possible
+            num_frames (int): Length of the stream, 0 = endless
+            seed (int): Seed of the noise
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.num_frames = num_frames
+
+        rng = np.random.RandomState(seed)
+        background = rng.randint(0, 64, size=(height, width, 3), dtype=np.uint8)
+        box = (max(1, width // 8), max(1, height // 8))
+        self._patterns = []
+        for i in range(self.NUM_PATTERNS):
+            frame = background.copy()
+            x = (i * width // self.NUM_PATTERNS) % max(1, width - box[0])
+            y = height // 3
+            cv2.rectangle(frame, (x, y), (x + box[0], y + box[1]),
+                    (255, 255, 255), -1)
+            self._patterns.append(frame)
+
+        self._count = 0
+        self._opened = True
+
+    @classmethod
+    def from_source(cls, source):
+        """
+        Create the generator of a "synthetic:..." source string
+        """
+        return cls(*parse_synthetic(source))
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if (not self._opened or
+                (self.num_frames > 0 and self._count >= self.num_frames)):
+            return (False, None)
+
+        frame = self._patterns[self._count % self.NUM_PATTERNS].copy()
+        self._count += 1
+        return (True, frame)
+
+    def get(self, prop):
+        if (prop == cv2.CAP_PROP_FRAME_WIDTH):
+            return float(self.width)
+        if (prop == cv2.CAP_PROP_FRAME_HEIGHT):
+            return float(self.height)
+        if (prop == cv2.CAP_PROP_FPS):
+            return float(self.fps)
+        if (prop == cv2.CAP_PROP_FRAME_COUNT):
+            return float(self.num_frames)
+        if (prop == cv2.CAP_PROP_POS_FRAMES):
+            return float(self._count)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._opened = False
@@ -0,0 +1,73 @@
+"""Tests for classes.synthetic."""
+import unittest
+
+import cv2
+import numpy as np
+
+from classes.synthetic import SyntheticSource, is_synthetic_source, parse_synthetic
+
+
+class ParseSyntheticTest(unittest.TestCase):
+
+    def test_full(self):
+        self.assertEqual(parse_synthetic("synthetic:640x480@30:300"),
+                (640, 480, 30.0, 300))
+
+    def test_defaults(self):
+        self.assertEqual(parse_synthetic("synthetic:320x240"), (320, 240, 0.0, 0))
+        self.assertEqual(parse_synthetic("synthetic:320x240:10"), (320, 240, 0.0, 10))
+
+    def test_invalid(self):
+        for source in ("synthetic:640", "synthetic:ax480", "synthetic:0x480",
+                "synthetic:640x480@-1"):
+            with self.assertRaises(ValueError):
+                parse_synthetic(source)
+
+    def test_prefix(self):
+        self.assertTrue(is_synthetic_source("synthetic:640x480"))
+        self.assertFalse(is_synthetic_source("video.mp4"))
+
+
+class SyntheticSourceTest(unittest.TestCase):
+
+    def test_capture_interface(self):
+        vs = SyntheticSource.from_source("synthetic:64x48@25:3")
+        self.assertTrue(vs.isOpened())
+        self.assertEqual(int(vs.get(cv2.CAP_PROP_FRAME_WIDTH)), 64)
+        self.assertEqual(int(vs.get(cv2.CAP_PROP_FRAME_HEIGHT)), 48)
+        self.assertEqual(vs.get(cv2.CAP_PROP_FPS), 25.0)
+        self.assertEqual(int(vs.get(cv2.CAP_PROP_FRAME_COUNT)), 3)
+
+        frames = []
+        while (True):
+            (ret, frame) = vs.read()
+            if (not ret):
+                break
+            frames.append(frame)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0].shape, (48, 64, 3))
+        self.assertEqual(frames[0].dtype, np.uint8)
+        # The box moves
+        self.assertFalse(np.array_equal(frames[0], frames[1]))
+
+        vs.release()
+        self.assertFalse(vs.isOpened())
+
+    def test_frames_are_copies(self):
+        vs = SyntheticSource(32, 16, num_frames=SyntheticSource.NUM_PATTERNS + 1)
+        (_, first) = vs.read()
+        reference = first.copy()
+        first[:] = 0
+        for _ in range(SyntheticSource.NUM_PATTERNS - 1):
+            vs.read()
+        (_, again) = vs.read()
+        np.testing.assert_array_equal(again, reference)
+
+    def test_endless(self):
+        vs = SyntheticSource(16, 16)
+        for _ in range(100):
+            self.assertTrue(vs.read()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
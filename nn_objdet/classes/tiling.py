@@ -0,0 +1,248 @@
+# @file: tiling.py
+#
+#
+import numpy as np
+
+from classes.detections import Detections, MAX_DETECTIONS
+from utils import np_box_list
+from utils import np_box_list_ops
+
+
+def parse_roi(roi):
+    """
+    Parse a "ymin,xmin,ymax,xmax" string (fractions of the frame, the same
+    layout of the detection boxes)
+
+    Returns:
+        (ndarray) The region, or None for an empty string
+    """
+    if (not roi):
+        return None
+    window = np.array([float(v) for v in roi.split(",")], dtype=np.float64)
+    if (window.shape != (4,) or np.any(window < 0) or np.any(window > 1) or
+            window[0] >= window[2] or window[1] >= window[3]):
+        raise ValueError(f"Invalid region of interest '{roi}'")
+    return window
+
+
+def parse_grid(tiles):
+    """
+    Parse a "ROWSxCOLS" string
+
+    Returns:
+        (rows, cols), or None for an empty string
+    """
+    if (not tiles):
+        return None
+    (rows, cols) = tiles.lower().split("x")
+    return (max(1, int(rows)), max(1, int(cols)))
+
+
+def tile_windows(height, width, grid=(1, 1), overlap=0.0, roi=None):
+    """
+    Split the region of interest of a frame in a grid of overlapping tiles
+
+    All the tiles have the same size, so that they can be stacked in one
+    batch: the first and the last tile of each row/column are aligned with
+    the borders of the region, the others are evenly spaced.
+
+    Args:
+        height (int): Height of the frame
+        width (int): Width of the frame
+        grid (tuple): (rows, cols) of tiles
+        overlap (float): Overlap of adjacent tiles (fraction of the tile)
+        roi (ndarray): Region [ymin, xmin, ymax, xmax] in fractions of the
+            frame (default: the whole frame)
+
+    Returns:
+        (ndarray) Windows [ymin, xmin, ymax, xmax] of the tiles in pixels
+        [num_tiles, 4]
+
+    """
+    if (roi is None):
+        roi = (0.0, 0.0, 1.0, 1.0)
+    (rows, cols) = grid
+
+    # Region in pixels (at least one pixel)
+    y0 = int(round(roi[0] * height))
+    x0 = int(round(roi[1] * width))
+    y1 = max(y0 + 1, int(round(roi[2] * height)))
+    x1 = max(x0 + 1, int(round(roi[3] * width)))
+
+    # n tiles of size t overlapping by overlap * t cover n*t - (n-1)*overlap*t
+    tile_h = min(y1 - y0, int(np.ceil((y1 - y0) / (rows - (rows - 1) * overlap))))
+    tile_w = min(x1 - x0, int(np.ceil((x1 - x0) / (cols - (cols - 1) * overlap))))
+
+    ys = np.linspace(y0, y1 - tile_h, rows).round().astype(np.int64)
+    xs = np.linspace(x0, x1 - tile_w, cols).round().astype(np.int64)
+    (ys, xs) = np.meshgrid(ys, xs, indexing="ij")
+    ys = ys.ravel()
+    xs = xs.ravel()
+    return np.stack([ys, xs, ys + tile_h, xs + tile_w], axis=1)
+
+
+def to_frame_coordinates(detections, window):
+    """
+    Map the boxes detected in a tile to the coordinates of the frame
+
+    Args:
+        detections (Detections): Detections of the tile (boxes normalized to
+            the tile)
+        window (ndarray): Window of the tile [ymin, xmin, ymax, xmax]
+            normalized to the frame
+
+    Returns:
+        (BoxList) Boxes normalized to the frame, with the "scores" and
+        "classes" fields
+
+    """
+    boxlist = np_box_list.BoxList(
+            np.asarray(detections.boxes, dtype=np.float32).reshape(-1, 4))
+    boxlist.add_field("scores", np.asarray(detections.scores))
+    boxlist.add_field("classes", np.asarray(detections.classes))
+
+    # The frame expressed in the coordinates of the tile: changing the
+    # coordinate frame to it maps the tile to its window
+    (wy0, wx0, wy1, wx1) = window
+    (wh, ww) = (wy1 - wy0, wx1 - wx0)
+    inverse = np.array([-wy0 / wh, -wx0 / ww, (1 - wy0) / wh, (1 - wx0) / ww])
+    return np_box_list_ops.change_coordinate_frame(boxlist, inverse)
+
+
+def merge_detections(boxlists, iou_thresh=0.5, score_thresh=0.0,
+        max_detections=MAX_DETECTIONS):
+    """
+    Merge the detections of overlapping tiles, suppressing the duplicates
+    of the objects across the seams (per class)
+
+    Args:
+        boxlists (list): BoxList of each tile, in frame coordinates
+        iou_thresh (float): Boxes of the same class overlapping more than
+            this are duplicates
+        score_thresh (float): Minimum score kept
+        max_detections (int): Maximum number of detections kept
+
+    Returns:
+        (Detections) Detections of the frame, sorted by decreasing score
+
+    """
+    boxlist = np_box_list_ops.concatenate(boxlists)
+    if (boxlist.num_boxes() == 0):
+        return Detections(boxes=np.zeros((0, 4), dtype=np.float32),
+                scores=np.zeros(0, dtype=np.float32),
+                classes=np.zeros(0, dtype=np.uint16), num_detections=0)
+
+    # One score column per class present in the frame (not per class of the
+    # label map, the suppression loops over the columns)
+    classes = boxlist.get_field("classes")
+    (labels, column) = np.unique(classes, return_inverse=True)
+    scores = np.zeros((boxlist.num_boxes(), len(labels)), dtype=np.float32)
+    scores[np.arange(boxlist.num_boxes()), column] = boxlist.get_field("scores")
+
+    candidates = np_box_list.BoxList(boxlist.get())
+    candidates.add_field("scores", scores)
+    merged = np_box_list_ops.multi_class_non_max_suppression(candidates,
+            score_thresh, iou_thresh, max_detections)
+
+    n = min(merged.num_boxes(), max_detections)
+    return Detections(
+            boxes=merged.get()[:n].astype(np.float32),
+            scores=merged.get_field("scores")[:n].astype(np.float32),
+            classes=labels[merged.get_field("classes")[:n].astype(np.int64)]
+                .astype(np.uint16),
+            num_detections=n)
+
+
+class TiledInference:
+    """
+    This class runs the detector on a region of interest of the frame,
+    optionally split in overlapping tiles.
+
+    Small objects in high resolution frames are lost when the model resizes
+    the whole frame to its input size: each tile is resized instead. The
+    tiles of a frame are processed as one batch, their boxes are mapped back
+    to the frame and the duplicates across the seams are suppressed.
+    """
+
+    def __init__(self, grid=(1, 1), overlap=0.2, roi=None, iou_thresh=0.5):
+        """
+        Args:
+            grid (tuple): (rows, cols) of tiles
+            overlap (float): Overlap of adjacent tiles (fraction of the tile)
+            roi (ndarray): Region [ymin, xmin, ymax, xmax] in fractions of
+                the frame (default: the whole frame)
+            iou_thresh (float): Overlap of the duplicates across the seams
+        """
+        self.grid = grid
+        self.overlap = overlap
+        self.roi = roi
+        self.iou_thresh = iou_thresh
+
+        # Windows of the last frame size
+        self._shape = None
+        self._windows = None
+        self._norm_windows = None
+
+    @property
+    def num_tiles(self):
+        return self.grid[0] * self.grid[1]
+
+    def windows(self, shape):
+        """
+        Returns:
+            (pixel windows, windows normalized to the frame) of the tiles
+        """
+        if (shape[:2] != self._shape):
+            (height, width) = shape[:2]
+            self._shape = shape[:2]
+            self._windows = tile_windows(height, width, self.grid,
+                    self.overlap, self.roi)
+            self._norm_windows = self._windows / np.array(
+                    [height, width, height, width], dtype=np.float64)
+        return (self._windows, self._norm_windows)
+
+    def crops(self, image_np):
+        """
+        Returns:
+            (list) The tiles of the frame (views)
+        """
+        (windows, _) = self.windows(image_np.shape)
+        return [image_np[y0:y1, x0:x1] for (y0, x0, y1, x1) in windows]
+
+    def merge(self, image_shape, tile_detections):
+        """
+        Args:
+            image_shape (tuple): Shape of the frame
+            tile_detections (list): Detections of each tile
+
+        Returns:
+            (Detections) Detections of the frame
+        """
+        (_, norm_windows) = self.windows(image_shape)
+        if (self.num_tiles == 1 and self.roi is None):
+            return tile_detections[0]
+        boxlists = [to_frame_coordinates(detections, window)
+                for (detections, window) in zip(tile_detections, norm_windows)]
+        if (self.num_tiles == 1):
+            # Nothing to merge
+            boxlist = boxlists[0]
+            return Detections(boxes=boxlist.get().astype(np.float32),
+                    scores=boxlist.get_field("scores"),
+                    classes=boxlist.get_field("classes"),
+                    num_detections=boxlist.num_boxes())
+        return merge_detections(boxlists, self.iou_thresh)
+
+    def run(self, image_np, run_batch):
+        """
+        Detect the objects of a frame
+
+        Args:
+            image_np (ndarray): Frame
+            run_batch (function): Inference on a list of equally sized
+                images, returning a list of Detections
+
+        Returns:
+            (Detections) Detections of the frame
+
+        """
+        return self.merge(image_np.shape, run_batch(self.crops(image_np)))
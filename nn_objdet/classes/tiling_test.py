@@ -0,0 +1,127 @@
+"""Tests for classes.tiling."""
+import unittest
+
+import numpy as np
+
+from classes.detections import Detections
+from classes.tiling import (TiledInference, merge_detections, parse_grid,
+        parse_roi, tile_windows, to_frame_coordinates)
+
+
+def _detections(boxes, scores, classes):
+    return Detections(boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            scores=np.array(scores, dtype=np.float32),
+            classes=np.array(classes, dtype=np.uint16),
+            num_detections=len(scores))
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_roi(self):
+        np.testing.assert_allclose(parse_roi("0.1,0.2,0.5,1"), [0.1, 0.2, 0.5, 1])
+        self.assertIsNone(parse_roi(""))
+
+    def test_invalid_roi(self):
+        with self.assertRaises(ValueError):
+            parse_roi("0.5,0,0.2,1")
+        with self.assertRaises(ValueError):
+            parse_roi("0,0,1.5,1")
+
+    def test_grid(self):
+        self.assertEqual(parse_grid("2x3"), (2, 3))
+        self.assertIsNone(parse_grid(""))
+
+
+class TileWindowsTest(unittest.TestCase):
+
+    def test_single_tile_is_the_frame(self):
+        np.testing.assert_array_equal(tile_windows(480, 640), [[0, 0, 480, 640]])
+
+    def test_tiles_cover_the_frame_with_overlap(self):
+        windows = tile_windows(1000, 2000, (2, 3), overlap=0.25)
+        self.assertEqual(len(windows), 6)
+        # Same size
+        sizes = {(y1 - y0, x1 - x0) for (y0, x0, y1, x1) in windows}
+        self.assertEqual(len(sizes), 1)
+        (tile_h, tile_w) = sizes.pop()
+        # Aligned with the borders
+        self.assertEqual(windows[:, 0].min(), 0)
+        self.assertEqual(windows[:, 1].min(), 0)
+        self.assertEqual(windows[:, 2].max(), 1000)
+        self.assertEqual(windows[:, 3].max(), 2000)
+        # Adjacent tiles overlap by about a quarter of the tile
+        self.assertAlmostEqual((windows[0, 3] - windows[1, 1]) / tile_w, 0.25,
+                delta=0.01)
+        self.assertAlmostEqual((windows[0, 2] - windows[3, 0]) / tile_h, 0.25,
+                delta=0.01)
+
+    def test_tiles_of_the_region(self):
+        windows = tile_windows(100, 200, (1, 2), overlap=0.0,
+                roi=(0.5, 0.25, 1.0, 0.75))
+        np.testing.assert_array_equal(windows, [[50, 50, 100, 100],
+                [50, 100, 100, 150]])
+
+
+class MergeTest(unittest.TestCase):
+
+    def test_to_frame_coordinates(self):
+        boxlist = to_frame_coordinates(
+                _detections([[0, 0, 1, 1], [0.5, 0.5, 1, 1]], [0.9, 0.8], [1, 2]),
+                np.array([0.5, 0.0, 1.0, 0.5]))
+        np.testing.assert_allclose(boxlist.get(),
+                [[0.5, 0, 1, 0.5], [0.75, 0.25, 1, 0.5]], atol=1e-6)
+        np.testing.assert_array_equal(boxlist.get_field("classes"), [1, 2])
+
+    def test_duplicates_across_the_seam_are_merged(self):
+        # The same object seen by two tiles, and another class on top of it
+        left = to_frame_coordinates(_detections([[0.2, 0.8, 0.6, 1.0]],
+                [0.9], [3]), np.array([0.0, 0.0, 1.0, 0.6]))
+        right = to_frame_coordinates(_detections(
+                [[0.2, 0.125, 0.6, 0.35], [0.2, 0.125, 0.6, 0.35]],
+                [0.7, 0.6], [3, 5]), np.array([0.0, 0.4, 1.0, 1.0]))
+        detections = merge_detections([left, right], iou_thresh=0.5)
+
+        self.assertEqual(detections.num_detections, 2)
+        np.testing.assert_array_equal(detections.classes, [3, 5])
+        np.testing.assert_allclose(detections.scores, [0.9, 0.6])
+        np.testing.assert_allclose(detections.boxes[0], [0.2, 0.48, 0.6, 0.6],
+                atol=1e-6)
+        self.assertEqual(detections.classes.dtype, np.uint16)
+
+    def test_merge_nothing(self):
+        empty = to_frame_coordinates(_detections([], [], []),
+                np.array([0.0, 0.0, 1.0, 1.0]))
+        self.assertEqual(merge_detections([empty, empty]).num_detections, 0)
+
+
+class TiledInferenceTest(unittest.TestCase):
+
+    def test_tiles_run_as_one_batch(self):
+        calls = []
+
+        def run_batch(tiles):
+            calls.append([tile.shape for tile in tiles])
+            # One object in the middle of each tile
+            return [_detections([[0.25, 0.25, 0.75, 0.75]], [0.5], [1])
+                    for _ in tiles]
+
+        tiling = TiledInference(grid=(2, 2), overlap=0.0)
+        detections = tiling.run(np.zeros((100, 200, 3), dtype=np.uint8), run_batch)
+
+        self.assertEqual(calls, [[(50, 100, 3)] * 4])
+        self.assertEqual(detections.num_detections, 4)
+        np.testing.assert_allclose(sorted(detections.boxes[:, 1]),
+                [0.125, 0.125, 0.625, 0.625])
+
+    def test_region_of_interest(self):
+        def run_batch(tiles):
+            self.assertEqual([tile.shape for tile in tiles], [(50, 50, 3)])
+            return [_detections([[0, 0, 1, 1]], [0.5], [1])]
+
+        tiling = TiledInference(roi=np.array([0.5, 0.5, 1.0, 1.0]))
+        detections = tiling.run(np.zeros((100, 100, 3), dtype=np.uint8), run_batch)
+        np.testing.assert_allclose(detections.boxes, [[0.5, 0.5, 1, 1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,27 +1,216 @@
+import math
 import time
 from sys import float_info as flt_info 
 
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    This class records durations in a histogram with logarithmic buckets
+    (HDR-style), to extract the percentiles of the tail.
+
+    Bucket 0 holds the values up to MIN_VALUE, bucket i > 0 the values in
+    (MIN_VALUE * BASE^(i-1), MIN_VALUE * BASE^i]: a percentile is the upper
+    bound of its bucket, within a relative error of PRECISION. Everything is
+    in one fixed float64 array [count, sum, min, max, buckets...], so that a
+    record is O(1), two histograms merge by adding the buckets and the array
+    can live in shared memory (a multiprocessing.Array of SIZE doubles). An
+    all-zero array is an empty histogram (min and max are only meaningful
+    when count > 0).
+    """
+    MIN_VALUE = 1e-6
+    MAX_VALUE = 1e3
+    PRECISION = 0.01
+    BASE = 1.0 + PRECISION
+    NUM_BUCKETS = int(math.ceil(math.log(MAX_VALUE / MIN_VALUE, BASE))) + 1
+
+    # Layout of the array
+    COUNT = 0
+    SUM = 1
+    MIN = 2
+    MAX = 3
+    HEADER = 4
+    SIZE = HEADER + NUM_BUCKETS
+
+    # Percentiles of the reports
+    PERCENTILES = (50, 90, 95, 99, 99.9)
+
+    _inv_log_base = 1.0 / math.log(BASE)
+
+    def __init__(self, buffer=None):
+        """
+        Args:
+            buffer: SIZE float64 to use as storage, e.g. a shared Array or a
+                view of a larger ndarray (optional, a new zeroed array
+                otherwise)
+        """
+        if (buffer is None):
+            self.data = np.zeros(self.SIZE, dtype=np.float64)
+        elif (isinstance(buffer, np.ndarray)):
+            self.data = buffer[:self.SIZE]
+        else:
+            self.data = np.frombuffer(buffer, dtype=np.float64, count=self.SIZE)
+
+    @classmethod
+    def bucket(cls, value):
+        """
+        Returns:
+            (int) Index of the bucket of a value
+        """
+        if (value <= cls.MIN_VALUE):
+            return 0
+        i = int(math.log(value / cls.MIN_VALUE) * cls._inv_log_base) + 1
+        return min(i, cls.NUM_BUCKETS - 1)
+
+    @classmethod
+    def upper_bound(cls, i):
+        """
+        Returns:
+            (float) Largest value of bucket i
+        """
+        return cls.MIN_VALUE * cls.BASE ** i
+
+    def record(self, value, count=1):
+        """
+        Add count occurrences of a value
+        """
+        data = self.data
+        if (data[self.COUNT] == 0):
+            data[self.MIN] = value
+            data[self.MAX] = value
+        elif (value < data[self.MIN]):
+            data[self.MIN] = value
+        elif (value > data[self.MAX]):
+            data[self.MAX] = value
+        data[self.HEADER + self.bucket(value)] += count
+        data[self.SUM] += value * count
+        data[self.COUNT] += count
+
+    def merge(self, other):
+        """
+        Add the values of another histogram (LatencyHistogram or its array)
+        """
+        other = other.data if isinstance(other, LatencyHistogram) else \
+                np.asarray(other, dtype=np.float64)
+        if (other[self.COUNT] == 0):
+            return self
+        if (self.data[self.COUNT] == 0):
+            self.data[:] = other[:self.SIZE]
+            return self
+        self.data[self.COUNT] += other[self.COUNT]
+        self.data[self.SUM] += other[self.SUM]
+        self.data[self.MIN] = min(self.data[self.MIN], other[self.MIN])
+        self.data[self.MAX] = max(self.data[self.MAX], other[self.MAX])
+        self.data[self.HEADER:] += other[self.HEADER:self.SIZE]
+        return self
+
+    def snapshot(self):
+        """
+        Returns:
+            (LatencyHistogram) A copy, not changed by the next records
+        """
+        copy = LatencyHistogram()
+        copy.data[:] = self.data
+        return copy
+
+    def reset(self):
+        self.data[:] = 0.0
+
+    @property
+    def count(self):
+        return int(self.data[self.COUNT])
+
+    def mean(self):
+        count = self.data[self.COUNT]
+        return self.data[self.SUM] / count if count > 0 else 0.0
+
+    def percentile(self, q):
+        """
+        Args:
+            q (float): Percentile, in [0, 100]
+
+        Returns:
+            (float) Upper bound of the q-th percentile (0 when empty)
+        """
+        count = self.data[self.COUNT]
+        if (count == 0):
+            return 0.0
+        rank = max(1, int(math.ceil(q / 100.0 * count)))
+        i = int(np.searchsorted(np.cumsum(self.data[self.HEADER:]), rank))
+        if (i >= self.NUM_BUCKETS - 1):
+            # The last bucket is unbounded
+            return float(self.data[self.MAX])
+        # Within the exact range of the values
+        return float(min(max(self.upper_bound(i), self.data[self.MIN]),
+                self.data[self.MAX]))
+
+    def percentiles(self):
+        """
+        Returns:
+            (dict) p50, p90, p95, p99 and p999
+        """
+        return {self.percentile_name(q): self.percentile(q)
+                for q in self.PERCENTILES}
+
+    @staticmethod
+    def percentile_name(q):
+        return "p" + f"{q:g}".replace(".", "")
+
+    def report(self):
+        """
+        Returns:
+            (Str) The percentiles in [ms], for the logs
+        """
+        return " ".join(f"{name} {value * 1e3:0.2f}"
+                for (name, value) in self.percentiles().items()) + " ms"
+
+    def summary(self, scale=1.0):
+        """
+        Args:
+            scale (float): Factor of the values, e.g. 1e3 for [ms]
+
+        Returns:
+            (dict) count, mean, min, max and percentiles
+        """
+        if (self.count == 0):
+            return {"count": 0}
+        summary = {"count": self.count, "mean": float(self.mean() * scale),
+                "min": float(self.data[self.MIN] * scale),
+                "max": float(self.data[self.MAX] * scale)}
+        for (name, value) in self.percentiles().items():
+            summary[name] = value * scale
+        return summary
+
+
 class TimeMeas:
     """ 
     This class provides methods to perform timing measurements and extract statistics 
+
+    Besides the running averages, the elapsed times (start/stop) and the
+    periods (tick) are recorded in two LatencyHistogram, for the percentiles.
     """
     clock = time.CLOCK_MONOTONIC
 
     # Initialize the class
-    def __init__(self):
+    # (the histograms can be given, e.g. in shared memory)
+    def __init__(self, elapsed_hist=None, period_hist=None):
         self._start = 0
         self._stop = 0
         self._elapsed = 0
-        self._avg_elapsed = 0
+        self._avg_elapsed = 0.0
         self._max_elapsed = 0
         self._min_elapsed = flt_info.max
         self._cnt_elapsed = int(0)
 
-        self._avg_period = 0
+        self._avg_period = 0.0
         self._max_period = 0
         self._old_t = 0
         self._nTicks = int(0)
 
+        self.elapsed_hist = elapsed_hist or LatencyHistogram()
+        self.period_hist = period_hist or LatencyHistogram()
+
     # Start the timer
     def start(self):
         self._start = time.clock_gettime(self.clock)
@@ -41,6 +230,7 @@ class TimeMeas:
             self._min_elapsed = elapsed
 
         self._cnt_elapsed += 1
+        self.elapsed_hist.record(elapsed)
 
         return elapsed
 
@@ -58,6 +248,7 @@ class TimeMeas:
             self._avg_period = self._avg_period * (M/ (M + 1)) + curr_period / (M + 1)
             if (curr_period > self._max_period):
                 self._max_period = curr_period
+            self.period_hist.record(curr_period)
 
         self._nTicks += 1
         self._old_t = curr_t
@@ -70,9 +261,22 @@ class TimeMeas:
     def getPeriod(self):
         return self._avg_period
 
+    # Percentiles of the elapsed times / of the periods
+    def percentiles(self):
+        return self.elapsed_hist.percentiles()
+
+    def period_percentiles(self):
+        return self.period_hist.percentiles()
+
+    # Copy of the histograms (elapsed, period)
+    def snapshot(self):
+        return (self.elapsed_hist.snapshot(), self.period_hist.snapshot())
+
     # Reset the timer
     def reset(self):
         self._start = 0
         self._nTicks = 0
+        self.elapsed_hist.reset()
+        self.period_hist.reset()
 
     
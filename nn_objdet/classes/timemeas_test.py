@@ -0,0 +1,93 @@
+"""Tests for classes.timemeas."""
+from multiprocessing import Array
+import ctypes
+import time
+import unittest
+
+import numpy as np
+
+from classes.timemeas import LatencyHistogram, TimeMeas
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles_within_precision(self):
+        rng = np.random.RandomState(0)
+        values = rng.exponential(0.01, size=20000)
+        hist = LatencyHistogram()
+        for value in values:
+            hist.record(value)
+
+        self.assertEqual(hist.count, len(values))
+        self.assertAlmostEqual(hist.mean(), values.mean())
+        for q in (50, 90, 99, 99.9):
+            expected = np.percentile(values, q)
+            self.assertLess(abs(hist.percentile(q) - expected) / expected,
+                    2 * LatencyHistogram.PRECISION)
+        self.assertEqual(hist.percentile(100), values.max())
+        self.assertEqual(sorted(hist.percentiles()),
+                ["p50", "p90", "p95", "p99", "p999"])
+
+    def test_out_of_range(self):
+        hist = LatencyHistogram()
+        hist.record(0.0)
+        hist.record(1e6)
+        self.assertLessEqual(hist.percentile(0), LatencyHistogram.MIN_VALUE)
+        self.assertEqual(hist.percentile(100), 1e6)
+
+    def test_merge(self):
+        (a, b, both) = (LatencyHistogram(), LatencyHistogram(), LatencyHistogram())
+        for i in range(1, 101):
+            (a if i % 2 else b).record(i * 1e-3)
+            both.record(i * 1e-3)
+        a.merge(b)
+        np.testing.assert_allclose(a.data, both.data)
+        # Merging an empty histogram keeps min
+        a.merge(LatencyHistogram())
+        self.assertEqual(a.summary()["min"], 1e-3)
+
+    def test_snapshot_and_reset(self):
+        hist = LatencyHistogram()
+        hist.record(0.01)
+        snapshot = hist.snapshot()
+        hist.reset()
+        hist.record(0.02)
+        self.assertEqual(snapshot.count, 1)
+        self.assertAlmostEqual(snapshot.percentile(50), 0.01, delta=1e-4)
+        self.assertEqual(hist.count, 1)
+        self.assertAlmostEqual(hist.percentile(50), 0.02, delta=2e-4)
+        self.assertEqual(LatencyHistogram().summary(), {"count": 0})
+
+    def test_shared_buffer(self):
+        shared = Array(ctypes.c_double, LatencyHistogram.SIZE, lock=False)
+        writer = LatencyHistogram(shared)
+        writer.reset()
+        writer.record(0.005)
+        reader = LatencyHistogram(shared)
+        self.assertEqual(reader.count, 1)
+
+
+class TimeMeasTest(unittest.TestCase):
+
+    def test_start_stop_tick_feed_histograms(self):
+        tm = TimeMeas()
+        for _ in range(5):
+            tm.tick()
+            tm.start()
+            time.sleep(0.002)
+            tm.stop()
+        self.assertEqual(tm.elapsed_hist.count, 5)
+        self.assertEqual(tm.period_hist.count, 4)
+        self.assertGreaterEqual(tm.percentiles()["p50"], 0.002)
+        self.assertGreaterEqual(tm.period_percentiles()["p99"],
+                tm.percentiles()["p50"])
+
+        (elapsed, period) = tm.snapshot()
+        tm.reset()
+        self.assertEqual(tm.elapsed_hist.count, 0)
+        self.assertEqual(elapsed.count, 5)
+        self.assertEqual(period.count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+# @file: tracing.py
+#
+#
+import collections
+import json
+import os
+import time
+
+import numpy as np
+
+
+# Timestamps of a frame trace (monotonic, [s]), in pipeline order
+STAGES = ("read", "enqueued", "dequeued", "inference", "inferred", "sent",
+        "received", "released", "written")
+(READ, ENQUEUED, DEQUEUED, INFERENCE, INFERRED, SENT, RECEIVED, RELEASED,
+        WRITTEN) = range(len(STAGES))
+# Pid of the worker which processed the frame
+WORKER = len(STAGES)
+TRACE_SIZE = WORKER + 1
+
+# Spans of the trace viewer: (name, first stage, last stage)
+SPANS = (
+    ("inflow", READ, ENQUEUED),
+    ("input_q", ENQUEUED, DEQUEUED),
+    ("worker_wait", DEQUEUED, INFERENCE),
+    ("inference", INFERENCE, INFERRED),
+    ("worker_send", INFERRED, SENT),
+    ("processed_q", SENT, RECEIVED),
+    ("reorder", RECEIVED, RELEASED),
+    ("output", RELEASED, WRITTEN),
+)
+
+
+def new_trace(t_read):
+    """
+    Returns:
+        (ndarray) Trace record of a frame read at t_read, the other stages
+        are NaN until stamped
+    """
+    trace = np.full(TRACE_SIZE, np.nan)
+    trace[READ] = t_read
+    return trace
+
+
+def stamp(key, stage, now=None):
+    """
+    Record the time of a stage in the trace of a frame, if it has one
+
+    Args:
+        key (tuple): Key of the frame (stream, index, read time[, trace])
+        stage (int): Index of the stage
+        now (float): Timestamp, default time.monotonic()
+    """
+    if (len(key) > 3):
+        key[3][stage] = time.monotonic() if now is None else now
+
+
+def stamp_worker(key, now=None):
+    """
+    A worker took the frame: dequeue time and pid of the worker
+    """
+    if (len(key) > 3):
+        key[3][DEQUEUED] = time.monotonic() if now is None else now
+        key[3][WORKER] = os.getpid()
+
+
+class FrameTracer:
+    """
+    This class collects the traces of the frames of a stream in the output
+    stage and writes them as a Chrome trace-event JSON file (chrome://tracing,
+    https://ui.perfetto.dev).
+
+    Each frame is an async slice, with one nested span per stage, so that
+    the time waiting in the queues and in the reorder window shows apart
+    from the inference. The inference also appears on the track of the
+    worker that ran it. Only the last max_frames traces are kept.
+    """
+
+    def __init__(self, path, stream=0, max_frames=10000):
+        """
+        Args:
+            path (Str): Path of the JSON file
+            stream (int): Index of the stream
+            max_frames (int): Number of traces kept
+        """
+        self.path = path
+        self.stream = stream
+        # Frames between the output queue and the write
+        self._pending = {}
+        self._last_written = 0
+        self.traces = collections.deque(maxlen=max_frames)
+
+    def received(self, key):
+        """
+        A frame arrived at the output stage
+        """
+        if (len(key) > 3):
+            key[3][RECEIVED] = time.monotonic()
+            self._pending[key[1]] = key[3]
+
+    def released(self, index):
+        """
+        A frame left the reorder window
+        """
+        trace = self._pending.get(index)
+        if (trace is not None):
+            trace[RELEASED] = time.monotonic()
+
+    def written(self, index):
+        """
+        A frame has been written: its trace is complete
+        """
+        # The frames between the previous write and this one were dropped
+        for skipped in range(self._last_written + 1, index):
+            self._pending.pop(skipped, None)
+        self._last_written = index
+
+        trace = self._pending.pop(index, None)
+        if (trace is not None):
+            trace[WRITTEN] = time.monotonic()
+            self.traces.append((index, trace))
+
+    def events(self):
+        """
+        Returns:
+            (list) Trace events of the frames kept
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid,
+            "args": {"name": f"Stream {self.stream}"}}]
+        workers = set()
+        for (index, trace) in self.traces:
+            spans = [(name, trace[first], trace[last])
+                    for (name, first, last) in SPANS
+                    if not (np.isnan(trace[first]) or np.isnan(trace[last]))]
+            if (len(spans) == 0):
+                continue
+
+            # One async slice per frame, the stages nested in it
+            frame_id = f"{self.stream}.{index}"
+            args = {"stream": self.stream, "frame": index}
+            events.append({"name": f"frame {index}", "cat": "frame",
+                "ph": "b", "id": frame_id, "pid": pid, "tid": pid,
+                "ts": trace[READ] * 1e6, "args": args})
+            for (name, t0, t1) in spans:
+                events.append({"name": name, "cat": "frame", "ph": "b",
+                    "id": frame_id, "pid": pid, "tid": pid, "ts": t0 * 1e6,
+                    "args": args})
+                events.append({"name": name, "cat": "frame", "ph": "e",
+                    "id": frame_id, "pid": pid, "tid": pid, "ts": t1 * 1e6})
+            events.append({"name": f"frame {index}", "cat": "frame",
+                "ph": "e", "id": frame_id, "pid": pid, "tid": pid,
+                "ts": max(t1 for (_, _, t1) in spans) * 1e6})
+
+            # Compute time on the track of the worker
+            if (not (np.isnan(trace[WORKER]) or np.isnan(trace[INFERENCE]) or
+                    np.isnan(trace[INFERRED]))):
+                worker = int(trace[WORKER])
+                workers.add(worker)
+                events.append({"name": "inference", "cat": "worker",
+                    "ph": "X", "pid": worker, "tid": worker,
+                    "ts": trace[INFERENCE] * 1e6,
+                    "dur": (trace[INFERRED] - trace[INFERENCE]) * 1e6,
+                    "args": args})
+
+        for worker in sorted(workers):
+            events.append({"name": "process_name", "ph": "M", "pid": worker,
+                "args": {"name": f"NN worker {worker}"}})
+        return events
+
+    def dump(self):
+        """
+        Write the trace file
+
+        Returns:
+            (int) Number of frames written
+        """
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events(),
+                "displayTimeUnit": "ms"}, f)
+        return len(self.traces)
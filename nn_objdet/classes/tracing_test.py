@@ -0,0 +1,91 @@
+"""Tests for classes.tracing."""
+from multiprocessing import Queue
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from classes.tracing import (FrameTracer, new_trace, stamp, stamp_worker,
+        ENQUEUED, INFERENCE, INFERRED, READ, SENT, WORKER)
+
+
+class StampTest(unittest.TestCase):
+
+    def test_untraced_key(self):
+        key = (0, 1, 0.0)
+        stamp(key, ENQUEUED)
+        stamp_worker(key)
+
+    def test_trace_travels_through_queue(self):
+        key = (0, 1, 10.0, new_trace(10.0))
+        stamp(key, ENQUEUED, 11.0)
+        q = Queue()
+        q.put((key, "frame"))
+        (received, _) = q.get(timeout=1)
+        stamp_worker(received, 12.0)
+        self.assertEqual(received[3][READ], 10.0)
+        self.assertEqual(received[3][ENQUEUED], 11.0)
+        self.assertEqual(int(received[3][WORKER]), os.getpid())
+        self.assertTrue(np.isnan(received[3][SENT]))
+
+
+class FrameTracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _key(self, index, worker=True):
+        key = (0, index, 1.0, new_trace(1.0))
+        stamp(key, ENQUEUED, 1.1)
+        if (worker):
+            stamp_worker(key, 1.2)
+            stamp(key, INFERENCE, 1.25)
+            stamp(key, INFERRED, 1.5)
+            stamp(key, SENT, 1.55)
+        return key
+
+    def test_chrome_trace(self):
+        path = os.path.join(self.tmp, "trace.json")
+        tracer = FrameTracer(path)
+        for index in (1, 2):
+            key = self._key(index, worker=(index == 1))
+            tracer.received(key)
+            tracer.released(index)
+            tracer.written(index)
+        self.assertEqual(tracer.dump(), 2)
+
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+        names = [e["name"] for e in events if e["ph"] == "b"]
+        self.assertEqual(names.count("input_q"), 1)
+        self.assertEqual(names.count("reorder"), 2)
+        compute = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(len(compute), 1)
+        self.assertAlmostEqual(compute[0]["dur"], 0.25e6)
+        self.assertEqual(compute[0]["pid"], os.getpid())
+        # Every span begins before it ends
+        begins = {}
+        for e in events:
+            if (e["ph"] == "b"):
+                begins[(e["id"], e["name"])] = e["ts"]
+            elif (e["ph"] == "e"):
+                self.assertLessEqual(begins[(e["id"], e["name"])], e["ts"])
+
+    def test_dropped_frames_forgotten(self):
+        tracer = FrameTracer(os.path.join(self.tmp, "trace.json"), max_frames=2)
+        for index in range(1, 5):
+            tracer.received(self._key(index))
+        tracer.written(1)
+        tracer.written(4)
+        self.assertEqual([index for (index, _) in tracer.traces], [1, 4])
+        self.assertEqual(len(tracer._pending), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
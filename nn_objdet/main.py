@@ -2,144 +2,596 @@
 #
 #
 import argparse
-from multiprocessing import Queue, Pool, Process, Value
+from multiprocessing import Queue, Pool, Process, Value, Array
 from threading import Thread
 import queue
 import cv2
+import numpy as np
 import os, sys
+import time
 import ctypes
-import heapq
+import threading
+import collections
+import json
 
 # My Library
 from classes.nn_objdetector import *
+from classes.backends import BACKENDS
 from classes.timemeas import *
-
-TIME_TO_EXIT = Value(ctypes.c_bool, False)
+from classes.frame_buffer import SharedFrameBuffer
+from classes.renderer import (DetectionRenderer, load_category_index,
+        import_drawing)
+from classes.tiling import TiledInference, parse_grid, parse_roi
+from classes.detection_cache import DetectionCache, content_digest
+from classes.propagation import StrideController, DetectionPropagator
+from classes.motion import MotionGate
+from classes.supervisor import WorkerSupervisor, WorkerStats
+from classes.realtime import *
+from classes.reorder import ReorderBuffer, FRAME_MISSING
+from classes.decoder import FrameDecoder, ParallelDecoder, parse_size
+from classes.detection_writer import DetectionWriter
+from classes.detections import DETECTION_RECORD, to_record, from_record
+from classes.model_cache import SharedGraph
+from classes.affinity import available_cores, partition_cores, pin_to_cores
+from classes.synthetic import SyntheticSource, is_synthetic_source
+from classes.pipeline_stats import StreamStats, QueueSampler, summarize_workers
+from classes.metrics import MetricsServer, PipelineMetrics
+from classes.tracing import (FrameTracer, new_trace, stamp, stamp_worker,
+        ENQUEUED, INFERENCE, INFERRED, SENT)
+from classes.profiler import (start_sampler, stop_sampler, merge_profiles,
+        PROFILE_EXT, MERGED_PROFILE)
+from classes.sentinels import (STOP_WORKER, end_of_stream, get_frames,
+        is_end_of_stream)
+
+# Start time of the application, for the time to first frame
+T_START = 0.0
+
+# Renderer of the output stage (or of each process of the render pool)
+RENDERER = None
+RENDER_FBUF = None
 
 #### WORKING THREAD
-def work(input_q, processed_q, path2fg, path2lab, TIME_TO_EXIT):
+class WorkerConfig:
+    """
+    This class holds the settings of the working processes, the same for all
+    of them (see work())
+    """
+
+    def __init__(self, path2fg=None, path2lab=None, fbufs=None, batch_size=1,
+            batch_wait=0.01, draw=True, render_backend="pil", max_latency=0,
+            rbufs=None, graph=None, warmup=0, warmup_shape=(300, 300, 3),
+            ready=None, threads=(0, 0), cpu_sets=None, tiling=None,
+            cache=None, backend=("tf", None), profile=None):
+        """
+        Args:
+            path2fg (Str): Path to the Frozen Graph file
+            path2lab (Str): Path to the Labels file
+            fbufs (list): Shared frame slots of each stream, when used the
+                queues carry the slot index instead of the frame data
+            batch_size (int): Maximum number of frames in a batch
+            batch_wait (float): Maximum time to wait for a batch to fill [s]
+            draw (Bool): Draw the detections on the frame and send back the
+                frame, otherwise only the Detections are sent back
+            render_backend (Str): Drawing backend ("pil" or "cv2")
+            max_latency (float): Real-time mode: frames read more than
+                max_latency seconds ago are dropped (0 = disabled)
+            rbufs (list): Shared result records of each stream, when used the
+                Detections are written there instead of being pickled
+                (optional)
+            graph (SharedGraph): Serialized graph read by the parent (optional)
+            warmup (int): Number of warm-up inferences
+            warmup_shape (tuple): Shape of the warm-up frame
+            ready (Value): Counter of the ready workers (optional)
+            threads (tuple): (intra-op, inter-op) threads of the session,
+                0 = auto
+            cpu_sets (list): Cores of each worker slot (the row of its stats),
+                for the pinning (optional)
+            tiling (TiledInference): Region of interest and tiles of the
+                frames (optional)
+            cache (DetectionCache): Detections of the frames already processed
+                (optional)
+            backend (tuple): (name, options) of the inference backend
+            profile (tuple): (directory, interval) of the sampling profiler,
+                which runs after the warm-up (optional)
+        """
+        self.path2fg = path2fg
+        self.path2lab = path2lab
+        self.fbufs = fbufs
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.draw = draw
+        self.render_backend = render_backend
+        self.max_latency = max_latency
+        self.rbufs = rbufs
+        self.graph = graph
+        self.warmup = warmup
+        self.warmup_shape = warmup_shape
+        self.ready = ready
+        self.threads = threads
+        self.cpu_sets = cpu_sets
+        self.tiling = tiling
+        self.cache = cache
+        self.backend = backend
+        self.profile = profile
+
+
+def work(input_q, processed_qs, config, stats=None):
     """
     Function for the processing of the frames
 
+    The input frames are tuples ((stream, index, read time[, trace]), frame
+    data), the results are sent to the output queue of their stream (with
+    the worker stages stamped in the trace record, if any). The end of stream
+    messages are forwarded to their stream, the worker exits on STOP_WORKER.
+
+    Up to config.batch_size frames are drained from the input queue, waiting
+    at most config.batch_wait seconds after the first one, and processed with
+    a single session call (one per frame size, when the streams differ).
+
     Args:
         input_q (Queue): Input queue for the input frames
-        processed_q (Queue): Output queue for the processed frames
-        path2fg (Str): Path to the Frozen Graph file
-        path2lab (Str): Path to the Labels file
+        processed_qs (list): Output queues for the processed frames, one per
+            stream
+        config (WorkerConfig): Settings of the worker
+        stats (WorkerStats): Shared load statistics of the worker (optional)
 
     Returns:
         (void)
 
     """
+    (fbufs, rbufs, draw) = (config.fbufs, config.rbufs, config.draw)
+    max_latency = config.max_latency
 
     # Instantiate the Object Detector class
-    nn_od = NN_ObjDetector(path2fg, path2lab)
+    nn_od = start_detector(config, stats.slot() if stats is not None else None)
+    dropped = 0
+    sampler = start_sampler(config.profile, "worker")
+
+    # (with the stats, the histograms of the timer are in shared memory)
+    tm = stats.timemeas() if stats is not None else TimeMeas()
+    stop = False
+    while (not stop):
+        # Blocking until the first frame is available, then fill the batch
+        # until the deadline (the frames received before a STOP_WORKER are
+        # still processed)
+        (frames, stop) = get_frames(input_q, processed_qs, config.batch_size,
+                config.batch_wait)
+        if (len(frames) == 0):
+            continue
+        for frame in frames:
+            stamp_worker(frame[0])
+
+        if (max_latency > 0):
+            # Drop the frames that are too old (the slot is tracked by the
+            # output stage only when it draws the frames)
+            now = time.monotonic()
+            fresh = []
+            for frame in frames:
+                if (now - frame[0][2] > max_latency):
+                    dropped += 1
+                    if (stats is not None):
+                        stats.drop()
+                    if (draw and fbufs is not None):
+                        fbufs[frame[0][0]].release(frame[1])
+                    processed_qs[frame[0][0]].put((frame[0], FRAME_DROPPED))
+                else:
+                    fresh.append(frame)
+            frames = fresh
+            if (len(frames) == 0):
+                continue
 
-    tm = TimeMeas()
-    while (not TIME_TO_EXIT.value):
-        try:
-            frame = input_q.get(block=True, timeout=1) # Blocking until data is available
-        except queue.Empty:
-            if (TIME_TO_EXIT.value):
-                # No more frame to process
-                break
+        # frame[0] is the (stream, index, read time[, trace]) key | frame[1]
+        # is the frame data (or its slot), already RGB
+        frames_rgb = [frame_data(frame, fbufs) for frame in frames]
+
+        # Process the frames, a batch per frame size
+        tm.tick()
+        tm.start()
+        outframes = process_frames(nn_od, frames_rgb, draw)
+        tm.stop()
+        if (stats is not None):
+            stats.record(tm._elapsed, len(frames))
+
+        # Put them in the outqueue
+        for frame, frame_rgb, outframe in zip(frames, frames_rgb, outframes):
+            stream = frame[0][0]
+            stamp(frame[0], INFERENCE, tm._start)
+            stamp(frame[0], INFERRED, tm._stop)
+            stamp(frame[0], SENT)
+            if (draw and fbufs is not None):
+                # The result is drawn in the same slot
+                if (outframe is not frame_rgb):
+                    np.copyto(frame_rgb, outframe)
+                processed_qs[stream].put(frame)
+            elif (draw):
+                processed_qs[stream].put((frame[0], outframe))
             else:
-                # Maybe a delay in the inflow?
-                continue
+                send_detections(processed_qs[stream], frame[0], outframe,
+                        rbufs[stream] if rbufs is not None else None,
+                        frame[1] if fbufs is not None else None)
 
-        if (len(frame) == 2):
-            # frame[0] is the index |  frame[1] is the frame data
-            frame_rgb = cv2.cvtColor(frame[1], cv2.COLOR_BGR2RGB)
+    batch = f" (batch <= {config.batch_size})" if config.batch_size > 1 else ""
+    print(f"NN Process[{os.getpid():4}] | " + 
+            f"Avg Period = {tm.getPeriod():3.6} s " +
+            f"Avg Comp. Time = {tm._avg_elapsed:3.6} s{batch}" +
+            (f" Dropped = {dropped}" if max_latency > 0 else ""))
+    print(f"NN Process[{os.getpid():4}] | " +
+            f"{'Batch ' if batch else ''}Comp. Time {tm.elapsed_hist.report()}")
+    if (config.cache is not None):
+        print(f"NN Process[{os.getpid():4}] | {config.cache.report()}")
+    stop_sampler(sampler)
 
-            # Process the frame
-            tm.tick()
-            tm.start()
-            outframe = nn_od.detect_objects(frame_rgb)
-            tm.stop()
+    nn_od.close_session()
+
+
+def process_frames(nn_od, frames_rgb, draw=True):
+    """
+    Run the detector on some frames, with one call per frame size
+
+    Args:
+        nn_od (NN_ObjDetector): The detector
+        frames_rgb (list): RGB frames
+        draw (Bool): Return the annotated frames, otherwise the Detections
+
+    Returns:
+        (list) Annotated frames or Detections, in the order of the frames
 
-            # Put it in the outqueue
-            processed_q.put((frame[0], outframe))
+    """
+    if (len(frames_rgb) == 1):
+        if (draw):
+            return [nn_od.detect_objects(frames_rgb[0])]
+        return [nn_od.run_inference(frames_rgb[0])]
+
+    groups = collections.defaultdict(list)
+    for i, frame_rgb in enumerate(frames_rgb):
+        groups[frame_rgb.shape].append(i)
+    outframes = [None] * len(frames_rgb)
+    for group in groups.values():
+        if (draw):
+            results = nn_od.detect_objects_batch([frames_rgb[i] for i in group])
         else:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            results = nn_od.run_inference_batch([frames_rgb[i] for i in group])
+        for i, result in zip(group, results):
+            outframes[i] = result
+    return outframes
 
-            tm.start()
-            outframe = nn_od.detect_objects(frame_rgb)
-            tm.stop()
-            tm.tick()
 
-            processed_q.put(outframe)
+def start_detector(config, slot=None):
+    """
+    Create the detector of a worker, warm it up and report the startup time
 
-    print(f"NN Process[{os.getpid():4}] | " + 
-            f"Avg Period = {tm.getPeriod():3.6} s " +
-            f"Avg Comp. Time = {tm._avg_elapsed:3.6} s")
+    With config.cpu_sets, the worker is pinned to the set of cores of its
+    slot and, when the thread counts are automatic, the session uses as many
+    intra-op threads as cores in the set. When the worker draws, the renderer
+    is loaded with the model.
 
-    nn_od.close_session()
+    Args:
+        config (WorkerConfig): Settings of the worker
+        slot (int): Slot of the worker, stable when a worker is replaced
 
+    Returns:
+        nn_od (NN_ObjDetector): The detector
+
+    """
+    (intra_threads, inter_threads) = config.threads
+    cores = None
+    if (config.cpu_sets is not None and slot is not None):
+        cores = config.cpu_sets[slot % len(config.cpu_sets)]
+        pin_to_cores(cores)
+        if (intra_threads <= 0):
+            intra_threads = len(cores)
+        if (inter_threads <= 0):
+            inter_threads = min(2, len(cores))
+
+    t0 = time.monotonic()
+    nn_od = NN_ObjDetector(config.path2fg, config.path2lab,
+            config.render_backend,
+            config.graph.data() if config.graph is not None else None,
+            intra_threads, inter_threads, config.tiling, config.cache,
+            config.backend)
+    if (config.draw):
+        nn_od.get_renderer()
+    t_load = time.monotonic() - t0
+
+    if (config.warmup > 0):
+        nn_od.warmup(config.warmup_shape, config.warmup)
+    t_ready = time.monotonic() - t0
+
+    if (config.ready is not None):
+        with config.ready.get_lock():
+            config.ready.value += 1
+    print(f"NN Process[{os.getpid():4}] | Ready in {t_ready:0.3f} s " +
+            f"(load {t_load:0.3f} s, warm-up {t_ready - t_load:0.3f} s)" +
+            (f" | cores {cores}" if cores is not None else "") +
+            f" | threads {intra_threads}/{inter_threads}")
+
+    return nn_od
+
+
+def send_detections(processed_q, key, detections, rbuf=None, slot=None):
+    """
+    Send the Detections of a frame to the output stage
 
-def data_flow(source, input_q, processed_q):
+    With the shared result records only the index of the record is queued:
+    the record of the frame slot when the frames are in shared memory too,
+    otherwise a free one.
+
+    Args:
+        processed_q (Queue): Output queue of the stream
+        key (tuple): (stream, index, read time[, trace]) key of the frame
+        detections (Detections): Detections of the frame
+        rbuf (SharedFrameBuffer): Shared result records (optional)
+        slot (int): Shared memory slot of the frame (optional)
+    """
+    if (rbuf is None):
+        processed_q.put((key, detections))
+        return
+
+    if (slot is None):
+        slot = rbuf.acquire()
+    to_record(rbuf.view(slot), key[1], detections)
+    processed_q.put((key, slot))
+
+
+def receive_detections(outframe, rbuf, fbuf=None):
+    """
+    Get the Detections sent by send_detections(): read (and free) the
+    shared result record if the output queue carried its index
+    """
+    if (rbuf is None or not isinstance(outframe, int)):
+        return outframe
+
+    (_, detections) = from_record(rbuf.view(outframe))
+    if (fbuf is None):
+        rbuf.release(outframe)
+    return detections
+
+
+def frame_data(frame, fbufs=None):
+    """
+    Get the data of an input frame ((stream, index), frame data or slot)
+    """
+    if (fbufs is not None):
+        return fbufs[frame[0][0]].view(frame[1])
+    return frame[1]
+
+
+def data_flow(stream, source, input_q, processed_q, fbuf=None,
+        output_path="output", credits=0, rbuf=None, stats_buf=None,
+        report_q=None):
     """
     Function for the processing of the data streams 
 
     Args:
-        source (Str): Path to the input file
-        input_q (Queue): Input queue for the input frames
-        processed_q (Queue): Output queue for the processed frames
+        stream (int): Index of the stream
+        source (Str): Path to the input file, device index or URL
+        input_q (Queue): Input queue for the input frames (shared by the
+            streams)
+        processed_q (Queue): Output queue for the processed frames of this
+            stream
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        output_path (Str): Name of the output video file
+        credits (int): Maximum number of frames of this stream in the workers,
+            so that the streams share them fairly (0 = no limit)
+        rbuf (SharedFrameBuffer): Shared result records of this stream
+            (optional)
+        stats_buf (Array): Shared array of the StreamStats of this stream
+            (optional)
+        report_q (Queue): Receives the StreamStats summary of the stream at
+            the end (optional)
 
     Returns:
         (void)
 
     """   
-    vs = cv2.VideoCapture(source)
+    vs = open_capture(source)
  
     if (not vs.isOpened()):
-        print("Problem opening the file!")
+        print(f"Problem opening the source {source}!")
         return
     else:
-        print("Loaded file with " + \
+        print(f"Stream {stream}: loaded {source} with " + \
                 str(int(vs.get(cv2.CAP_PROP_FRAME_COUNT))) + " frames")
 
+    # Input size of the model, the frames are resized by the decode stage
+    model_size = parse_size(args["model_size"])
+
     ## OUTPUT
+    out = None
     if args["output"]:
         fourcc = cv2.VideoWriter_fourcc(*'XVID')
         fps = vs.get(cv2.CAP_PROP_FPS)
         fwidth= int(vs.get(cv2.CAP_PROP_FRAME_WIDTH))
         fheight = int(vs.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out = cv2.VideoWriter(args["output_path"],
+        if (model_size is not None):
+            (fwidth, fheight) = model_size
+        out = cv2.VideoWriter(output_path,
                 fourcc, fps, (fwidth, fheight))
 
 
     # Read the number of frames in the source
+    # (unknown for devices and network streams: the end of stream message
+    # tells the output stage)
     nFrame = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
-    if (nFrame <= 0):
+    if (nFrame <= 0 and not is_live_source(source)):
         print("No frame to process!", file=sys.stderr)
         sys.exit()
 
-    p_in = Thread(target=inflow_thread, args=(input_q, vs))
-    p_out = Thread(target=outflow_thread, args=(True, nFrame, True, processed_q, out))
+    # Frames of this stream allowed in the workers
+    in_flight = None
+    if (credits > 0):
+        in_flight = threading.Semaphore(credits)
+
+    ## DETECTION STRIDE
+    # Only the keyframes go through the detector, the output stage propagates
+    # the detections to the other frames.
+    stride_ctl = None
+    if (args["stride"] > 1 or args["adaptive_stride"]):
+        stride_ctl = StrideController(args["stride"],
+                adaptive=args["adaptive_stride"], source_fps=vs.get(cv2.CAP_PROP_FPS),
+                max_stride=args["max_stride"])
+
+    # Keyframes of a static scene are skipped too
+    motion_gate = None
+    if (args["motion_threshold"] > 0):
+        motion_gate = MotionGate(args["motion_threshold"],
+                args["motion_max_skip"])
+
+    ## RENDERING
+    # When the workers return only the detections, the input frames are kept
+    # here until the output stage draws on them.
+    in_frames = None
+    render_pool = None
+    propagator = None
+    sink = None
+    if (args["render"] != "worker"):
+        in_frames = {}
+        propagator = DetectionPropagator(args["propagation"])
+        if (args["detections_output"]):
+            # Offline mode: the detections are written instead of the frames
+            sink = DetectionWriter(stream_output_path(args["detections_output"],
+                stream, len(args["input_source"])), vs.get(cv2.CAP_PROP_FPS),
+                args["detections_chunk"])
+        elif (args["render"] == "pool"):
+            render_pool = Pool(args["render_workers"], init_renderer,
+                    (args["path2labels"], fbuf, args["render_backend"]))
+        else:
+            init_renderer(args["path2labels"], fbuf, args["render_backend"])
+
+    ## REAL-TIME
+    # The frames older than the latency budget are dropped, the reader hands
+    # the latest frame to a feeder thread instead of blocking on the queue.
+    rt = None
+    mailbox = None
+    p_feed = None
+    pace = 0
+    if (args["realtime"]):
+        rt = RealtimePolicy(args["max_latency"])
+        mailbox = LatestFrameMailbox()
+        p_feed = Thread(target=feed_thread, args=(input_q, mailbox, in_flight))
+        # A file is replayed at its frame rate, like a live source
+        if (not is_live_source(source) and vs.get(cv2.CAP_PROP_FPS) > 0):
+            pace = 1.0 / vs.get(cv2.CAP_PROP_FPS)
+    # The synthetic frames are generated at their frame rate, like a camera
+    if (is_synthetic_source(source) and vs.get(cv2.CAP_PROP_FPS) > 0):
+        pace = 1.0 / vs.get(cv2.CAP_PROP_FPS)
+
+    ## REORDER
+    # The reader waits when it is a whole window ahead of the output
+    gap_timeout = args["gap_timeout"]
+    if (gap_timeout <= 0):
+        gap_timeout = args["max_latency"] if args["realtime"] else None
+    reorder = ReorderBuffer(reorder_capacity(args, vs.get(cv2.CAP_PROP_FPS)),
+            gap_timeout=gap_timeout)
+
+    ## DECODE
+    # The frames leave the decode stage in the model layout (RGB, resized).
+    # A file can be decoded by several processes, on disjoint chunks.
+    if (args["decoders"] > 0 and rt is None and nFrame > 0 and
+            not is_live_source(source)):
+        reader = ParallelDecoder(source, nFrame, args["decoders"],
+                args["decode_chunk"], model_size, fbuf)
+    else:
+        reader = FrameDecoder(vs, model_size)
+
+    ## STATISTICS
+    # Latency of the frames and busy time of the stages (benchmarks)
+    stats = None
+    if (stats_buf is not None):
+        stats = StreamStats(stream, stats_buf)
+
+    # Sampling profiler of the threads of the process
+    sampler = start_sampler(profile_config(args), "data_flow")
+
+    # Trace of the stages of each frame (Chrome trace-event file)
+    tracer = None
+    if (args["trace_output"]):
+        tracer = FrameTracer(stream_output_path(args["trace_output"], stream,
+            len(args["input_source"])), stream, args["trace_frames"])
+
+    # The sink writes only the detections: each entry of in_frames is
+    # released once they are written, and without the shared slots (freed by
+    # the output stage) the reader does not keep the frames at all
+    kept_frames = in_frames
+    if (sink is not None and fbuf is None):
+        kept_frames = None
+
+    p_in = Thread(target=inflow_thread, args=(input_q, reader, fbuf, kept_frames,
+        processed_q, stride_ctl, stream, in_flight, rt, mailbox, pace, reorder,
+        motion_gate, stats, tracer is not None))
+    p_out = Thread(target=outflow_thread, args=(args["display"],
+        out is not None, processed_q, out, fbuf, in_frames, render_pool,
+        propagator, in_flight, rt, reorder, sink, rbuf, stats, tracer))
     
     p_in.start()
     p_out.start()
+    if (p_feed is not None):
+        p_feed.start()
 
     p_in.join()
     print("Inflow thread terminated")
+    if (p_feed is not None):
+        p_feed.join()
     p_out.join()
     print("Outflow thread terminated")
+    if (rt is not None):
+        print(f"Stream {stream} | {rt.report()}")
+    elif (reorder.n_missing > 0):
+        print(f"Stream {stream} | Missing frames = {reorder.n_missing}")
+
+    if (render_pool is not None):
+        render_pool.close()
+        render_pool.join()
+    if (sink is not None):
+        sink.close()
+        print(f"Stream {stream} | Detections of {sink.num_frames} frames " +
+                f"written to {sink.path}")
+    if (report_q is not None):
+        report_q.put(stats.summary())
+    if (tracer is not None):
+        print(f"Stream {stream} | Traces of {tracer.dump()} frames " +
+                f"written to {tracer.path}")
+    stop_sampler(sampler)
    
     print("Terminating Data Flow Process...")
 
     # Cleaning up
+    reader.release()
     vs.release()
     if (out):
         out.release()
 
 
-def inflow_thread(input_q, vs):
+def inflow_thread(input_q, vs, fbuf=None, in_frames=None, processed_q=None,
+        stride_ctl=None, stream=0, in_flight=None, rt=None, mailbox=None,
+        pace=0, reorder=None, motion_gate=None, stats=None, trace=False):
     """
     Function to process the input stream
 
     Args: 
         input_q (Queue): Input queue for the input frames
-        vs (VideoCapture): Object to capture the frames
+        vs (FrameDecoder): Object to capture the frames (in the model layout)
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        in_frames (dict): Frames (or slots) waiting to be rendered by the
+            output stage, keyed by frame index (optional)
+        processed_q (Queue): Output queue, receiving directly the frames
+            skipped by the detector (optional)
+        stride_ctl (StrideController): Selection of the keyframes (optional)
+        stream (int): Index of the stream
+        in_flight (Semaphore): Credits of the stream in the workers (optional)
+        rt (RealtimePolicy): Real-time mode: the reader never waits for a
+            slot and drops the frames instead (optional)
+        mailbox (LatestFrameMailbox): Real-time mode: the frames go to the
+            feeder thread instead of the input queue (optional)
+        pace (float): Minimum period of the reads [s], to replay a file at
+            its frame rate (0 = as fast as possible)
+        reorder (ReorderBuffer): Reorder window of the output stage, the
+            reader waits for room in it (optional)
+        motion_gate (MotionGate): Skips the keyframes of a static scene
+            (optional)
+        stats (StreamStats): Frames read and busy time of the decode stage
+            (optional)
+        trace (Bool): Attach a trace record to the key of each frame
 
     Returns:
         void
@@ -154,15 +606,74 @@ def inflow_thread(input_q, vs):
     
     tm = TimeMeas() 
     tm.start() 
-    while (not TIME_TO_EXIT.value):
+    while (True):
+        if (pace > 0):
+            delay = tm._start + countReadFrame * pace - time.monotonic()
+            if (delay > 0):
+                time.sleep(delay)
+
         # If there is space in the feeding queue 
+        # Wait for the output stage to make room for the next frame
+        if (reorder is not None):
+            reorder.wait_slot(countReadFrame + 1)
+
+        t_decode = time.monotonic()
         (ret, frame) = vs.read()
+        if (stats is not None):
+            stats.add_busy("decode", time.monotonic() - t_decode)
+            if (ret):
+                stats.frame_read()
         if ret:
             tm.tick()  
             # Get the index of the next frame
-            frameindex = int(vs.get(cv2.CAP_PROP_POS_FRAMES))
-            # Add the tuple (index, frame) to the input queue
-            input_q.put((frameindex, frame), block=True, timeout=None) # Blocking insertion
+            # (counted here: the position is not available for live sources)
+            frameindex = countReadFrame + 1
+            # The key of the frame in the pipeline: (stream, index, read time)
+            # and the trace record of the stages
+            key = (stream, frameindex, time.monotonic())
+            if (trace):
+                key += (new_trace(key[2]),)
+            if (fbuf is not None and not vs.in_slots):
+                # Copy the frame in a free slot, only the slot index is queued
+                # (in real-time mode the frame is dropped if there is none)
+                try:
+                    slot = fbuf.acquire(block=(rt is None))
+                    fbuf.write(slot, frame)
+                    frame = slot
+                except queue.Empty:
+                    frame = None
+
+            if (frame is None):
+                rt.count("input")
+                if (stride_ctl is not None):
+                    stride_ctl.dropped()
+                processed_q.put((key, FRAME_DROPPED_INPUT))
+            else:
+                if (in_frames is not None):
+                    in_frames[frameindex] = frame
+                if ((stride_ctl is not None and
+                        not stride_ctl.is_keyframe(frameindex)) or
+                        (motion_gate is not None and not motion_gate.is_keyframe(
+                            frameindex, fbuf.view(frame) if fbuf is not None else frame))):
+                    # Skip the detector, the output stage propagates the detections
+                    processed_q.put((key, None))
+                elif (mailbox is not None):
+                    # Latest frame wins: the frame still waiting is dropped
+                    stamp(key, ENQUEUED)
+                    replaced = mailbox.put((key, frame))
+                    if (replaced is not None):
+                        rt.count("input")
+                        if (stride_ctl is not None):
+                            stride_ctl.dropped()
+                        if (fbuf is not None and in_frames is None):
+                            fbuf.release(replaced[1])
+                        processed_q.put((replaced[0], FRAME_DROPPED_INPUT))
+                else:
+                    if (in_flight is not None):
+                        in_flight.acquire()
+                    stamp(key, ENQUEUED)
+                    # Add the tuple (key, frame) to the input queue
+                    input_q.put((key, frame), block=True, timeout=None) # Blocking insertion
             #print("Input queue = " + str(input_q.qsize()))
 
             countReadFrame = countReadFrame + 1
@@ -170,92 +681,460 @@ def inflow_thread(input_q, vs):
                 print("Reading data started...\n")
                 firstReadFrame = False
         else:
-            print("End of file: " + str(frameindex))
+            print(f"End of stream {stream}: {countReadFrame}")
             break
     tm.stop()
+    if (mailbox is not None):
+        mailbox.close()
+
+    # Behind the frames, through a worker: the output stage waits for
+    # countReadFrame frames
+    input_q.put(end_of_stream(stream, countReadFrame))
     print("Terminating Inflow Thread...")
+    if (stride_ctl is not None):
+        print(f"Detection stride = {stride_ctl.stride}")
+    if (motion_gate is not None):
+        print(motion_gate.report())
 
     in_freq = tm.getfreq()
     print(f"Input processing rate = {in_freq:6.3}" + 
             f" | Ticks = {tm._nTicks:3}" +
             f" in {tm._elapsed:0.3} s")
+    print(f"Input period {tm.period_hist.report()}")
 
 
-def outflow_thread(disp, dim, outen, processed_q, out):
+def feed_thread(input_q, mailbox, in_flight=None):
+    """
+    Function moving the latest frame read to the input queue (real-time mode)
+
+    Args:
+        input_q (Queue): Input queue for the input frames
+        mailbox (LatestFrameMailbox): Latest frame read by the inflow
+        in_flight (Semaphore): Credits of the stream in the workers (optional)
+
+    Returns:
+        void
+
+    """
+    while (True):
+        # The credit first: the frame is taken from the mailbox only when it
+        # can enter the pipeline, so that it is the latest one
+        if (in_flight is not None):
+            in_flight.acquire()
+        item = mailbox.get()
+        if (item is None):
+            if (in_flight is not None):
+                in_flight.release()
+            break
+        input_q.put(item, block=True, timeout=None)
+
+
+def outflow_thread(disp, outen, processed_q, out, fbuf=None,
+        in_frames=None, render_pool=None, propagator=None, in_flight=None,
+        rt=None, reorder=None, sink=None, rbuf=None, stats=None, tracer=None):
     """
     Function to process the input stream
 
     Args: 
         disp (Bool): Flag to activate the visualization
-        dim (int): Length of the output stream
         outen (Bool): Flag to enable the write to file
         processed_q (Queue): Output queue for the output frames
         out: Object to write the frames
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        in_frames (dict): Input frames to render, when the processed queue
+            carries Detections instead of frames (optional)
+        render_pool (Pool): Pool of processes rendering the frames, otherwise
+            the frames are rendered in this thread (optional)
+        propagator (DetectionPropagator): Assigns the detections to the frames
+            skipped by the detector (required with in_frames)
+        in_flight (Semaphore): Credits of the stream in the workers (optional)
+        rt (RealtimePolicy): Real-time mode: stale frames are dropped
+            (optional)
+        reorder (ReorderBuffer): Puts the frames back in order (optional)
+        sink (DetectionWriter): Writes the detections instead of rendering
+            the frames (optional)
+        rbuf (SharedFrameBuffer): Shared result records, read as soon as
+            the results arrive (optional)
+        stats (StreamStats): End-to-end latency of the frames and busy time
+            of the output stage (optional)
+        tracer (FrameTracer): Collects the traces of the frames (optional)
 
     Returns:
         void
     """
-    countWriteFrame = 1
     firstUsedFrame = True
     firstTreatedFrame = True
 
-    output_pq = []
+    if (reorder is None):
+        reorder = ReorderBuffer(1024)
+    # Frames (index, result) being rendered by the pool, in output order
+    rendering = collections.deque()
 
     print("Outflow Thread started!\n")
 
+    # Index following the last frame, from the end of stream message
+    end_index = None
+
     tm = TimeMeas()
     tm.start()
-    while (not TIME_TO_EXIT.value):
+    # Time spent waiting for the processed frames (the busy time is added
+    # to the stats at each round, to be read while the stream runs)
+    t_start = time.monotonic()
+    waited = 0.0
+    while (end_index is None or reorder.next_index < end_index):
+        # Write the frames already rendered by the pool
+        while (len(rendering) > 0 and rendering[0][1].ready()):
+            (index, result) = rendering.popleft()
+            write_rendered_frame(result.get(), fbuf, outen, out, disp)
+            frame_written(tm, index, stats, tracer)
+
         # If there are processed frames, otherwise block
+        # (shortly, if the pool is still rendering: it may hold all the slots,
+        # or until the gap timeout of the frames waiting in the buffer)
+        timeout = None
+        if (len(rendering) > 0):
+            timeout = 0.01
+        elif (reorder.gap_timeout is not None and len(reorder) > 0):
+            timeout = reorder.gap_timeout
+        t_wait = time.monotonic()
         try:
             #print(f"Reading queue: {processed_q.qsize()}")
-            (prior, outframe) = processed_q.get(block=True, timeout=1)
-        except queue.Empty:
-            if ((countWriteFrame <= dim) and (not TIME_TO_EXIT.value)):
+            (key, outframe) = processed_q.get(block=True, timeout=timeout)
+            waited += time.monotonic() - t_wait
+
+            if (is_end_of_stream((key, outframe))):
+                # The frames still in the workers are waited for
+                end_index = key[1]
                 continue
-            else:
-                # No more frames either something got stuck 
-                break
-            
-        # Extract the next element
-        (prior, outframe) = heapq.heappushpop(output_pq, (prior, outframe))
-        if (prior > countWriteFrame):
-            heapq.heappush(output_pq, (prior, outframe))
-            continue
+            if (tracer is not None):
+                tracer.received(key)
+
+            # A frame of this stream left the workers
+            if (in_flight is not None and from_workers(outframe)):
+                in_flight.release()
+
+            if (in_frames is not None):
+                outframe = receive_detections(outframe, rbuf, fbuf)
+
+            # key = (stream, index, read time[, trace])
+            # (in real-time mode the gap timeout counts from the read time)
+            if (not reorder.insert(key[1], outframe,
+                    key[2] if rt is not None else None)):
+                # Late frame, already skipped (and counted) by the gap timeout
+                drop_frame(key[1], outframe, in_frames, fbuf, rt)
+                continue
+            if (rt is not None):
+                rt.arrived(key[1], key[2])
+            if (stats is not None):
+                stats.arrived(key[1], key[2])
+        except queue.Empty:
+            waited += time.monotonic() - t_wait
 
         # Start putting the frames in the output file
-        while (prior == countWriteFrame):
-            tm.tick()
-            output_rgb = cv2.cvtColor(outframe, cv2.COLOR_RGB2BGR)
-            # If it was requested an output file
-            if outen:
-                out.write(output_rgb)
-            # If it was requested video output
-            if (disp):
-                cv2.imshow('frame', output_rgb)
-                key = cv2.waitKey(1) & 0xFF
-
-            countWriteFrame = countWriteFrame + 1
+        for (prior, outframe) in reorder.pop_ready():
+            if (tracer is not None):
+                tracer.released(prior)
+
+            if (outframe is FRAME_MISSING):
+                # Skipped by the gap timeout
+                if (rt is not None):
+                    rt.count("gap")
+                drop_frame(prior, None, in_frames, fbuf, rt)
+            elif (is_dropped(outframe)):
+                drop_frame(prior, None, in_frames, fbuf, rt)
+            elif (in_frames is None):
+                # The frame has been annotated by the worker
+                if (rt is not None and rt.pop_stale(prior)):
+                    rt.count("output")
+                    drop_frame(prior, outframe, in_frames, fbuf, rt)
+                else:
+                    if (fbuf is not None):
+                        # The slot can be reused as soon as the frame is converted
+                        output_rgb = cv2.cvtColor(fbuf.view(outframe), cv2.COLOR_RGB2BGR)
+                        fbuf.release(outframe)
+                    else:
+                        output_rgb = cv2.cvtColor(outframe, cv2.COLOR_RGB2BGR)
+                    write_frame(output_rgb, outen, out, disp)
+                    frame_written(tm, prior, stats, tracer)
+            else:
+                render_frames(propagator.push(prior, outframe), in_frames,
+                        render_pool, rendering, tm, fbuf, outen, out, disp, rt,
+                        sink, stats, tracer)
 
-            try:
-                (prior, outframe) = heapq.heappop(output_pq)
-            except IndexError:
-                break
-
-            if (prior > countWriteFrame):
-                heapq.heappush(output_pq, (prior, outframe))
-            
-        if firstTreatedFrame:
-            print("Retrieving processed data...\n")
-            firstTreatedFrame = False
-
-        if firstUsedFrame:
+            if firstTreatedFrame:
+                print("Retrieving processed data...\n")
+                firstTreatedFrame = False
+
+        if firstUsedFrame and reorder.next_index > 1:
             print("Started\n")
+            print(f"Time to first frame = {time.monotonic() - T_START:0.3f} s")
             firstUsedFrame = False
+
+        if (stats is not None):
+            now = time.monotonic()
+            stats.add_busy("output", now - t_start - waited)
+            (t_start, waited) = (now, 0.0)
                 
+    # Frames still waiting for the detections of a keyframe
+    if (propagator is not None):
+        render_frames(propagator.flush(), in_frames, render_pool, rendering,
+                tm, fbuf, outen, out, disp, rt, sink, stats, tracer)
+
+    # Wait for the frames still in the render pool
+    while (len(rendering) > 0):
+        (index, result) = rendering.popleft()
+        write_rendered_frame(result.get(), fbuf, outen, out, disp)
+        frame_written(tm, index, stats, tracer)
+
+    if (stats is not None):
+        stats.add_busy("output", time.monotonic() - t_start - waited)
+
     print("Terminating Outflow Thread...")   
-    out_freq = tm.getfreq()
+    out_freq = tm.getfreq() or 0.0
     print(f"Output processing rate = {out_freq:3.2} Hz")
+    print(f"Output period {tm.period_hist.report()}")
+
+
+def frame_written(tm, index, stats=None, tracer=None):
+    """
+    Count a frame leaving the output stage
+
+    Args:
+        tm (TimeMeas): Timer of the output stage
+        index (int): Index of the frame
+        stats (StreamStats): Latency of the frames (optional)
+        tracer (FrameTracer): Traces of the frames (optional)
+    """
+    tm.tick()
+    if (stats is not None):
+        stats.written(index)
+    if (tracer is not None):
+        tracer.written(index)
+
+
+def drop_frame(index, outframe, in_frames, fbuf, rt):
+    """
+    Forget a frame that will not be written and free its slot
+
+    Args:
+        index (int): Index of the frame
+        outframe: Frame (or slot) annotated by the worker, if any
+        in_frames (dict): Input frames (or slots) keyed by frame index
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        rt (RealtimePolicy): Real-time policy (optional)
+    """
+    if (in_frames is not None):
+        outframe = in_frames.pop(index, None)
+    if (fbuf is not None and outframe is not None and not is_dropped(outframe)):
+        fbuf.release(outframe)
+    if (rt is not None):
+        rt.forget(index)
+
+
+def render_frames(ready, in_frames, render_pool, rendering, tm, fbuf, outen,
+        out, disp, rt=None, sink=None, stats=None, tracer=None):
+    """
+    Render the frames with their detections and write them, in order
+
+    Args:
+        ready (list): Tuples (index, Detections) of the frames to render
+        in_frames (dict): Input frames (or slots) keyed by frame index
+        render_pool (Pool): Pool of processes rendering the frames (optional)
+        rendering (deque): Frames (index, result) being rendered by the pool
+        tm (TimeMeas): Timer of the output stage
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        outen (Bool): Flag to enable the write to file
+        out: Object to write the frames
+        disp (Bool): Flag to activate the visualization
+        rt (RealtimePolicy): Real-time mode: the stale frames are dropped
+            (optional)
+        sink (DetectionWriter): Writes the detections, the frames are not
+            rendered (optional)
+        stats (StreamStats): Latency of the frames (optional)
+        tracer (FrameTracer): Traces of the frames (optional)
+    """
+    for (index, detections) in ready:
+        if (rt is not None and rt.pop_stale(index)):
+            rt.count("output")
+            drop_frame(index, None, in_frames, fbuf, rt)
+        elif (sink is not None):
+            sink.append(index, detections)
+            drop_frame(index, None, in_frames, fbuf, rt)
+            frame_written(tm, index, stats, tracer)
+        elif (render_pool is not None):
+            # Render asynchronously, the results are kept in order
+            rendering.append((index, render_pool.apply_async(render_frame,
+                (in_frames.pop(index), detections))))
+        else:
+            rendered = render_frame(in_frames.pop(index), detections)
+            write_rendered_frame(rendered, fbuf, outen, out, disp)
+            frame_written(tm, index, stats, tracer)
+
+
+def write_frame(frame, outen, out, disp):
+    """
+    Write a BGR frame to the output file and/or to the display
+
+    Args:
+        frame (ndarray): BGR frame
+        outen (Bool): Flag to enable the write to file
+        out: Object to write the frames
+        disp (Bool): Flag to activate the visualization
+    """
+    # If it was requested an output file
+    if outen:
+        out.write(frame)
+    # If it was requested video output
+    if (disp):
+        cv2.imshow('frame', frame)
+        key = cv2.waitKey(1) & 0xFF
+
+
+def write_rendered_frame(rendered, fbuf, outen, out, disp):
+    """
+    Write a frame returned by render_frame() and free its slot
+    """
+    if (fbuf is not None):
+        write_frame(cv2.cvtColor(fbuf.view(rendered), cv2.COLOR_RGB2BGR),
+                outen, out, disp)
+        fbuf.release(rendered)
+    else:
+        write_frame(cv2.cvtColor(rendered, cv2.COLOR_RGB2BGR), outen, out, disp)
+
+
+#### RENDERING
+def init_renderer(path2lab, fbuf=None, backend="pil"):
+    """
+    Load the label map and create the renderer of this process
+
+    Args:
+        path2lab (Str): Path to the Labels file
+        fbuf (SharedFrameBuffer): Shared frame slots (optional)
+        backend (Str): Drawing backend ("pil" or "cv2")
+    """
+    global RENDERER, RENDER_FBUF
+    RENDERER = DetectionRenderer(load_category_index(path2lab), backend=backend)
+    RENDER_FBUF = fbuf
+
+
+def render_frame(frame, detections):
+    """
+    Draw the detections on an input frame
+
+    Args:
+        frame: RGB frame, or its slot when the shared frame buffer is used
+        detections (Detections): Detection results of the frame
+
+    Returns:
+        The RGB annotated frame, or its slot (annotated in place)
+
+    """
+    if (RENDER_FBUF is not None):
+        RENDERER.render(RENDER_FBUF.view(frame), detections)
+        return frame
+    return RENDERER.render(frame, detections)
+
+
+def open_source(source):
+    """
+    Convert the name of a device ("0", "1", ...) to the index expected by
+    cv2.VideoCapture, the other sources (files, URLs) are left as they are
+    """
+    if (source.isdigit()):
+        return int(source)
+    return source
+
+
+def open_capture(source):
+    """
+    Open a source: a cv2.VideoCapture, or a SyntheticSource for the
+    "synthetic:WIDTHxHEIGHT[@FPS][:FRAMES]" sources
+    """
+    if (is_synthetic_source(source)):
+        return SyntheticSource.from_source(source)
+    return cv2.VideoCapture(open_source(source))
+
+
+def is_live_source(source):
+    """
+    Check whether the source is a device or a network stream, whose length is
+    not known in advance (the synthetic sources generate the frames at their
+    own rate, like a camera)
+    """
+    return (source.isdigit() or "://" in source or is_synthetic_source(source))
+
+
+def profile_config(args):
+    """
+    Returns:
+        (tuple) (directory, interval [s]) of the sampling profiler of the
+        processes, None when not profiling
+    """
+    if (not args["profile"]):
+        return None
+    return (args["profile"], args["profile_interval"] / 1e3)
+
+
+def merge_run_profiles(directory, since):
+    """
+    Merge the profiles written by the processes of this run into one
+    collapsed-stack file (flamegraph.pl, speedscope)
+
+    Args:
+        directory (Str): Profile directory
+        since (float): Start of the run (time.time()), the profiles of the
+            previous runs are older
+    """
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if (name.endswith(PROFILE_EXT) and name != MERGED_PROFILE and
+                os.path.getmtime(path) >= since):
+            paths.append(path)
+    output = os.path.join(directory, MERGED_PROFILE)
+    stacks = merge_profiles(paths, output)
+    print(f"Profiles of {len(paths)} processes merged in {output} " +
+            f"({stacks} stacks)")
+
+
+def stream_output_path(output_path, stream, num_streams):
+    """
+    Name of the output video of a stream: with several streams the index of
+    the stream is appended to the name
+    """
+    if (num_streams <= 1):
+        return output_path
+    (root, ext) = os.path.splitext(output_path)
+    return f"{root}_{stream}{ext}"
+
+
+def stride_enabled(args):
+    """
+    Check whether some frames skip the detector (detection stride or motion
+    gate)
+    """
+    return (args["stride"] > 1 or args["adaptive_stride"] or
+            args["motion_threshold"] > 0)
+
+
+def max_skipped(args):
+    """
+    Returns:
+        (int) Maximum number of consecutive frames skipping the detector
+    """
+    skipped = args["max_stride"]
+    if (args["motion_threshold"] > 0):
+        skipped += args["motion_max_skip"]
+    return skipped
+
+
+def max_num_workers(args):
+    """
+    Returns:
+        (int) Maximum number of working processes running at the same time:
+        the workers started, or the limit of the autoscaling
+    """
+    return args["max_workers"] if args["autoscale"] else args["num_workers"]
 
 
 #### START
@@ -263,46 +1142,453 @@ def start(args):
     """
     Start the application
     """
+    global T_START
+    T_START = time.monotonic()
 
     ## INIT
     # Set the multiprocessing logger to debug if required
     if args["logger_debug"]:
         logger = multiprocessing.log_to_stderr()
         logger.setLevel(multiprocessing.SUBDEBUG)
+
+    # The drawing modules are imported once, before the processes are forked
+    # (not needed when only the detections are written)
+    if (not args["detections_output"]):
+        import_drawing()
+
+    # Directory of the profiles (those of this run are merged at the end)
+    t_profile = time.time()
+    if (args["profile"]):
+        os.makedirs(args["profile"], exist_ok=True)
     
+    sources = args["input_source"]
+    num_streams = len(sources)
+
+    # Size of the frames of each source, for the shared frame slots and the
+    # warm-up (None for the devices and the network streams)
+    shapes = [probe_frame_shape(source, args) for source in sources]
+    for (source, shape) in zip(sources, shapes):
+        if (shape is None and not is_live_source(source)):
+            print(f"Problem opening the source {source}!")
+            return
+        if (shape is None and args["transport"] == "shm"):
+            print(f"Unknown frame size of the source {source}: set the " +
+                    "model size (-ms) to use the shared frame buffer")
+            return
+
     ## DATA STRUCTURES
     # Define the shared data structures (Input Queues)
+    # The input queue is shared by the streams, each stream has its own
+    # output queue.
     input_q = Queue(maxsize=args["queue_size"])
-    processed_q = Queue(maxsize=args["queue_size"])
+    processed_qs = [Queue(maxsize=args["queue_size"]) for _ in sources]
+
+    # Statistics of the streams (counters and latency of the frames) in
+    # shared memory, for the run report and for the metrics endpoint
+    measure = bool(args["stats_output"]) or args["metrics_port"] > 0
+    stats_bufs = None
+    queues = {"input": (input_q, args["queue_size"])}
+    for (stream, processed_q) in enumerate(processed_qs):
+        queues[f"processed_{stream}"] = (processed_q, args["queue_size"])
+    if (measure):
+        stats_bufs = [Array(ctypes.c_double, StreamStats.SIZE, lock=False)
+                for _ in sources]
+
+    # Run report (benchmarks): the data flows send the summary of their
+    # stream, the depth of the queues is sampled here
+    report_q = None
+    sampler = None
+    if (args["stats_output"]):
+        report_q = Queue()
+        sampler = QueueSampler(queues)
 
     path_to_graph = args["path2graph"]
     path_to_labels = args["path2labels"]
 
-    ## INPUT PROCESS
-    source = args["input_source"]
-    print("Source = " + source + "\n")
-
-    data_process = Process(target=data_flow, args=(source, input_q, processed_q))
-    data_process.start()
+    # Offline mode: only the detections are written, the frames are neither
+    # rendered nor encoded
+    if (args["detections_output"]):
+        print(f"Detections written to {args['detections_output']}: " +
+                "no video output")
+        args["render"] = "output"
+        args["output"] = 0
+        args["display"] = 0
+
+    # The detections of the skipped frames are drawn by the output stage
+    if (stride_enabled(args) and args["render"] == "worker"):
+        print("Detection stride: rendering moved to the output stage")
+        args["render"] = "output"
+
+    ## INPUT PROCESSES
+    # Shared frame slots: only the slot indices travel through the queues
+    fbufs = None
+    if (args["transport"] == "shm"):
+        fbufs = [create_frame_buffer(shape, args) for shape in shapes]
+
+    # Shared result records: only the record indices travel back, with the
+    # frames in shared memory the record of a frame is the one of its slot
+    # (otherwise enough records for both queues and the running workers)
+    rbufs = None
+    if (args["results"] == "shm" and args["render"] != "worker"):
+        rbufs = [SharedFrameBuffer(fbuf.num_slots if fbufs is not None else
+            2 * args["queue_size"] + 2 * max_num_workers(args), (),
+            DETECTION_RECORD)
+            for fbuf in (fbufs if fbufs is not None else sources)]
+
+    # With several streams each one gets an equal share of the frames that
+    # can wait in the input queue and in the workers
+    credits = args["stream_credits"]
+    if (credits <= 0 and args["realtime"]):
+        # Real-time: no frame waits in the input queue, the latest one waits
+        # in the mailbox of the stream until a worker is free
+        credits = max(1, args["num_workers"] // num_streams)
+    elif (credits <= 0 and num_streams > 1):
+        credits = max(1, (args["queue_size"] + args["num_workers"]) // num_streams)
+
+    data_processes = []
+    for stream, source in enumerate(sources):
+        print(f"Source {stream} = {source}\n")
+        data_process = Process(target=data_flow,
+                args=(stream, source, input_q, processed_qs[stream],
+                    fbufs[stream] if fbufs is not None else None,
+                    stream_output_path(args["output_path"], stream, num_streams),
+                    credits, rbufs[stream] if rbufs is not None else None,
+                    stats_bufs[stream] if stats_bufs is not None else None,
+                    report_q))
+        data_process.start()
+        data_processes.append(data_process)
+    if (sampler is not None):
+        sampler.start()
     
     ## WORKING PROCESSES
-    # Creates the a pool of working processes
-    pool = Pool(args["num_workers"], work, \
-            (input_q, processed_q, path_to_graph, path_to_labels, TIME_TO_EXIT))
-
+    draw = (args["render"] == "worker")
+
+    # Inference runtime of the workers: (name, options)
+    backend = (args["backend"], {"config": args["backend_config"],
+        "input_size": args["backend_size"], "compute_time": args["fake_time"]})
+    print(f"Backend: {args['backend']}")
+
+    # The graph is read once here, the workers parse it from shared memory
+    # and warm up on a frame of the size of the first source (if known)
+    graph = None
+    if (BACKENDS[args["backend"]].needs_model):
+        graph = SharedGraph(path_to_graph)
+    warmup_shape = shapes[0] if shapes[0] is not None else (300, 300, 3)
+    ready = Value(ctypes.c_int, 0)
+
+    # Each worker gets its own set of cores, so that the session thread
+    # pools of the workers do not oversubscribe the machine
+    threads = (args["intra_threads"], args["inter_threads"])
+    cpu_sets = None
+    if (args["pin_workers"]):
+        cpu_sets = partition_cores(max_num_workers(args))
+        print(f"Worker cores: {cpu_sets}")
+    else:
+        # Not pinned: the automatic thread counts are the share of the cores
+        # of each worker (instead of the whole machine per session)
+        share = max(1, len(available_cores()) // max_num_workers(args))
+        threads = (threads[0] if threads[0] > 0 else share,
+                threads[1] if threads[1] > 0 else min(2, share))
+
+    # Region of interest / tiles of the high resolution frames
+    tiling = None
+    roi = parse_roi(args["roi"])
+    grid = parse_grid(args["tiles"])
+    if (roi is not None or grid is not None):
+        tiling = TiledInference(grid or (1, 1), args["tile_overlap"], roi,
+                args["tile_iou"])
+        print(f"Tiling: {tiling.num_tiles} tile(s), overlap {args['tile_overlap']}" +
+                (f", roi {args['roi']}" if roi is not None else ""))
+
+    # On-disk cache of the detections, one namespace per graph (and backend
+    # and tiling)
+    cache = None
+    if (args["cache_dir"]):
+        options = f"{backend}|{args['roi']}|{args['tiles']}|" + \
+                f"{args['tile_overlap']}|{args['tile_iou']}"
+        cache = DetectionCache(args["cache_dir"],
+                content_digest(graph.data() if graph is not None else b"",
+                    options.encode()),
+                args["cache_size"] << 20)
+        print(f"Detection cache: {cache.path}")
+
+    # Settings of the working processes
+    config = WorkerConfig(path_to_graph, path_to_labels, fbufs,
+            batch_size=args["batch_size"], batch_wait=args["batch_wait"],
+            draw=draw, render_backend=args["render_backend"],
+            max_latency=args["max_latency"] if args["realtime"] else 0,
+            rbufs=rbufs, graph=graph, warmup=args["warmup"],
+            warmup_shape=warmup_shape, ready=ready, threads=threads,
+            cpu_sets=cpu_sets, tiling=tiling, cache=cache, backend=backend,
+            profile=profile_config(args))
+
+    def make_args(stats=None):
+        # Arguments of the working processes
+        return (input_q, processed_qs, config, stats)
+
+    pool = None
+    supervisor = None
+    if (args["autoscale"]):
+        # The number of working processes follows the load
+        supervisor = WorkerSupervisor(work, make_args, input_q, processed_qs,
+                args["queue_size"], min_workers=args["min_workers"],
+                max_workers=args["max_workers"])
+        supervisor.start(args["num_workers"])
+    else:
+        # Creates the a pool of working processes
+        # (each worker claims a row of the stats table, for the pool report)
+        (stats_array, hist_array) = WorkerStats.allocate(args["num_workers"])
+        stats = WorkerStats(stats_array, rows=Value(ctypes.c_int, 0),
+                hists=hist_array)
+        pool = Pool(args["num_workers"], work, make_args(stats))
+
+    def worker_stats(retired=False):
+        # Stats of the running workers (and of the retired ones)
+        if (supervisor is not None):
+            return supervisor.worker_stats(retired)
+        return [WorkerStats(stats_array, row, hists=hist_array)
+                for row in range(args["num_workers"])]
+
+    ## METRICS
+    # Prometheus endpoint on the local host, read from the shared counters
+    metrics_server = None
+    if (args["metrics_port"] > 0):
+        metrics = PipelineMetrics(queues, [StreamStats(stream, buf)
+            for (stream, buf) in enumerate(stats_bufs)], worker_stats)
+        metrics_server = MetricsServer(metrics.collect, args["metrics_port"])
+        metrics_server.start()
+        print(f"Metrics on http://127.0.0.1:{metrics_server.port}/metrics")
+
+    # Wait for the workers to load the graph and warm up (the data flow
+    # is already reading the sources)
+    num_workers = supervisor.num_workers() if supervisor is not None else args["num_workers"]
+    while (ready.value < num_workers and
+            any(p.is_alive() for p in data_processes)):
+        time.sleep(0.01)
+    print(f"Workers ready: {ready.value} in {time.monotonic() - T_START:0.3f} s")
      
     ### MAIN LOOP
-    data_process.join()
+    stream_reports = []
+    if (sampler is not None):
+        # The reports are read before the joins: a data flow exits only once
+        # its report is through the queue
+        while (len(stream_reports) < len(data_processes)):
+            try:
+                stream_reports.append(report_q.get(timeout=0.1))
+            except queue.Empty:
+                # A data flow may end without a report (source not opened)
+                if (not any(p.is_alive() for p in data_processes) and
+                        report_q.empty()):
+                    break
+
+    for data_process in data_processes:
+        data_process.join()
+
+    if (sampler is not None):
+        # All the frames are written: the workers are idle from here
+        sampler.stop()
+        write_run_report(args["stats_output"], args, stream_reports,
+                sampler.summary(), worker_stats(retired=True))
+
+    # The streams are over (and their frames written): one STOP_WORKER per
+    # worker, behind the last end of stream message
+    t_stop = time.monotonic()
+    if (supervisor is not None):
+        supervisor.stop()
+    else:
+        for _ in range(args["num_workers"]):
+            input_q.put(STOP_WORKER)
+        pool.close()
+        pool.join()
+    print(f"Workers stopped in {time.monotonic() - t_stop:0.3f} s")
 
-    TIME_TO_EXIT.value = True
+    # Aggregate of the stats published by the workers
+    print_pool_report(summarize_workers(worker_stats(retired=True)))
 
-    pool.close()
-    pool.join()
+    if (args["profile"]):
+        merge_run_profiles(args["profile"], t_profile)
+
+    if (metrics_server is not None):
+        metrics_server.stop()
 
      ## TERMINATE
     print("Terminating Main...\n")
 
-    cv2.destroyAllWindows()
+    if (args["display"]):
+        cv2.destroyAllWindows()
+
+    if (graph is not None):
+        graph.close()
+
+    if (fbufs is not None):
+        for fbuf in fbufs:
+            fbuf.close()
+    if (rbufs is not None):
+        for rbuf in rbufs:
+            rbuf.close()
+
+
+def print_pool_report(pool):
+    """
+    Print the aggregate statistics of the workers
+
+    Args:
+        pool (dict): summarize_workers() of the workers
+    """
+    if (pool["workers"] == 0):
+        return
+    for w in pool["per_worker"]:
+        comp = w.get("comp_time_ms", {})
+        print(f"Pool | Worker[{w['pid']:4}] {w['frames']:6} frames " +
+                f"{w['fps']:7.1f} FPS | busy {w['busy_s']:0.3f} s " +
+                f"({w['utilization']:4.0%}) | Comp. Time mean " +
+                f"{comp.get('mean', 0.0):0.2f} max {comp.get('max', 0.0):0.2f} ms")
+    comp = pool["comp_time_ms"]
+    print(f"Pool | {pool['workers']} workers {pool['frames']} frames " +
+            f"in {pool['duration_s']:0.3f} s = {pool['throughput_fps']:0.1f} FPS" +
+            (f", dropped {pool['dropped']}" if pool["dropped"] > 0 else ""))
+    print("Pool | Load imbalance (max / mean): frames " +
+            f"{pool['imbalance']['frames']:0.2f}, busy time " +
+            f"{pool['imbalance']['busy']:0.2f}")
+    print("Pool | Comp. Time " + " ".join(f"{name} {comp[name]:0.2f}"
+            for name in comp if name.startswith("p")) + " ms")
+
+
+def write_run_report(path, args, stream_reports, queue_report, workers):
+    """
+    Write the machine readable report of a run (JSON)
+
+    Args:
+        path (Str): Path of the report
+        args (dict): Application arguments
+        stream_reports (list): StreamStats summaries of the streams
+        queue_report (dict): QueueSampler summary
+        workers (list): WorkerStats of the workers
+    """
+    stream_reports = sorted(stream_reports, key=lambda r: r["stream"])
+    starts = [r["t_first"] for r in stream_reports if r["t_first"] is not None]
+    ends = [r["t_last"] for r in stream_reports if r["t_last"] is not None]
+    duration = max(ends) - min(starts) if (starts and ends) else 0.0
+
+    latency = LatencyHistogram()
+    for r in stream_reports:
+        latency.merge(r.pop("latency_hist"))
+        del r["t_first"], r["t_last"]
+    frames = sum(r["frames"] for r in stream_reports)
+
+    # (the utilization of the workers over the duration of the streams)
+    pool = summarize_workers(workers, duration)
+    worker_reports = pool.pop("per_worker")
+
+    report = {
+        "config": {key: args[key] for key in ("input_source", "num_workers",
+            "queue_size", "transport", "batch_size", "render", "results",
+            "backend", "fake_time", "autoscale")},
+        "frames": frames,
+        "dropped": sum(r["dropped"] for r in stream_reports),
+        "duration_s": duration,
+        "throughput_fps": frames / duration if duration > 0 else 0.0,
+        "latency_ms": latency.summary(1e3),
+        "queues": queue_report,
+        "utilization": {
+            "decode": [r["utilization"].get("decode", 0.0) for r in stream_reports],
+            "output": [r["utilization"].get("output", 0.0) for r in stream_reports],
+            "workers": [w["utilization"] for w in worker_reports],
+        },
+        "pool": pool,
+        "workers": worker_reports,
+        "streams": stream_reports,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Run report written to {path}: {frames} frames, " +
+            f"{report['throughput_fps']:0.1f} FPS, p99 latency " +
+            f"{report['latency_ms'].get('p99', 0.0):0.1f} ms")
+
+
+def create_frame_buffer(shape, args):
+    """
+    Allocate the shared frame slots for a source
+
+    Args:
+        shape (tuple): (height, width, 3) of the frames of the source
+        args (dict): Application arguments
+
+    Returns:
+        fbuf (SharedFrameBuffer): The frame buffer
+
+    """
+    (fheight, fwidth, _) = shape
+
+    # Enough slots for the frames in both queues and in the workers
+    # (and for the skipped frames waiting for the next keyframe)
+    num_slots = args["num_slots"]
+    if (num_slots <= 0):
+        num_slots = 2 * args["queue_size"] + 2 * max_num_workers(args)
+        if (stride_enabled(args)):
+            num_slots += max_skipped(args)
+        if (args["decoders"] > 0 and not args["realtime"]):
+            # The chunks decoded ahead
+            num_slots += args["decoders"] * (args["decode_chunk"] + 1)
+
+    print(f"Shared frame buffer: {num_slots} slots of {fwidth}x{fheight}")
+    return SharedFrameBuffer(num_slots, (fheight, fwidth, 3))
+
+
+def probe_frame_shape(source, args):
+    """
+    Shape of the frames of a source in the pipeline
+
+    Args:
+        source (Str): Path to the input file, device index or URL
+        args (dict): Application arguments
+
+    Returns:
+        (tuple) (height, width, 3), None if the source cannot be opened or
+        if it is a device or a network stream (only its reader opens it)
+
+    """
+    # Probe the source to get the size of the frames
+    # (unless the decode stage resizes them to the model input)
+    if (args["model_size"]):
+        (fwidth, fheight) = parse_size(args["model_size"])
+    elif (is_live_source(source) and not is_synthetic_source(source)):
+        return None
+    else:
+        vs = open_capture(source)
+        fwidth = int(vs.get(cv2.CAP_PROP_FRAME_WIDTH))
+        fheight = int(vs.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        vs.release()
+
+    if (fwidth <= 0 or fheight <= 0):
+        return None
+    return (fheight, fwidth, 3)
+
+
+def reorder_capacity(args, fps=0):
+    """
+    Size of the reorder window of a stream
+
+    Args:
+        args (dict): Application arguments
+        fps (float): Frame rate of the source
+
+    Returns:
+        (int) Number of frames the reader can be ahead of the output
+
+    """
+    capacity = args["reorder_capacity"]
+    if (capacity <= 0):
+        # All the frames in the queues and in the workers, the frames waiting
+        # for the next keyframe and, in real-time mode, the frames read while
+        # the output waits for a missing one
+        capacity = 2 * args["queue_size"] + 2 * max_num_workers(args)
+        if (stride_enabled(args)):
+            capacity += max_skipped(args)
+        if (args["realtime"]):
+            capacity += int(np.ceil(max(fps, 30) * args["max_latency"]))
+
+    return capacity
 
 
 if __name__ == '__main__':
@@ -318,12 +1604,116 @@ if __name__ == '__main__':
             help="Whether or not modified videos shall be writen")
     ap.add_argument("-op", "--output-path", type=str, default="output",
             help="Name of the output video file")
-    ap.add_argument("-i", "--input-source", type=str, default="",
-            help="Path to videos input, overwrite device input if used")
+    ap.add_argument("-i", "--input-source", type=str, nargs="+", default=[""],
+            help="Paths to videos input, device indices, stream URLs or " +
+            "synthetic:WIDTHxHEIGHT[@FPS][:FRAMES] sources " +
+            "(one stream each, sharing the workers)")
+    ap.add_argument('-sc', '--stream-credits', dest='stream_credits', type=int,
+            default=0, help='Maximum frames of a stream in the workers ' +
+            '(0 = fair share with several streams)')
     ap.add_argument('-w', '--num-workers', dest='num_workers', type=int,
             default=2, help='Number of workers.')
+    ap.add_argument('-as', '--autoscale', dest='autoscale', type=int,
+            default=0, help='Spawn/retire workers following the load')
+    ap.add_argument('-wmin', '--min-workers', dest='min_workers', type=int,
+            default=1, help='Minimum number of workers (autoscale)')
+    ap.add_argument('-wmax', '--max-workers', dest='max_workers', type=int,
+            default=4, help='Maximum number of workers (autoscale)')
     ap.add_argument('-q-size', '--queue-size', dest='queue_size', type=int,
             default=5, help='Size of the queue.')
+    ap.add_argument('-t', '--transport', dest='transport', type=str,
+            default="queue", choices=["queue", "shm"],
+            help='Frame transport: pickled through the queues or shared memory slots')
+    ap.add_argument('-ns', '--num-slots', dest='num_slots', type=int,
+            default=0, help='Number of shared memory frame slots (0 = auto)')
+    ap.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+            default=1, help='Maximum number of frames per session call')
+    ap.add_argument('-bw', '--batch-wait', dest='batch_wait', type=float,
+            default=0.01, help='Maximum time to wait for a batch to fill [s]')
+    ap.add_argument('-r', '--render', dest='render', type=str,
+            default="worker", choices=["worker", "output", "pool"],
+            help='Where the detections are drawn: in the NN workers, in the output ' +
+            'stage or in a dedicated render pool')
+    ap.add_argument('-rb', '--render-backend', dest='render_backend', type=str,
+            default="pil", choices=["pil", "cv2"],
+            help='Drawing of the boxes: PIL, or OpenCV in place on the frame')
+    ap.add_argument('-rw', '--render-workers', dest='render_workers', type=int,
+            default=2, help='Number of processes of the render pool')
+    ap.add_argument('-k', '--stride', dest='stride', type=int,
+            default=1, help='Run the detector on one frame every k')
+    ap.add_argument('-ak', '--adaptive-stride', dest='adaptive_stride', type=int,
+            default=0, help='Adapt the stride to keep up with the source FPS')
+    ap.add_argument('-mk', '--max-stride', dest='max_stride', type=int,
+            default=8, help='Maximum adaptive stride')
+    ap.add_argument('-pm', '--propagation', dest='propagation', type=str,
+            default="reuse", choices=["reuse", "interpolate"],
+            help='Detections of the skipped frames: last keyframe or interpolated')
+    ap.add_argument('-rt', '--realtime', dest='realtime', type=int,
+            default=0, help='Real-time mode: latest frame wins, stale frames are dropped')
+    ap.add_argument('-ml', '--max-latency', dest='max_latency', type=float,
+            default=0.5, help='Latency budget of the real-time mode [s]')
+    ap.add_argument('-rc', '--reorder-capacity', dest='reorder_capacity', type=int,
+            default=0, help='Frames the reader can be ahead of the output (0 = auto)')
+    ap.add_argument('-gt', '--gap-timeout', dest='gap_timeout', type=float,
+            default=0, help='Wait for a missing frame before skipping it [s] (0 = forever, max-latency in real-time mode)')
+    ap.add_argument('-dp', '--decoders', dest='decoders', type=int,
+            default=0, help='Decoder processes, on disjoint chunks of a file (0 = decode in the data flow)')
+    ap.add_argument('-dc', '--decode-chunk', dest='decode_chunk', type=int,
+            default=32, help='Frames decoded by a decoder process after each seek')
+    ap.add_argument('-ms', '--model-size', dest='model_size', type=str,
+            default='', help='Resize the frames to the model input WIDTHxHEIGHT in the decode stage')
+    ap.add_argument('-do', '--detections-output', dest='detections_output', type=str,
+            default='', help='Write the detections to this columnar file (.npz) instead of the video')
+    ap.add_argument('-dch', '--detections-chunk', dest='detections_chunk', type=int,
+            default=1024, help='Frames of detections written at once')
+    ap.add_argument('-rs', '--results', dest='results', type=str,
+            default='queue', choices=['queue', 'shm'],
+            help='Detections transport (when the workers do not draw): "queue" (pickled) or "shm" (shared records)')
+    ap.add_argument('-wu', '--warmup', dest='warmup', type=int,
+            default=1, help='Warm-up inferences of each worker before processing the frames')
+    ap.add_argument('-it', '--intra-threads', dest='intra_threads', type=int,
+            default=0, help='Intra-op threads of each worker session (0 = auto)')
+    ap.add_argument('-et', '--inter-threads', dest='inter_threads', type=int,
+            default=0, help='Inter-op threads of each worker session (0 = auto)')
+    ap.add_argument('-pin', '--pin-workers', dest='pin_workers', type=int,
+            default=0, help='Pin each worker to its own set of cores')
+    ap.add_argument('-mt', '--motion-threshold', dest='motion_threshold', type=float,
+            default=0, help='Skip the detector when less than this fraction of the pixels changed since the last keyframe (0 = disabled)')
+    ap.add_argument('-mx', '--motion-max-skip', dest='motion_max_skip', type=int,
+            default=30, help='Run the detector at least once every this many frames of a static scene')
+    ap.add_argument('-roi', '--roi', dest='roi', type=str,
+            default='', help='Detect only in the region ymin,xmin,ymax,xmax (fractions of the frame)')
+    ap.add_argument('-tl', '--tiles', dest='tiles', type=str,
+            default='', help='Split the frame (or the region) in ROWSxCOLS overlapping tiles, run as one batch')
+    ap.add_argument('-to', '--tile-overlap', dest='tile_overlap', type=float,
+            default=0.2, help='Overlap of adjacent tiles (fraction of the tile)')
+    ap.add_argument('-ti', '--tile-iou', dest='tile_iou', type=float,
+            default=0.5, help='IoU above which the detections across the tile seams are merged')
+    ap.add_argument('-cd', '--cache-dir', dest='cache_dir', type=str,
+            default='', help='Cache the detections of the frames in this directory, keyed by graph and frame content')
+    ap.add_argument('-cs', '--cache-size', dest='cache_size', type=int,
+            default=512, help='Size limit of the detection cache [MB], least recently used entries evicted first')
+    ap.add_argument('-be', '--backend', dest='backend', type=str,
+            default='tf', choices=sorted(BACKENDS),
+            help='Inference backend: TF session, OpenCV DNN (CPU) or a fake model for benchmarking')
+    ap.add_argument('-bc', '--backend-config', dest='backend_config', type=str,
+            default='', help='OpenCV DNN backend: text graph of the model (from tf_text_graph_ssd.py)')
+    ap.add_argument('-bsz', '--backend-size', dest='backend_size', type=str,
+            default='300x300', help='OpenCV DNN backend: input size WIDTHxHEIGHT of the network')
+    ap.add_argument('-ft', '--fake-time', dest='fake_time', type=float,
+            default=0.01, help='Fake backend: compute time of each frame [s]')
+    ap.add_argument('-so', '--stats-output', dest='stats_output', type=str,
+            default='', help='Write the run report (throughput, latency percentiles, queue occupancy, stage utilization) to this JSON file')
+    ap.add_argument('-tr', '--trace-output', dest='trace_output', type=str,
+            default='', help='Trace the stages of each frame and write them to this Chrome trace-event JSON file at the end')
+    ap.add_argument('-tf', '--trace-frames', dest='trace_frames', type=int,
+            default=10000, help='Traces kept for the trace file (the last frames)')
+    ap.add_argument('-mp', '--metrics-port', dest='metrics_port', type=int,
+            default=0, help='Serve the live metrics (Prometheus text format) on this local port (0 = disabled)')
+    ap.add_argument('-pr', '--profile', dest='profile', type=str,
+            default='', help='Profile the workers and the data flow processes with a sampling profiler: one collapsed-stack file per process in this directory, merged at the end in profile.folded')
+    ap.add_argument('-pi', '--profile-interval', dest='profile_interval',
+            type=float, default=5.0, help='Sampling period of the profiler [ms]')
     ap.add_argument('-l', '--logger-debug', dest='logger_debug', type=int,
             default=0, help='Print logger debug')
     ap.add_argument("-pg", "--graph_path", type=str, dest='path2graph', default="model",
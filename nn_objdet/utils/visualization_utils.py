@@ -23,6 +23,7 @@ from abc import ABCMeta
 from abc import abstractmethod
 import collections
 import functools
+import cv2
 # Set headless-friendly backend.
 import matplotlib; matplotlib.use('Agg')  # pylint: disable=multiple-statements
 import matplotlib.pyplot as plt  # pylint: disable=g-import-not-at-top
@@ -66,6 +67,15 @@ STANDARD_COLORS = [
 ]
 
 
+@functools.lru_cache(maxsize=None)
+def _load_font(size=24):
+  """Loads the label font once, falling back to the default PIL font."""
+  try:
+    return ImageFont.truetype('arial.ttf', size)
+  except IOError:
+    return ImageFont.load_default()
+
+
 def save_image_array_as_png(image, output_path):
   """Saves an image (represented as a numpy array) to PNG.
 
@@ -172,10 +182,7 @@ def draw_bounding_box_on_image(image,
     (left, right, top, bottom) = (xmin, xmax, ymin, ymax)
   draw.line([(left, top), (left, bottom), (right, bottom),
              (right, top), (left, top)], width=thickness, fill=color)
-  try:
-    font = ImageFont.truetype('arial.ttf', 24)
-  except IOError:
-    font = ImageFont.load_default()
+  font = _load_font()
 
   # If the total height of the display strings added to the top of the bounding
   # box exceeds the top of the image, stack the strings below the bounding box
@@ -204,6 +211,132 @@ def draw_bounding_box_on_image(image,
     text_bottom -= text_height - 2 * margin
 
 
+class BoxRenderer(object):
+  """Draws bounding boxes and labels directly on a numpy array with OpenCV.
+
+  The font is loaded once and the label bitmaps are rendered once per category
+  name (and per score string), so that drawing a box never converts the whole
+  image to a PIL.Image and back. The boxes are drawn in place on the array.
+  """
+
+  def __init__(self, category_index=None, font_size=24):
+    """Constructor.
+
+    Args:
+      category_index: a dict containing category dictionaries (each holding
+        category index `id` and category name `name`) keyed by category
+        indices. The label bitmaps of the categories are pre-rendered.
+      font_size: size of the label font.
+    """
+    self._font = _load_font(font_size)
+    self._text_bitmaps = {}
+    self._colors = {}
+    if category_index:
+      for category in category_index.values():
+        self._text_bitmap(str(category['name']))
+
+  def _color(self, color):
+    """Returns the RGB tuple of a color name."""
+    if color not in self._colors:
+      self._colors[color] = ImageColor.getrgb(color)
+    return self._colors[color]
+
+  def _text_bitmap(self, display_str):
+    """Returns the uint8 coverage mask [height, width] of a display string.
+
+    Strings like 'name: 87%' are composed from the cached bitmaps of 'name' and
+    ': 87%', so the cache stays bounded by the number of categories and scores.
+    """
+    if display_str in self._text_bitmaps:
+      return self._text_bitmaps[display_str]
+    head, sep, tail = display_str.rpartition(': ')
+    if sep and head:
+      return np.hstack([self._text_bitmap(head),
+                        self._text_bitmap(sep + tail)])
+    # All the bitmaps have the height of the font, so they can be stacked.
+    _, text_height = self._font.getsize('Ag%')
+    text_width, _ = self._font.getsize(display_str)
+    bitmap = Image.new('L', (max(text_width, 1), text_height), 0)
+    ImageDraw.Draw(bitmap).text((0, 0), display_str, fill=255,
+                                font=self._font)
+    self._text_bitmaps[display_str] = np.array(bitmap)
+    return self._text_bitmaps[display_str]
+
+  def draw_bounding_box_on_image_array(self,
+                                       image,
+                                       ymin,
+                                       xmin,
+                                       ymax,
+                                       xmax,
+                                       color='red',
+                                       thickness=4,
+                                       display_str_list=(),
+                                       use_normalized_coordinates=True):
+    """Adds a bounding box to an image (numpy array), in place.
+
+    The layout of the box and of the display strings is the same as
+    draw_bounding_box_on_image.
+
+    Args:
+      image: a uint8 numpy array with shape [height, width, 3].
+      ymin: ymin of bounding box.
+      xmin: xmin of bounding box.
+      ymax: ymax of bounding box.
+      xmax: xmax of bounding box.
+      color: color to draw bounding box. Default is red.
+      thickness: line thickness. Default value is 4.
+      display_str_list: list of strings to display in box
+                        (each to be shown on its own line).
+      use_normalized_coordinates: If True (default), treat coordinates
+        ymin, xmin, ymax, xmax as relative to the image.  Otherwise treat
+        coordinates as absolute.
+    """
+    im_height, im_width = image.shape[:2]
+    if use_normalized_coordinates:
+      (left, right, top, bottom) = (xmin * im_width, xmax * im_width,
+                                    ymin * im_height, ymax * im_height)
+    else:
+      (left, right, top, bottom) = (xmin, xmax, ymin, ymax)
+    rgb = self._color(color)
+    cv2.rectangle(image, (int(left), int(top)), (int(right), int(bottom)),
+                  rgb, int(thickness))
+
+    bitmaps = [self._text_bitmap(ds) for ds in display_str_list]
+    # Each display_str has a top and bottom margin of 0.05x.
+    total_display_str_height = (1 + 2 * 0.05) * sum(
+        bitmap.shape[0] for bitmap in bitmaps)
+
+    if top > total_display_str_height:
+      text_bottom = top
+    else:
+      text_bottom = bottom + total_display_str_height
+    # Reverse list and print from bottom to top.
+    for bitmap in bitmaps[::-1]:
+      text_height, text_width = bitmap.shape
+      margin = np.ceil(0.05 * text_height)
+      cv2.rectangle(image,
+                    (int(left), int(text_bottom - text_height - 2 * margin)),
+                    (int(left + text_width), int(text_bottom)),
+                    rgb, cv2.FILLED)
+      self._blend_text(image, bitmap, int(left + margin),
+                       int(text_bottom - text_height - margin))
+      text_bottom -= text_height - 2 * margin
+
+  @staticmethod
+  def _blend_text(image, bitmap, x, y):
+    """Darkens the image with the (black) text bitmap at (x, y), clipped."""
+    im_height, im_width = image.shape[:2]
+    y0, x0 = max(y, 0), max(x, 0)
+    y1 = min(y + bitmap.shape[0], im_height)
+    x1 = min(x + bitmap.shape[1], im_width)
+    if y1 <= y0 or x1 <= x0:
+      return
+    alpha = bitmap[y0 - y:y1 - y, x0 - x:x1 - x, np.newaxis]
+    region = image[y0:y1, x0:x1]
+    region[...] = (region * (255 - alpha.astype(np.uint16)) // 255).astype(
+        image.dtype)
+
+
 def draw_bounding_boxes_on_image_array(image,
                                        boxes,
                                        color='red',
@@ -556,7 +689,8 @@ def visualize_boxes_and_labels_on_image_array(
     line_thickness=4,
     groundtruth_box_visualization_color='black',
     skip_scores=False,
-    skip_labels=False):
+    skip_labels=False,
+    box_renderer=None):
   """Overlay labeled boxes on an image with formatted scores and label names.
 
   This function groups boxes that correspond to the same location
@@ -593,6 +727,8 @@ def visualize_boxes_and_labels_on_image_array(
       boxes
     skip_scores: whether to skip score when drawing a single detection
     skip_labels: whether to skip label when drawing a single detection
+    box_renderer: a BoxRenderer drawing the boxes and labels in place with
+      OpenCV. If None (default), the boxes are drawn with PIL.
 
   Returns:
     uint8 numpy array with shape (img_height, img_width, 3) with overlaid boxes.
@@ -654,7 +790,11 @@ def visualize_boxes_and_labels_on_image_array(
           color='red',
           alpha=1.0
       )
-    draw_bounding_box_on_image_array(
+    if box_renderer is not None:
+      draw_box = box_renderer.draw_bounding_box_on_image_array
+    else:
+      draw_box = draw_bounding_box_on_image_array
+    draw_box(
         image,
         ymin,
         xmin,
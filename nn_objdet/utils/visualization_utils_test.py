@@ -112,6 +112,47 @@ class VisualizationUtilsTest(tf.test.TestCase):
     self.assertEqual(width_original, width_final)
     self.assertEqual(height_original, height_final)
 
+  def test_box_renderer_draws_in_place(self):
+    test_image = self.create_colorful_test_image()
+    original_image = test_image.copy()
+    category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
+    box_renderer = visualization_utils.BoxRenderer(category_index)
+
+    box_renderer.draw_bounding_box_on_image_array(
+        test_image, 0.25, 0.4, 0.75, 0.6, display_str_list=['dog: 87%'])
+
+    self.assertEqual(original_image.shape, test_image.shape)
+    self.assertFalse(np.array_equal(original_image, test_image))
+
+  def test_box_renderer_caches_label_bitmaps(self):
+    category_index = {1: {'id': 1, 'name': 'dog'}}
+    box_renderer = visualization_utils.BoxRenderer(category_index)
+
+    bitmap = box_renderer._text_bitmap('dog: 87%')
+
+    self.assertEqual(bitmap.ndim, 2)
+    self.assertIs(box_renderer._text_bitmap('dog'),
+                  box_renderer._text_bitmap('dog'))
+    self.assertEqual(bitmap.shape[0], box_renderer._text_bitmap('dog').shape[0])
+
+  def test_visualize_boxes_with_box_renderer(self):
+    test_image = self.create_colorful_test_image()
+    category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
+    boxes = np.array([[0.25, 0.4, 0.75, 0.6], [0.1, 0.1, 0.9, 0.9]])
+    classes = np.array([1, 2])
+    scores = np.array([0.9, 0.8])
+
+    pil_image = visualization_utils.visualize_boxes_and_labels_on_image_array(
+        test_image.copy(), boxes, classes, scores, category_index,
+        use_normalized_coordinates=True)
+    cv2_image = visualization_utils.visualize_boxes_and_labels_on_image_array(
+        test_image.copy(), boxes, classes, scores, category_index,
+        use_normalized_coordinates=True,
+        box_renderer=visualization_utils.BoxRenderer(category_index))
+
+    self.assertEqual(pil_image.shape, cv2_image.shape)
+    self.assertFalse(np.array_equal(test_image, cv2_image))
+
   def test_draw_bounding_boxes_on_image_tensors(self):
     """Tests that bounding box utility produces reasonable results."""
     category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}